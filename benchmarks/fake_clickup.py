@@ -0,0 +1,299 @@
+"""Local stand-in for the ClickUp API serving a synthetic workspace.
+
+Every id, task and time entry is derived from its position, so workspaces of
+any size are served without building them in memory. Responses carry
+X-RateLimit headers (and 429s once the per minute budget is spent) and can be
+delayed by a fixed latency, so the tap's pacing and concurrency are exercised
+the same way as against ClickUp.
+
+Used by `benchmarks/sync.py`, or run it on its own and point a tap at it:
+`poetry run python benchmarks/fake_clickup.py --tasks 10000`.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+TASK_FIXTURE = Path(__file__).parent.parent / "tap_clickup/tests/task.json"
+# Synthetic timestamps start here and go up one minute per task / time entry
+EPOCH_MS = 1609459200000  # 2021-01-01
+STEP_MS = 60 * 1000
+PAGE_SIZE = 100
+
+
+@dataclass
+class Workspace:
+    """Size of the synthetic workspace, counts are per parent."""
+
+    teams: int = 1
+    spaces: int = 2
+    folders: int = 2
+    lists: int = 3
+    tasks: int = 1000
+    custom_fields: int = 5
+    time_entries: int = 1000
+
+    def team_ids(self) -> List[str]:
+        return [f"t{team}" for team in range(self.teams)]
+
+    def children(self, parent_id: str, prefix: str, count: int) -> List[str]:
+        return [f"{parent_id}{prefix}{index}" for index in range(count)]
+
+
+def _window(
+    count: int, params: Dict[str, str], gt_key: str, lt_key: str
+) -> Tuple[int, int]:
+    """Return the index range of items whose timestamp falls in the window."""
+    start, end = 0, count
+    if params.get(gt_key):
+        start = max(start, -(-(int(params[gt_key]) - EPOCH_MS) // STEP_MS))
+    if params.get(lt_key):
+        end = min(end, -(-(int(params[lt_key]) - EPOCH_MS) // STEP_MS))
+    return start, max(start, end)
+
+
+class FakeClickUp:
+    """Route ClickUp API paths to synthetic responses."""
+
+    def __init__(self, workspace: Workspace) -> None:
+        self.workspace = workspace
+        self.task = json.loads(TASK_FIXTURE.read_text())["tasks"][0]
+        self.fields = [
+            dict(self.task["custom_fields"][0], id=f"cf{index}", name=f"Field {index}")
+            for index in range(workspace.custom_fields)
+        ]
+        self.routes: List[Tuple[re.Pattern, Callable[..., dict]]] = [
+            (re.compile(pattern), handler)
+            for pattern, handler in (
+                (r"/team$", self.teams),
+                (r"/team/(\w+)/space$", self.spaces),
+                (r"/space/(\w+)/folder$", self.folders),
+                (r"/folder/(\w+)/list$", self.folder_lists),
+                (r"/space/(\w+)/list$", self.folderless_lists),
+                (r"/list/(\w+)/field$", self.list_fields),
+                (r"/team/(\w+)/task$", self.tasks),
+                (r"/team/(\w+)/time_entries$", self.time_entries),
+                (r"/team/(\w+)/task_template$", lambda params, _: {"templates": []}),
+                (r"/team/(\w+)/goal$", lambda params, _: {"goals": []}),
+                (r"/team/(\w+)/shared$", self.shared),
+                (r"/space/(\w+)/tag$", lambda params, _: {"tags": []}),
+            )
+        ]
+
+    def handle(self, path: str, params: Dict[str, str]) -> Optional[dict]:
+        """Return the response body for a path, None if there is no such route."""
+        path = path.replace("/api/v2", "", 1)
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                return handler(params, *match.groups())
+        return None
+
+    @staticmethod
+    def archived(params: Dict[str, str]) -> bool:
+        # Nothing is archived in the synthetic workspace
+        return params.get("archived") == "true"
+
+    def teams(self, params) -> dict:
+        return {"teams": [{"id": id, "name": id} for id in self.workspace.team_ids()]}
+
+    def spaces(self, params, team_id: str) -> dict:
+        if self.archived(params):
+            return {"spaces": []}
+        ids = self.workspace.children(team_id, "s", self.workspace.spaces)
+        return {"spaces": [{"id": id, "name": id} for id in ids]}
+
+    def folders(self, params, space_id: str) -> dict:
+        if self.archived(params):
+            return {"folders": []}
+        ids = self.workspace.children(space_id, "f", self.workspace.folders)
+        return {"folders": [{"id": id, "name": id} for id in ids]}
+
+    def folder_lists(self, params, folder_id: str) -> dict:
+        if self.archived(params):
+            return {"lists": []}
+        ids = self.workspace.children(folder_id, "l", self.workspace.lists)
+        return {"lists": [{"id": id, "name": id} for id in ids]}
+
+    def folderless_lists(self, params, space_id: str) -> dict:
+        if self.archived(params):
+            return {"lists": []}
+        ids = self.workspace.children(space_id, "l", self.workspace.lists)
+        return {"lists": [{"id": id, "name": id} for id in ids]}
+
+    def list_fields(self, params, list_id: str) -> dict:
+        return {"fields": self.fields}
+
+    def tasks(self, params, team_id: str) -> dict:
+        if self.archived(params):
+            return {"tasks": []}
+        start, end = _window(
+            self.workspace.tasks, params, "date_updated_gt", "date_updated_lt"
+        )
+        start = start + int(params.get("page", 0)) * PAGE_SIZE
+        custom_fields = [dict(field, value=0) for field in self.fields]
+        return {
+            "tasks": [
+                dict(
+                    self.task,
+                    id=f"{team_id}task{index}",
+                    team_id=team_id,
+                    date_updated=str(EPOCH_MS + index * STEP_MS),
+                    custom_fields=custom_fields,
+                )
+                for index in range(start, min(start + PAGE_SIZE, end))
+            ]
+        }
+
+    def time_entries(self, params, team_id: str) -> dict:
+        start, end = _window(
+            self.workspace.time_entries, params, "start_date", "end_date"
+        )
+        return {
+            "data": [
+                {
+                    "id": f"{team_id}entry{index}",
+                    "wid": team_id,
+                    "start": str(EPOCH_MS + index * STEP_MS),
+                    "end": str(EPOCH_MS + index * STEP_MS + STEP_MS),
+                    "duration": str(STEP_MS),
+                    "billable": False,
+                }
+                for index in range(start, end)
+            ]
+        }
+
+    def shared(self, params, team_id: str) -> dict:
+        return {"shared": {"tasks": [], "lists": [], "folders": []}}
+
+
+class RateLimit:
+    """Per minute request budget reported in X-RateLimit headers."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.window: Optional[int] = None
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def take(self) -> Tuple[bool, Dict[str, str]]:
+        """Count a request, returns whether it's allowed and the headers to send."""
+        with self.lock:
+            now = time.time()
+            window = int(now // 60)
+            if window != self.window:
+                self.window, self.used = window, 0
+            self.used = self.used + 1
+            remaining = self.limit - self.used
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(remaining, 0)),
+            "X-RateLimit-Reset": str((window + 1) * 60),
+        }
+        return remaining >= 0, headers
+
+
+class FakeClickUpServer(ThreadingHTTPServer):
+    """Threaded HTTP server for a `FakeClickUp`, counting requests per path."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        workspace: Workspace,
+        latency: float = 0.0,
+        rate_limit: int = 100000,
+        port: int = 0,
+    ) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.api = FakeClickUp(workspace)
+        self.latency = latency
+        self.rate_limit = RateLimit(rate_limit)
+        self.requests = 0
+        self.throttled = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Return the url to use as the tap's `url_base`."""
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v2"
+
+    def start(self) -> "FakeClickUpServer":
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeClickUpServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:  # noqa: N802
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        allowed, headers = self.server.rate_limit.take()
+        self.server.requests = self.server.requests + 1
+        if not allowed:
+            self.server.throttled = self.server.throttled + 1
+            self._send(429, {"err": "Rate limit reached"}, headers)
+            return
+        body = self.server.api.handle(url.path, params)
+        if body is None:
+            self._send(404, {"err": "Route not found"}, headers)
+            return
+        self._send(200, body, headers)
+
+    def _send(self, status: int, body: dict, headers: Dict[str, str]) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def add_workspace_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the workspace size, latency and rate limit options to a parser."""
+    defaults = Workspace()
+    for name in Workspace.__dataclass_fields__:
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=int, default=getattr(defaults, name)
+        )
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--rate-limit", type=int, default=100000, help="per minute")
+
+
+def server_from_arguments(args: argparse.Namespace, port: int = 0) -> FakeClickUpServer:
+    workspace = Workspace(
+        **{name: getattr(args, name) for name in Workspace.__dataclass_fields__}
+    )
+    return FakeClickUpServer(workspace, args.latency, args.rate_limit, port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_workspace_arguments(parser)
+    parser.add_argument("--port", type=int, default=8000)
+    server = server_from_arguments(parser.parse_args(), port=parser.parse_args().port)
+    print(f"Serving a fake ClickUp API on {server.url}")
+    server.serve_forever()
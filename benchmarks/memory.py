@@ -0,0 +1,71 @@
+"""Benchmark peak memory of parsing large pages, whole vs streamed.
+
+Builds synthetic multi-megabyte `/team/{team_id}/task` and
+`/team/{team_id}/shared` bodies and reports the peak memory allocated while
+parsing them with and without `stream_responses` (requires ijson).
+
+shared_hierarchy returns everything as a single record, so it's parsed whole
+either way. Streamed task pages stay bounded by the size of one task.
+
+Run with `poetry run python benchmarks/memory.py`.
+"""
+import io
+import json
+import tracemalloc
+from pathlib import Path
+
+import requests
+
+from tap_clickup.tap import TapClickUp
+
+TASK_FIXTURE = Path(__file__).parent.parent / "tap_clickup/tests/task.json"
+
+
+def task_page(records: int) -> bytes:
+    task = json.loads(TASK_FIXTURE.read_text())["tasks"][0]
+    return json.dumps(
+        {"tasks": [dict(task, id=str(i)) for i in range(records)]}
+    ).encode()
+
+
+def shared_page(items: int) -> bytes:
+    task = json.loads(TASK_FIXTURE.read_text())["tasks"][0]
+    shared = {
+        "tasks": [dict(task, id=str(i)) for i in range(items)],
+        "lists": [{"id": str(i), "name": f"List {i}"} for i in range(items)],
+        "folders": [{"id": str(i), "name": f"Folder {i}"} for i in range(items)],
+    }
+    return json.dumps({"shared": shared}).encode()
+
+
+def new_response(body: bytes) -> requests.Response:
+    """Return a response whose body is still unread, like a socket."""
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    response.encoding = "utf-8"
+    return response
+
+
+def peak_memory(stream, body: bytes) -> int:
+    response = new_response(body)
+    tracemalloc.start()
+    for _ in stream.parse_response(response):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == "__main__":
+    bodies = {"task": task_page(2000), "shared_hierarchy": shared_page(2000)}
+    for streaming in (False, True):
+        tap = TapClickUp(
+            config={"api_token": "benchmark", "stream_responses": streaming}
+        )
+        for name, body in bodies.items():
+            peak = peak_memory(tap.streams[name], body)
+            print(
+                f"{name:<18}{len(body) / 2**20:6.1f}MB body  "
+                f"streaming={str(streaming):<6}peak {peak / 2**20:7.1f}MB"
+            )
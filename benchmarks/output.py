@@ -0,0 +1,68 @@
+"""Benchmark writing RECORD messages with the SDK vs `fast_output`.
+
+Serializes 100k synthetic tasks (built from the test fixture) to /dev/null with
+the SDK's writer, the fast writer falling back to stdlib json, and the fast
+writer using orjson (if installed).
+
+Run with `poetry run python benchmarks/output.py`.
+"""
+import datetime
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import singer_sdk._singerlib as singer
+
+from tap_clickup import output
+from tap_clickup.output import FastMessageWriter, MessageWriter
+
+TASK_FIXTURE = Path(__file__).parent.parent / "tap_clickup/tests/task.json"
+TASKS = 100000
+
+
+def task_messages(count: int):
+    task = json.loads(TASK_FIXTURE.read_text())["tasks"][0]
+    extracted = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        singer.RecordMessage(
+            stream="task", record=dict(task, id=str(i)), time_extracted=extracted
+        )
+        for i in range(count)
+    ]
+
+
+def seconds_to_write(writer, messages) -> float:
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            start = time.perf_counter()
+            for message in messages:
+                writer.write(message)
+            writer.flush()
+            return time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+
+
+if __name__ == "__main__":
+    messages = task_messages(TASKS)
+    orjson = output.orjson
+    output.orjson = None
+    results = [
+        ("sdk", seconds_to_write(MessageWriter(), messages)),
+        ("fast (stdlib json)", seconds_to_write(FastMessageWriter(), messages)),
+    ]
+    output.orjson = orjson
+    if orjson is not None:
+        results.append(
+            ("fast (orjson)", seconds_to_write(FastMessageWriter(), messages))
+        )
+    baseline = results[0][1]
+    for name, seconds in results:
+        print(
+            f"{name:<20}{seconds:7.2f}s {TASKS / seconds:9.0f} records/s "
+            f"{baseline / seconds:5.1f}x"
+        )
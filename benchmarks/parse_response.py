@@ -0,0 +1,64 @@
+"""Benchmark decoding a 100 task page once vs twice.
+
+Run with `poetry run python benchmarks/parse_response.py`.
+"""
+import json
+import time
+from pathlib import Path
+
+import requests
+from singer_sdk.helpers.jsonpath import extract_jsonpath
+
+from tap_clickup.tap import TapClickUp
+
+TASK_FIXTURE = Path(__file__).parent.parent / "tap_clickup/tests/task.json"
+PAGES = 200
+
+
+def task_page(records: int = 100) -> bytes:
+    """Return the body of a full task page built from the test fixture."""
+    task = json.loads(TASK_FIXTURE.read_text())["tasks"][0]
+    return json.dumps(
+        {"tasks": [dict(task, id=str(i)) for i in range(records)]}
+    ).encode()
+
+
+def new_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response.encoding = "utf-8"
+    return response
+
+
+def decode_twice(stream, response: requests.Response) -> None:
+    """What parse_response and pagination used to do."""
+    for _ in extract_jsonpath(stream.records_jsonpath, input=response.json()):
+        pass
+    recordcount = 0
+    for _ in extract_jsonpath(stream.records_jsonpath, input=response.json()):
+        recordcount = recordcount + 1
+
+
+def decode_once(stream, response: requests.Response) -> None:
+    for _ in stream.parse_response(response):
+        pass
+    stream.get_new_paginator().advance(response)
+
+
+def bench(name, func, stream, body) -> float:
+    start = time.process_time()
+    for _ in range(PAGES):
+        func(stream, new_response(body))
+    per_page = (time.process_time() - start) / PAGES * 1000
+    print(f"{name:<14}{per_page:8.2f} ms CPU per page")
+    return per_page
+
+
+if __name__ == "__main__":
+    stream = TapClickUp(config={"api_token": "benchmark"}).streams["task"]
+    body = task_page()
+    print(f"{PAGES} pages of {len(body) / 1024:.0f}KB, 100 tasks each")
+    before = bench("decode twice", decode_twice, stream, body)
+    after = bench("decode once", decode_once, stream, body)
+    print(f"saved {before - after:.2f} ms CPU per page ({1 - after / before:.0%})")
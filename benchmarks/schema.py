@@ -0,0 +1,40 @@
+"""Benchmark startup, discovery and the schema lookups done for every record.
+
+Run with `poetry run python benchmarks/schema.py`.
+"""
+import time
+
+from singer_sdk._singerlib.schema import resolve_schema_references
+
+from tap_clickup.tap import TapClickUp
+
+LOOKUPS = 10000
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def discovery() -> None:
+    tap = TapClickUp(config={"api_token": "benchmark"})
+    tap.catalog_dict
+
+
+if __name__ == "__main__":
+    print(f"startup + discovery   {timed(discovery) * 1000:8.1f} ms")
+    stream = TapClickUp(config={"api_token": "benchmark"}).streams["task"]
+
+    def resolve_every_time():
+        for _ in range(LOOKUPS):
+            resolve_schema_references(stream._schema)
+
+    def cached():
+        for _ in range(LOOKUPS):
+            stream.schema
+
+    before = timed(resolve_every_time) / LOOKUPS * 1e6
+    after = timed(cached) / LOOKUPS * 1e6
+    print(f"task schema, resolved {before:8.1f} us per lookup")
+    print(f"task schema, cached   {after:8.1f} us per lookup")
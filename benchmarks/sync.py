@@ -0,0 +1,116 @@
+"""Benchmark full syncs per stream against a local fake ClickUp API.
+
+Serves a synthetic workspace with `benchmarks/fake_clickup.py`, then syncs each
+stream (and the parents needed to reach it) in a fresh process and reports
+records/sec, requests/sec, peak RSS and CPU time. Output goes to a counter
+instead of stdout, so only the tap's own work is measured.
+
+Run with `poetry run python benchmarks/sync.py --tasks 20000 --latency 0.05`,
+`--max-workers`, `--stream-responses` and `--http-engine` are passed on as tap
+config.
+"""
+import argparse
+import multiprocessing
+import re
+import resource
+import sys
+import time
+from typing import List
+
+from fake_clickup import add_workspace_arguments, server_from_arguments
+
+from tap_clickup.client import ClickUpStream
+from tap_clickup.tap import TapClickUp
+
+STREAMS = [
+    "team",
+    "space",
+    "folder",
+    "folder_list",
+    "folderless_list",
+    "folder_customfield",
+    "folderless_customfield",
+    "task",
+    "time_entries",
+]
+RECORD = re.compile(r'^\{\s*"type"\s*:\s*"RECORD"')
+
+
+class RecordCounter:
+    """Stand-in for stdout counting the RECORD messages written."""
+
+    def __init__(self) -> None:
+        self.records = 0
+
+    def write(self, text: str) -> int:
+        for line in text.splitlines():
+            if RECORD.match(line):
+                self.records = self.records + 1
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def run_stream(url: str, config: dict, stream_name: str, results) -> None:
+    """Sync one stream in this (child) process and report what it cost."""
+    ClickUpStream.url_base = url
+    tap = TapClickUp(config=config)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        for metadata in stream["metadata"]:
+            metadata["metadata"]["selected"] = stream["tap_stream_id"] == stream_name
+
+    counter = RecordCounter()
+    sys.stdout = counter
+    cpu, wall = time.process_time(), time.perf_counter()
+    TapClickUp(config=config, catalog=catalog).sync_all()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    sys.stdout = sys.__stdout__
+    # ru_maxrss is in KB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((counter.records, wall, cpu, rss))
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_workspace_arguments(parser)
+    parser.add_argument("--max-workers", type=int, default=1)
+    parser.add_argument("--stream-responses", action="store_true")
+    parser.add_argument("--http-engine", choices=["requests", "async"])
+    parser.add_argument("--streams", nargs="*", default=STREAMS)
+    args = parser.parse_args(argv)
+    config = {
+        "api_token": "benchmark",
+        "max_workers": args.max_workers,
+        "stream_responses": args.stream_responses,
+        "http_engine": args.http_engine or "requests",
+    }
+
+    server = server_from_arguments(args).start()
+    context = multiprocessing.get_context("fork")
+    print(
+        f"{'stream':<24}{'records':>9}{'seconds':>9}{'records/s':>11}"
+        f"{'requests':>10}{'requests/s':>12}{'429s':>6}{'peak RSS':>10}{'CPU s':>8}"
+    )
+    try:
+        for stream_name in args.streams:
+            results = context.Queue()
+            server.requests, server.throttled = 0, 0
+            process = context.Process(
+                target=run_stream, args=(server.url, config, stream_name, results)
+            )
+            process.start()
+            records, wall, cpu, rss = results.get()
+            process.join()
+            print(
+                f"{stream_name:<24}{records:>9}{wall:>9.2f}{records / wall:>11.0f}"
+                f"{server.requests:>10}{server.requests / wall:>12.1f}"
+                f"{server.throttled:>6}{rss:>8.0f}MB{cpu:>8.2f}"
+            )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
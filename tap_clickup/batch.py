@@ -0,0 +1,68 @@
+"""Gzipped JSON lines batch files for Singer BATCH messages."""
+
+import gzip
+from contextlib import ExitStack
+from typing import Iterator, List, Optional
+from uuid import uuid4
+
+from singer_sdk.batch import JSONLinesBatcher
+from singer_sdk.helpers._batch import BatchConfig
+
+from tap_clickup.output import FastMessageWriter
+
+
+class BoundedJSONLinesBatcher(JSONLinesBatcher):
+    """Write records into gzipped JSON lines files of bounded size.
+
+    A file is closed once it holds `batch_size` records or `max_bytes` of
+    uncompressed JSON, whichever comes first. Unlike the SDK's batcher records
+    are written as they arrive, so a batch is never held in memory, and encoded
+    with orjson when it's installed.
+    """
+
+    def __init__(
+        self,
+        tap_name: str,
+        stream_name: str,
+        batch_config: BatchConfig,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        super().__init__(tap_name, stream_name, batch_config)
+        self.max_bytes = max_bytes
+
+    def get_batches(self, records: Iterator[dict]) -> Iterator[List[str]]:
+        """Yield a manifest (one file url) for each file written.
+
+        A file is yielded as soon as it's full, before pulling the next record,
+        so the stream state never gets ahead of the records already batched.
+        """
+        sync_id = f"{self.tap_name}--{self.stream_name}-{uuid4()}"
+        prefix = self.batch_config.storage.prefix or ""
+        batch: Optional[ExitStack] = None
+        index = 0
+        for record in records:
+            if batch is None:
+                index = index + 1
+                filename = f"{prefix}{sync_id}-{index}.json.gz"
+                batch = ExitStack()
+                fs = batch.enter_context(self.batch_config.storage.fs(create=True))
+                f = batch.enter_context(fs.open(filename, "wb"))
+                gz = batch.enter_context(gzip.GzipFile(fileobj=f, mode="wb"))
+                count, size = 0, 0
+            line = FastMessageWriter.dumps(record) + b"\n"
+            gz.write(line)
+            count, size = count + 1, size + len(line)
+            if self._full(count, size):
+                file_url = fs.geturl(filename)
+                batch.close()
+                batch = None
+                yield [file_url]
+        if batch is not None:
+            file_url = fs.geturl(filename)
+            batch.close()
+            yield [file_url]
+
+    def _full(self, count: int, size: int) -> bool:
+        if count >= self.batch_config.batch_size:
+            return True
+        return self.max_bytes is not None and size >= self.max_bytes
@@ -0,0 +1,86 @@
+"""Time budget of a run, to stop cleanly before an orchestrator kills it."""
+
+import time
+from typing import Any, Callable, Optional
+
+from requests import Response
+
+
+class OutOfTimeError(Exception):
+    """Raised instead of waiting past the end of the run budget."""
+
+
+class RunBudget:
+    """Seconds a sync may run for, None for no limit.
+
+    The budget counts as exhausted once what's left is shorter than the slowest
+    request seen so far, so pages already in flight can finish in time. From
+    then on streams stop requesting new pages and partitions, and the final
+    STATE covers everything synced so far. Rate limit and retry waits that
+    would outlast the budget aren't waited for, the partition stops instead.
+    """
+
+    def __init__(
+        self, seconds: Optional[float], clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.seconds = seconds
+        self.clock = clock
+        self.started_at: Optional[float] = None
+        self.slowest_request = 0.0
+        self.stopped = False
+
+    def start(self) -> None:
+        """Start counting, the budget is never exhausted before."""
+        self.started_at = self.clock()
+
+    def observe(self, seconds: float) -> None:
+        """Record how long a request took."""
+        self.slowest_request = max(self.slowest_request, seconds)
+
+    @property
+    def remaining(self) -> Optional[float]:
+        """Return the seconds left to start a request in, None for no limit."""
+        if self.seconds is None or self.started_at is None:
+            return None
+        elapsed = self.clock() - self.started_at
+        return self.seconds - elapsed - self.slowest_request
+
+    @property
+    def exhausted(self) -> bool:
+        """Return True if no new request should be started."""
+        remaining = self.remaining
+        return remaining is not None and remaining <= 0
+
+    def check_wait(self, seconds: float) -> None:
+        """Raise OutOfTimeError if a request waiting `seconds` would start too late."""
+        remaining = self.remaining
+        if remaining is not None and seconds >= remaining:
+            raise OutOfTimeError(f"Waiting {seconds:.1f}s would outlast the run budget")
+
+
+class BudgetedPaginator:
+    """Paginator wrapper stopping after the current page once out of time."""
+
+    def __init__(self, paginator: Any, budget: RunBudget, on_stop: Callable) -> None:
+        self.paginator = paginator
+        self.budget = budget
+        self.on_stop = on_stop
+
+    @property
+    def current_value(self) -> Any:
+        """Return the token of the next page."""
+        return self.paginator.current_value
+
+    @property
+    def finished(self) -> bool:
+        """Return True if there is no page left, or no time to request it."""
+        if self.paginator.finished:
+            return True
+        if self.paginator.count and self.budget.exhausted:
+            self.on_stop()
+            return True
+        return False
+
+    def advance(self, response: Response) -> None:
+        """Move on to the next page."""
+        self.paginator.advance(response)
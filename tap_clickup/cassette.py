@@ -0,0 +1,208 @@
+"""Record ClickUp API traffic to a cassette file and replay it offline."""
+
+import gzip
+import io
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+class CassetteMissError(Exception):
+    """Raised when replaying a request that isn't on the cassette."""
+
+
+# Params computed from the clock on every run, ie the end of the newest time
+# entry window
+CLOCK_PARAMS = ("end_date",)
+
+
+def request_key(
+    method: str, url: str, ignored: Iterable[str] = ()
+) -> Tuple[str, str, tuple]:
+    """Return the key a request is matched on when replaying.
+
+    Every param but the `ignored` ones is matched, so concurrent backfill
+    windows replay their own responses.
+    """
+    parts = urlsplit(url)
+    params = tuple(
+        sorted(
+            (key, value) for key, value in parse_qsl(parts.query) if key not in ignored
+        )
+    )
+    return method, f"{parts.scheme}://{parts.netloc}{parts.path}", params
+
+
+def prepared_request_key(request: requests.PreparedRequest) -> Tuple[str, str, tuple]:
+    """Return the key of a prepared request, matching all its params."""
+    return request_key(request.method, request.url)
+
+
+def clock_values(url: str) -> Dict[str, int]:
+    """Return the values of the `CLOCK_PARAMS` in a url."""
+    return {
+        key: int(value)
+        for key, value in parse_qsl(urlsplit(url).query)
+        if key in CLOCK_PARAMS and value.isdigit()
+    }
+
+
+class Cassette:
+    """Gzipped JSON lines file of HTTP interactions, one per line.
+
+    Each line holds the request (url, params and headers minus Authorization),
+    the response (status, headers, body) and how long it took. Replaying serves
+    the responses for a request in the order they were recorded, waiting the
+    original time divided by `speed` (0 doesn't wait at all).
+
+    A request matches the recorded one with the same params. Failing that, it
+    matches the recorded one ending latest (see `CLOCK_PARAMS`) among those
+    with the same params otherwise, as long as it doesn't end before it: the
+    newest window ends later on every run.
+    """
+
+    def __init__(self, path: str, mode: str, speed: float = 1.0) -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._file: Optional[io.TextIOBase] = None
+        self._interactions: Dict[tuple, Deque[dict]] = defaultdict(deque)
+        # Request key without its clock params -> (clock values, request key)
+        self._latest: Dict[tuple, Tuple[Dict[str, int], tuple]] = {}
+        if mode == "replay":
+            with gzip.open(path, "rt") as cassette:
+                for line in cassette:
+                    self._load(json.loads(line))
+        self.adapter = (
+            RecordingAdapter(self) if mode == "record" else ReplayAdapter(self)
+        )
+
+    def _load(self, interaction: dict) -> None:
+        """Index a recorded interaction for replay."""
+        method, url = interaction["request"]["method"], interaction["request"]["url"]
+        key = request_key(method, url)
+        self._interactions[key].append(interaction)
+        clock = clock_values(url)
+        if clock:
+            loose_key = request_key(method, url, CLOCK_PARAMS)
+            latest = self._latest.get(loose_key)
+            if latest is None or max(clock.values()) > max(latest[0].values()):
+                self._latest[loose_key] = (clock, key)
+
+    def _match(self, request: requests.PreparedRequest) -> tuple:
+        """Return the key of the recorded interactions answering a request."""
+        key = prepared_request_key(request)
+        if key in self._interactions:
+            return key
+        latest = self._latest.get(
+            request_key(request.method, request.url, CLOCK_PARAMS)
+        )
+        clock = clock_values(request.url)
+        if latest is not None and all(
+            clock.get(param, -1) >= value for param, value in latest[0].items()
+        ):
+            return latest[1]
+        return key
+
+    @property
+    def replaying(self) -> bool:
+        """Return True if responses come from the cassette instead of ClickUp."""
+        return self.mode == "replay"
+
+    def record(self, response: requests.Response) -> None:
+        """Append a response, and the request it answers, to the cassette."""
+        request = response.request
+        interaction = {
+            "request": {
+                "method": request.method,
+                "url": request.url,
+                "params": dict(parse_qsl(urlsplit(request.url).query)),
+                "headers": {
+                    name: value
+                    for name, value in request.headers.items()
+                    if name.lower() != "authorization"
+                },
+            },
+            "response": {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": dict(response.headers),
+                "body": response.content.decode("utf-8"),
+            },
+            "elapsed": response.elapsed.total_seconds(),
+        }
+        line = json.dumps(interaction) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, "wt")
+            self._file.write(line)
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        """Return the next recorded response for a request."""
+        with self._lock:
+            recorded = self._interactions.get(self._match(request))
+            if not recorded:
+                raise CassetteMissError(
+                    f"No recorded response left for {request.method} {request.url}"
+                )
+            interaction = recorded.popleft()
+        if self.speed:
+            time.sleep(interaction["elapsed"] / self.speed)
+
+        body = interaction["response"]["body"].encode("utf-8")
+        response = requests.Response()
+        response.status_code = interaction["response"]["status"]
+        response.reason = interaction["response"]["reason"]
+        response.headers = CaseInsensitiveDict(interaction["response"]["headers"])
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(body)
+        response.encoding = "utf-8"
+        return response
+
+    def close(self) -> None:
+        """Flush and close the cassette being recorded."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter sending requests as usual and recording the responses."""
+
+    def __init__(self, cassette: Cassette) -> None:
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, stream=False, **kwargs) -> requests.Response:
+        response = super().send(request, stream=stream, **kwargs)
+        self.cassette.record(response)
+        if stream:
+            # The body has been read to record it, hand it on as if unread
+            response.raw = io.BytesIO(response.content)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter serving responses from a cassette."""
+
+    def __init__(self, cassette: Cassette) -> None:
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs) -> requests.Response:
+        return self.cassette.replay(request)
+
+    def close(self) -> None:
+        pass
@@ -1,36 +1,119 @@
 """REST client handling, including ClickUpStream base class."""
 
-from typing import Any, Optional, Iterable, Dict
+from typing import Any, Callable, Optional, Iterable, Iterator, Dict, Generator, List
+from collections import deque
+from datetime import datetime, timezone
 from pathlib import Path
-from datetime import datetime
+import threading
 import time
+import weakref
 import requests
+from backoff.types import Details
 from singer_sdk._singerlib.schema import resolve_schema_references
+from singer_sdk.helpers._batch import (
+    BaseBatchFileEncoding,
+    BatchConfig,
+    SDKBatchMessage,
+)
+from singer_sdk.helpers._state import get_state_if_exists, get_writeable_state_dict
 from singer_sdk.helpers.jsonpath import extract_jsonpath
+from singer_sdk.pagination import BaseAPIPaginator
 from singer_sdk.streams import RESTStream
 from singer_sdk.exceptions import RetriableAPIError, FatalAPIError
+from tap_clickup.batch import BoundedJSONLinesBatcher
+from tap_clickup.budget import BudgetedPaginator, OutOfTimeError, RunBudget
+from tap_clickup.cassette import Cassette
+from tap_clickup.concurrency import PartitionScheduler
+from tap_clickup.engine import AsyncEngine
+from tap_clickup.fingerprint import FingerprintIndex, FingerprintStore
+from tap_clickup.hierarchy import HierarchyCache, context_key
+from tap_clickup.pagination import DecodedJSONPathPaginator
+from tap_clickup.shard import shard_of
+from tap_clickup.retry import RetryAfterError, retry_after, retry_waits
+from tap_clickup.telemetry import CountingReader, Telemetry
+from tap_clickup.tokens import Token, TokenPool, TokenRefusedError, TokenRevokedError
+
+try:
+    import ijson
+except ImportError:  # Only needed for stream_responses, `pip install tap-clickup[streaming]`
+    ijson = None
 
 SCHEMAS_DIR = Path(__file__).parent / Path("./schemas")
 
+# Resolved schemas keyed by schema file, shared by every stream using the file
+_RESOLVED_SCHEMAS: Dict[Path, dict] = {}
+
+
+def jsonpath_to_prefix(jsonpath: str) -> str:
+    """Convert a records JSONPath like `$.tasks[*]` to an ijson prefix `tasks.item`."""
+    return jsonpath.lstrip("$").replace("[*]", ".item").strip(".")
+
+
+def projection_plan(schema: dict, mask, breadcrumb: tuple = ()) -> dict:
+    """Return the properties to strip from records given a selection mask.
+
+    Deselected properties map to None, objects with deselected properties of
+    their own map to a nested plan.
+    """
+    plan: Dict[str, Optional[dict]] = {}
+    for name, property_schema in schema.get("properties", {}).items():
+        property_breadcrumb = (*breadcrumb, "properties", name)
+        if not mask[property_breadcrumb]:
+            plan[name] = None
+        elif "properties" in property_schema:
+            nested = projection_plan(property_schema, mask, property_breadcrumb)
+            if nested:
+                plan[name] = nested
+    return plan
+
+
+def project(record: dict, plan: dict) -> dict:
+    """Strip the properties in `plan` from a record, in place."""
+    for name, nested in plan.items():
+        if nested is None:
+            record.pop(name, None)
+        elif isinstance(record.get(name), dict):
+            project(record[name], nested)
+    return record
+
 
 class ClickUpStream(RESTStream):
     """ClickUp stream class."""
 
     url_base = "https://api.clickup.com/api/v2"
     records_jsonpath = "$[*]"  # Or override `parse_response`.
-    next_page_token_jsonpath = "$.next_page"  # Or override `get_next_page_token`.
+    next_page_token_jsonpath = "$.next_page"  # Or override `page_paginator`.
     _LOG_REQUEST_METRIC_URLS: bool = True
+    _projection: Optional[dict] = None
+    # Whether partitions can take several requests, see `planned_requests`
+    paginated: bool = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Per thread sync state, partitions can be synced on worker threads
+        self._local = threading.local()
+        # Partitions cut short by the run budget, by `context_key`
+        self._stopped: set = set()
+        # What was decoded from each response, dropped along with the response
+        self._decoded: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
     @property
     def schema(self) -> dict:
         """Get schema.
 
         We are waiting on https://gitlab.com/meltano/sdk/-/issues/299 this works
-        well until then
+        well until then. The SDK reads this on every record, so refs are resolved
+        once per schema file and the result is shared (ie both list.json streams).
         Returns:
             JSON Schema dictionary for this stream.
         """
-        return resolve_schema_references(self._schema)
+        if self.schema_filepath is None:
+            return resolve_schema_references(self._schema)
+        if self.schema_filepath not in _RESOLVED_SCHEMAS:
+            _RESOLVED_SCHEMAS[self.schema_filepath] = resolve_schema_references(
+                self._schema
+            )
+        return _RESOLVED_SCHEMAS[self.schema_filepath]
 
     def get_url_params(
         self, context: Optional[dict], next_page_token: Optional[Any]
@@ -53,6 +136,120 @@ class ClickUpStream(RESTStream):
         headers["Authorization"] = self.config.get("api_token")
         return headers
 
+    @property
+    def stream_responses(self) -> bool:
+        """Return True if response bodies are parsed incrementally."""
+        return bool(self.config.get("stream_responses")) and ijson is not None
+
+    @property
+    def requests_session(self) -> requests.Session:
+        """Return the requests session, leaving bodies unread when streaming."""
+        session = super().requests_session
+        session.stream = self.stream_responses
+        adapter = None
+        if self.cassette is not None:
+            adapter = self.cassette.adapter
+        elif self.engine is not None:
+            adapter = self.engine.adapter
+        if adapter is not None and session.adapters.get(self.url_base) is not adapter:
+            session.mount(self.url_base, adapter)
+        return session
+
+    @property
+    def engine(self) -> Optional[AsyncEngine]:
+        """Return the async engine requests are sent through, if enabled."""
+        return self._tap.engine
+
+    @property
+    def cassette(self) -> Optional[Cassette]:
+        """Return the cassette requests are recorded to or replayed from, if any."""
+        return self._tap.cassette
+
+    @property
+    def token_pool(self) -> TokenPool:
+        """Return the tap wide pool of API tokens, each with its own rate limiter."""
+        return self._tap.token_pool
+
+    def authorize(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> Token:
+        """Pick the token to send the request with, then wait for its rate limiter.
+
+        Raises OutOfTimeError rather than wait past the end of the run budget.
+        """
+        token = self.token_pool.choose(self.token_pool.team_of(context))
+        prepared_request.headers["Authorization"] = token.value
+        waited = token.rate_limiter.acquire(max_wait=self.run_budget.remaining)
+        if waited is None:
+            raise OutOfTimeError("Waiting for the rate limit would outlast the budget")
+        self.telemetry.add(self.path, "pacing_seconds", waited)
+        return token
+
+    def _request(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        """Authorize the request and wait for the rate limiter, then send it."""
+        token = None
+        if (self.cassette is None or not self.cassette.replaying) and (
+            self.engine is None or not self.engine.claim(prepared_request)
+        ):
+            # Replayed responses don't spend any quota, prefetches already waited
+            token = self.authorize(prepared_request, context)
+        try:
+            return super()._request(prepared_request, context)
+        except RetryAfterError as e:
+            team_id = self.token_pool.team_of(context)
+            if token is not None and self.token_pool.has_spare(
+                token, team_id, time.time()
+            ):
+                # Another token has budget left, retry with it right away
+                e.wait = 0
+            raise
+        except TokenRefusedError as e:
+            team_id = self.token_pool.team_of(context)
+            if self.token_pool.revoke(e.token, team_id):
+                scope = "any team"
+            else:
+                scope = f"team {team_id}" if team_id else "listing teams"
+            self.logger.warning(
+                "API token %d was refused, no longer using it for %s",
+                self.token_pool.tokens.index(e.token),
+                scope,
+            )
+            if not self.token_pool.can_retry(team_id):
+                raise TokenRevokedError(str(e)) from e
+            # Another token takes over, no need to back off
+            e.wait = 0
+            raise
+
+    @property
+    def telemetry(self) -> Telemetry:
+        """Return the tap wide per endpoint statistics."""
+        return self._tap.telemetry
+
+    def backoff_wait_generator(self) -> Generator[Optional[float], Exception, None]:
+        """Wait as long as ClickUp asks on a 429, back off exponentially otherwise.
+
+        Retrying stops once the waits for one request would add up to more than
+        `retry_max_seconds`, or with OutOfTimeError once a wait would outlast the
+        run budget.
+        """
+        return retry_waits(
+            max_total=self.config.get("retry_max_seconds", 300),
+            check_wait=self.run_budget.check_wait,
+        )
+
+    def backoff_jitter(self, value: float) -> float:
+        """Return the wait as is, `retry_waits` already adds jitter."""
+        return value
+
+    def backoff_handler(self, details: Details) -> None:
+        """Count the retry, then log it."""
+        self.telemetry.add(self.path, "retries")
+        if isinstance(details.get("exception"), RetryAfterError):
+            self.telemetry.add(self.path, "throttle_sleep_seconds", details["wait"])
+        super().backoff_handler(details)
+
     def validate_response(self, response: requests.Response) -> None:
         """Validate HTTP response.
 
@@ -69,37 +266,36 @@ class ClickUpStream(RESTStream):
         .. _requests.Response:
             https://docs.python-requests.org/en/latest/api/#requests.Response
         """
+        token = self.token_pool.token_for(response.request)
+        if token is not None:
+            token.rate_limiter.update(response)
+        self.telemetry.add_latency(self.path, response.elapsed.total_seconds())
+        self.run_budget.observe(response.elapsed.total_seconds())
+        if not self.stream_responses:
+            self.telemetry.add(self.path, "bytes", len(response.content))
+        self.telemetry.maybe_log()
+
         if response.status_code == 429:
             msg = (
                 f"{response.status_code} Server Error: "
                 f"{response.reason} for path: {self.path}"
             )
-            reset_epoch: int = int(response.headers.get("X-RateLimit-Reset"))
-            date = response.headers.get("Date")
-            dformat = "%a, %d %b %Y %H:%M:%S %Z"
-            epoch = datetime(1970, 1, 1)
-            currentEpoch = (datetime.strptime(date, dformat) - epoch).total_seconds()
-            waitTime = reset_epoch - currentEpoch
+            waitTime = retry_after(response)
             self.logger.info(
                 f"API Limit reached, waiting {waitTime} seconds and will try again."
             )
-            if waitTime > 120:
-                self.logger.warning(
-                    "Wait time is more than 2 minutes, Waiting 60s and trying again."
-                )
-                time.sleep(60)
-            else:
-                time.sleep(waitTime)
-            # This will cause us to wait a bit longer than we need to due
-            # to exponential backoff but it's minimal, and is actually better
-            # for the clickup servers to have clients add some randomness
-            raise RetriableAPIError(msg)
+            self.telemetry.add(self.path, "throttled")
+            # The wait itself happens in backoff (see backoff_wait_generator) so
+            # only the thread making this request is parked
+            raise RetryAfterError(msg, waitTime)
 
         if 400 <= response.status_code < 500:
             msg = (
                 f"{response.status_code} Client Error: "
                 f"{response.reason} for path: {self.path}"
             )
+            if response.status_code == 401 and token is not None:
+                raise TokenRefusedError(msg, token)
             raise FatalAPIError(msg)
 
         elif 500 <= response.status_code < 600:
@@ -109,34 +305,465 @@ class ClickUpStream(RESTStream):
             )
             raise RetriableAPIError(msg)
 
+    def decode_response(self, response: requests.Response) -> Any:
+        """Return the decoded JSON body, decoding each response only once."""
+        decoded = self._decoded.setdefault(response, {})
+        if "json" not in decoded:
+            start = time.perf_counter()
+            decoded["json"] = response.json()
+            self.telemetry.add(self.path, "decode_seconds", time.perf_counter() - start)
+        return decoded["json"]
+
+    def response_records(self, response: requests.Response) -> List[dict]:
+        """Return the records in the response.
+
+        Extracted once per response and shared between `parse_response` and
+        the paginator, task pages are large enough that walking the
+        JSONPath twice shows up in profiles.
+        """
+        decoded = self._decoded.setdefault(response, {})
+        if "records" not in decoded:
+            body = self.decode_response(response)
+            start = time.perf_counter()
+            decoded["records"] = list(
+                extract_jsonpath(self.records_jsonpath, input=body)
+            )
+            self.telemetry.add(self.path, "decode_seconds", time.perf_counter() - start)
+        return decoded["records"]
+
+    def response_record_count(self, response: requests.Response) -> int:
+        """Return the number of records in an already parsed response."""
+        decoded = self._decoded.get(response, {})
+        if "record_count" in decoded:
+            return decoded["record_count"]
+        return len(self.response_records(response))
+
+    @property
+    def projection(self) -> dict:
+        """Return the plan stripping deselected properties from our records.
+
+        Computed once from the catalog. Empty when everything is selected, or
+        when we aren't selected at all and only sync to reach our children
+        (which need the properties `get_child_context` reads).
+        """
+        if self._projection is None:
+            self._projection = (
+                projection_plan(self.schema, self.mask) if self.selected else {}
+            )
+        return self._projection
+
     def parse_response(self, response: requests.Response) -> Iterable[dict]:
-        """Parse the response and return an iterator of result rows."""
-        yield from extract_jsonpath(self.records_jsonpath, input=response.json())
-
-    def from_parent_context(self, context: dict):
-        """ """
-        if self.partitions is None:
-            return context
-        else:
-            # Goal here is to combine Parent/Child relationships with Partions
-            # Another way to think about this is that Partitions are now
-            # Lists of contexts, used to create multiple requests based on one context.
-            # ie we have one team_id and we need a requst
-            # for archieved=true and archieved=False
-            # For N Child relationships if we have K base_partitions we'll end up with N*K partitions
-            # Assumption is that base_partition is a list of dicts
-            child_context_plus_base_partition = []
-            for partition in self.base_partition:  # pylint: disable=not-an-iterable
-                child_plus_partition = context.copy()
-                child_plus_partition.update(partition)
-                child_context_plus_base_partition.append(child_plus_partition)
-            self.partitions = child_context_plus_base_partition
-
-            return None  # self.partitions handles context in the _sync call. Important this is None to use partitions
+        """Parse the response and return an iterator of result rows.
+
+        With `stream_responses` records are parsed from the socket one at a time,
+        so memory stays bounded no matter how large the page is. Deselected
+        properties are stripped right away, so the SDK doesn't conform,
+        validate and serialize them only to drop them at the end.
+        """
+        plan = self.projection
+        if not self.stream_responses:
+            records = self.response_records(response)
+            self.telemetry.add(self.path, "records", len(records))
+            for record in records:
+                yield project(record, plan) if plan else record
+            return
+
+        response.raw.decode_content = True
+        raw = CountingReader(response.raw)
+        records = ijson.items(
+            raw, jsonpath_to_prefix(self.records_jsonpath), use_float=True
+        )
+        count = 0
+        decode_seconds = 0.0
+        while True:
+            start = time.perf_counter()
+            record = next(records, None)
+            decode_seconds = decode_seconds + time.perf_counter() - start
+            if record is None:
+                break
+            count = count + 1
+            yield project(record, plan) if plan else record
+        self._decoded.setdefault(response, {})["record_count"] = count
+        self.telemetry.add(self.path, "records", count)
+        self.telemetry.add(self.path, "bytes", raw.bytes)
+        self.telemetry.add(self.path, "decode_seconds", decode_seconds)
+
+    @property
+    def base_partition(self) -> List[dict]:
+        """Partitions requested for every parent context, empty if unpartitioned."""
+        return []
+
+    @property
+    def scheduler(self) -> PartitionScheduler:
+        """Return the tap wide scheduler used to sync child partitions."""
+        return self._tap.scheduler
+
+    def from_parent_context(self, context: dict) -> List[dict]:
+        """Return the contexts to sync for one parent context.
+
+        Goal here is to combine Parent/Child relationships with Partitions.
+        ie we have one team_id and we need a request for archived=true and
+        archived=false. For N Child relationships if we have K base_partitions
+        we'll end up with N*K contexts.
+
+        This doesn't touch any stream attributes so partitions of the same
+        stream can be synced concurrently.
+        """
+        if not self.base_partition:
+            return [context]
+        return [
+            {**context, **partition}
+            for partition in self.base_partition  # pylint: disable=not-an-iterable
+        ]
+
+    def sync_interval(self, context: dict) -> Optional[float]:
+        """Return the seconds to leave between syncs of a partition, None for always.
+
+        Archived objects rarely change, with `archived_sync_interval_hours` their
+        partitions are only synced once per interval.
+        """
+        hours = self.config.get("archived_sync_interval_hours")
+        if hours and context.get("archived") == "true":
+            return hours * 3600
+        return None
+
+    def state_partition(self, context: dict) -> dict:
+        """Return the context of the partition whose state holds `last_synced`."""
+        return context
+
+    def partition_due(self, context: dict) -> bool:
+        """Return True if the partition should be synced this run."""
+        interval = self.sync_interval(context)
+        if not interval:
+            return True
+        with self.scheduler.lock:
+            last_synced = get_state_if_exists(
+                self.tap_state, self.name, self.state_partition(context), "last_synced"
+            )
+        if not last_synced:
+            return True
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(last_synced)
+        return age.total_seconds() >= interval
+
+    def partitions_to_sync(self, parent_context: dict) -> List[dict]:
+        """Return the contexts from `from_parent_context` this shard syncs now."""
+        if self.run_budget.exhausted:
+            return []
+        return [
+            context
+            for context in self.from_parent_context(context=parent_context)
+            if self.partition_in_shard(context) and self.partition_due(context)
+        ]
+
+    def partitions_synced(self, contexts: List[dict]) -> None:
+        """Run once all contexts from one `from_parent_context` call are synced.
+
+        Records when partitions with a sync interval were synced.
+        """
+        partitions = [
+            self.state_partition(context)
+            for context in contexts
+            if self.sync_interval(context) and not self.stopped(context)
+        ]
+        if not partitions:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        with self.scheduler.lock:
+            for partition in partitions:
+                state = get_writeable_state_dict(self.tap_state, self.name, partition)
+                state["last_synced"] = now
+        self.scheduler.write_state()
+
+    @property
+    def run_budget(self) -> RunBudget:
+        """Return the tap wide time budget of the run."""
+        return self._tap.run_budget
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request every page, stopping the partition rather than wait out of time."""
+        try:
+            yield from super().request_records(context)
+        except OutOfTimeError as e:
+            self.logger.info("Stopping %s: %s", context or self.name, e)
+            self._local.stopped = True
+
+    def page_paginator(self) -> BaseAPIPaginator:
+        """Return a paginator over this stream's pages."""
+        return DecodedJSONPathPaginator(self)
+
+    def get_new_paginator(self) -> BudgetedPaginator:
+        """Return the paginator, stopping after the page in flight once out of time."""
+        return BudgetedPaginator(
+            self.page_paginator(),
+            self.run_budget,
+            on_stop=lambda: setattr(self._local, "stopped", True),
+        )
+
+    def stop(self, context: Optional[dict]) -> None:
+        """Remember that a partition was cut short by the run budget."""
+        with self.scheduler.lock:
+            self._stopped.add(context_key(context))
+            self.run_budget.stopped = True
+
+    def stopped(self, context: Optional[dict]) -> bool:
+        """Return True if the partition was cut short by the run budget."""
+        with self.scheduler.lock:
+            return context_key(context) in self._stopped
+
+    def planned_requests(self, context: Optional[dict]) -> int:
+        """Return the requests a sync of the partition makes, at least."""
+        return 1
+
+    def prefetch(self, context: dict) -> None:
+        """Start requesting a partition's first page before it's synced.
+
+        Incremental streams build requests from their bookmark, which can't be
+        read safely before the partition is synced, so they aren't prefetched.
+        """
+        if self.replication_key:
+            return
+        request = self.prepare_request(context, next_page_token=None)
+        try:
+            self.authorize(request, context)
+        except OutOfTimeError:
+            return
+        self.engine.prefetch(request, timeout=self.timeout)
+
+    def prefetch_children(self, child_context: dict) -> None:
+        """Prefetch the first page of every child partition of one record."""
+        for child_stream in self.child_streams:
+            if child_stream.selected or child_stream.has_selected_descendents:
+                for context in child_stream.partitions_to_sync(child_context):
+                    child_stream.prefetch(context)
+
+    def lookahead(
+        self, items: Iterable, child_context: Callable[[Any], dict]
+    ) -> Iterator:
+        """Yield items, prefetching children up to `max_connections` items ahead.
+
+        With the async engine this keeps requests for the next parent records'
+        children in flight while the current one's children are synced.
+        """
+        window: deque = deque()
+        for item in items:
+            self.prefetch_children(child_context(item))
+            window.append(item)
+            if len(window) > self.engine.max_connections:
+                yield window.popleft()
+        yield from window
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return this shard's records, prefetching children with the async engine."""
+        records = super().get_records(context)
+        if self.config.get("shard_count", 1) > 1:
+            records = (record for record in records if self.owns(record))
+        return self.with_prefetch(records, context)
+
+    def in_shard(self, key: str) -> bool:
+        """Return True if the team or space id belongs to this shard."""
+        count = self.config.get("shard_count", 1)
+        return count <= 1 or shard_of(key, count) == self.config.get("shard_index", 0)
+
+    def owns(self, record: dict) -> bool:
+        """Return True if this shard syncs the record and everything below it."""
+        return True
+
+    def partition_in_shard(self, context: dict) -> bool:
+        """Return True if this shard syncs the partition.
+
+        Sharding by space, streams right below a team (tasks, goals...) are
+        synced by the shard the team belongs to.
+        """
+        if self.config.get("shard_by") == "space" and "team_id" in context:
+            return self.in_shard(context["team_id"])
+        return True
+
+    def with_prefetch(self, records: Iterable[dict], context: Optional[dict]):
+        """Wrap records to prefetch their children's first pages, if enabled."""
+        if self.engine is None or not self.child_streams:
+            return records
+        return self.lookahead(
+            records, lambda record: self.get_child_context(record, context)
+        )
 
     def _sync_children(self, child_context: dict) -> None:
         for child_stream in self.child_streams:
             if child_stream.selected or child_stream.has_selected_descendents:
-                child_stream.sync(
-                    child_stream.from_parent_context(context=child_context)
-                )
+                contexts = child_stream.partitions_to_sync(child_context)
+                for context in contexts:
+                    self.scheduler.submit(child_stream, context)
+                self.scheduler.call_after(child_stream.partitions_synced, contexts)
+
+    @property
+    def hierarchy_cache(self) -> HierarchyCache:
+        """Return the tap wide cache of child contexts per parent context."""
+        return self._tap.hierarchy_cache
+
+    def _sync_records(self, context: Optional[dict] = None, *, write_messages=True):
+        if self.run_budget.exhausted:
+            # Out of time before we started, an empty state keeps our place, ie
+            # an unstarted backfill window is resumed by the next run
+            self.get_context_state(context)
+            self.stop(context)
+            return
+        self._local.stopped = False
+        cache = self.hierarchy_cache
+        caching = cache.enabled and bool(self.child_streams)
+        if caching and not self.selected:
+            cached = cache.get(self.name, context)
+            if cached is not None:
+                # We're only walked to reach our children, replay them instead
+                if self.engine is not None:
+                    cached = self.lookahead(cached, lambda child_context: child_context)
+                for child_context in cached:
+                    self.token_pool.learn(context, child_context)
+                    self._sync_children(child_context)
+                self.scheduler.drain()
+                return
+        if caching:
+            cache.begin(self.name, context)
+
+        yield from self._sync_changed_records(context, write_messages)
+
+        if self._local.stopped:
+            self.stop(context)
+        elif caching:
+            cache.complete(self.name, context)
+        # Children may still be syncing on worker threads, no-op when sequential
+        self.scheduler.drain()
+
+    def _sync_changed_records(self, context: Optional[dict], write_messages: bool):
+        index = self.fingerprint_index(context)
+        self._local.fingerprints = index
+        try:
+            for record in super()._sync_records(context, write_messages=write_messages):
+                if index is None or index.skip is not record:
+                    yield record
+        finally:
+            self._local.fingerprints = None
+        if index is not None and not self._local.stopped:
+            self.save_fingerprints(context, index)
+
+    def fingerprint_index(self, context: Optional[dict]) -> Optional[FingerprintIndex]:
+        """Return the partition's fingerprint index, None if all records are emitted.
+
+        With `emit_changed_only` full table streams only emit records that are new
+        or changed since the last run. Every record is emitted on the first run
+        and then every `full_refresh_interval_hours`.
+        """
+        if (
+            not self.config.get("emit_changed_only")
+            or self.replication_key
+            or not self.selected
+        ):
+            return None
+        state = self.get_context_state(context)
+        previous = self.fingerprint_store.get(
+            self.name, self._get_state_partition_context(context)
+        )
+        refresh = previous is None
+        hours = self.config.get("full_refresh_interval_hours")
+        if hours and not refresh:
+            refreshed = state.get("fingerprints_refreshed")
+            refresh = (
+                not refreshed
+                or (
+                    datetime.now(timezone.utc) - datetime.fromisoformat(refreshed)
+                ).total_seconds()
+                >= hours * 3600
+            )
+        return FingerprintIndex(previous or {}, refresh=refresh)
+
+    @property
+    def fingerprint_store(self) -> FingerprintStore:
+        """Return the tap wide fingerprint indexes, written with the final STATE."""
+        return self._tap.fingerprint_store
+
+    def save_fingerprints(
+        self, context: Optional[dict], index: FingerprintIndex
+    ) -> None:
+        """Replace the partition's fingerprint index once it's fully synced."""
+        self.fingerprint_store.save(
+            self.name, self._get_state_partition_context(context), index.current
+        )
+        if index.refresh:
+            state = self.get_context_state(context)
+            state["fingerprints_refreshed"] = datetime.now(timezone.utc).isoformat()
+            self._is_state_flushed = False
+        if index.skipped:
+            self.logger.info(
+                "Skipped %d unchanged records of %s",
+                index.skipped,
+                context or self.name,
+            )
+
+    def _process_record(self, record, child_context=None, partition_context=None):
+        # child_context is the record's own context, the parent of its children's
+        if self.child_streams:
+            self.token_pool.learn(
+                child_context, self.get_child_context(record, child_context)
+            )
+        super()._process_record(record, child_context, partition_context)
+        index = getattr(self._local, "fingerprints", None)
+        if index is not None:
+            index.check(record, self.primary_keys)
+        if (
+            self.hierarchy_cache.enabled
+            and self.child_streams
+            and self.stream_maps[0].get_filter_result(record)
+        ):
+            self.hierarchy_cache.add(
+                self.name, child_context, self.get_child_context(record, child_context)
+            )
+
+    def get_context_state(self, context: Optional[dict]) -> dict:
+        """Return a writable state dict for the given context.
+
+        Partitions synced on a worker thread get a private copy of their state,
+        merged back once their records are written.
+        """
+        return self.scheduler.context_state(
+            self.name, self._get_state_partition_context(context)
+        )
+
+    def _write_schema_message(self) -> None:
+        for schema_message in self._generate_schema_messages():
+            self.scheduler.emit(schema_message)
+
+    def _write_record_message(self, record: dict) -> None:
+        index = getattr(self._local, "fingerprints", None)
+        if index is not None and index.skip is record:
+            return
+        for record_message in self._generate_record_messages(record):
+            self.scheduler.emit(record_message)
+        self._is_state_flushed = False
+
+    def get_batches(
+        self, batch_config: BatchConfig, context: Optional[dict] = None
+    ) -> Iterable[tuple]:
+        """Yield an (encoding, manifest) tuple for each batch file written."""
+        max_mb = self.config.get("batch_file_max_mb")
+        batcher = BoundedJSONLinesBatcher(
+            tap_name=self.tap_name,
+            stream_name=self.name,
+            batch_config=batch_config,
+            max_bytes=int(max_mb * 2**20) if max_mb else None,
+        )
+        records = self._sync_records(context, write_messages=False)
+        for manifest in batcher.get_batches(records=records):
+            yield batch_config.encoding, manifest
+
+    def _write_batch_message(
+        self, encoding: BaseBatchFileEncoding, manifest: List[str]
+    ) -> None:
+        self.scheduler.emit(
+            SDKBatchMessage(stream=self.name, encoding=encoding, manifest=manifest)
+        )
+        self._is_state_flushed = False
+
+    def _write_state_message(self) -> None:
+        # _is_state_flushed is shared by every worker syncing this stream, so
+        # workers always queue their checkpoint
+        if not self._is_state_flushed or self.scheduler.current_job is not None:
+            self.scheduler.write_state()
+            self._is_state_flushed = True
@@ -0,0 +1,345 @@
+"""Concurrent sync of independent child stream partitions."""
+
+import copy
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import singer_sdk._singerlib as singer
+from singer_sdk.helpers._batch import SDKBatchMessage
+from singer_sdk.helpers._state import get_state_if_exists, get_writeable_state_dict
+
+from tap_clickup.output import MessageWriter
+
+
+class SyncAborted(Exception):
+    """Raised on workers still syncing once the sync has failed, to stop them."""
+
+
+class SyncJob:
+    """Output of one child stream partition synced on a worker thread.
+
+    `items` holds Singer messages, nested jobs, state commits and callbacks in the
+    order they were produced, so flushing a job replays its output in order. The
+    main thread flushes items while the worker is still producing them, and the
+    worker waits once `max_items` are waiting to be flushed. `states` holds the
+    job's partition states, which only reach the tap state through a commit once
+    the records before it have been written.
+    """
+
+    def __init__(
+        self,
+        max_items: Optional[int] = None,
+        failed: Callable[[], bool] = lambda: False,
+    ) -> None:
+        self.items: Deque[Any] = deque()
+        self.states: Dict[Tuple[str, str], Tuple[str, dict, dict]] = {}
+        self.future: Optional[Future] = None
+        self.task: Optional[Tuple[Any, dict]] = None
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.max_items = max_items
+        self._failed = failed
+        self._condition = threading.Condition()
+
+    def append(self, item: Any) -> None:
+        """Add an item to the job's output, waiting while the buffer is full."""
+        with self._condition:
+            while self.max_items and len(self.items) >= self.max_items:
+                if self._failed():
+                    raise SyncAborted("The sync failed, dropping this partition")
+                # Timeout to notice a failure, nothing flushes us then
+                self._condition.wait(timeout=1)
+            self.items.append(item)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Mark the job as done, re-raising `error` when it is flushed."""
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._condition.notify_all()
+
+    def iter_items(self) -> Iterator[Any]:
+        """Yield items as the worker produces them, until the job is done."""
+        while True:
+            with self._condition:
+                while not self.items and not self.done:
+                    self._condition.wait()
+                if not self.items:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                # Flushed items aren't kept, and make room for the worker
+                item = self.items.popleft()
+                self._condition.notify_all()
+            yield item
+
+
+class _StateCommit:
+    """Marker that merges partition states into the tap state when flushed."""
+
+    def __init__(self, states: List[Tuple[str, dict, dict]]) -> None:
+        self.states = states
+
+
+class _Callback:
+    """Marker for a function to call once everything before it is flushed."""
+
+    def __init__(self, func: Callable, args: tuple) -> None:
+        self.func = func
+        self.args = args
+
+
+class PartitionScheduler:
+    """Fan out child stream partitions across a pool of worker threads.
+
+    With `max_workers` of 1 (the default) every call runs inline and the tap
+    behaves exactly as a plain sequential sync.
+
+    Workers never block on each other: a partition synced on a worker runs its own
+    children as nested jobs, and only the main thread waits on results. Output is
+    written by the main thread in submission order, so every partition's messages
+    stay contiguous and each STATE message only covers records already written.
+
+    Parents keep paging while their children are queued, so every level of the
+    hierarchy fetches at once. At most `max_pending` jobs are queued, running or
+    waiting to be flushed: past that the main thread flushes the oldest job, and
+    a worker syncs the child partition itself, which slows down its parent. Each
+    job buffers at most `max_buffered` messages before its worker waits for the
+    main thread to flush them, so at most `max_pending` times `max_buffered`
+    messages are held in memory. Since every worker may be waiting on a job
+    further down the queue, the main thread runs a job that hasn't started yet
+    on a thread of its own once it's next to be flushed.
+
+    Once a job fails queued jobs are cancelled, and workers still running stop
+    with SyncAborted at their next message or child partition.
+    """
+
+    def __init__(
+        self,
+        tap_state: dict,
+        max_workers: int = 1,
+        writer: Optional[MessageWriter] = None,
+        max_pending: Optional[int] = None,
+        max_buffered: Optional[int] = None,
+    ) -> None:
+        self.tap_state = tap_state
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * 4
+        self.max_buffered = max_buffered
+        self.writer = writer or MessageWriter()
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[SyncJob] = []
+        self._records_since_state = False
+        self._outstanding = 0
+        self._failed = False
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if partitions are synced concurrently."""
+        return self.max_workers > 1
+
+    @property
+    def current_job(self) -> Optional[SyncJob]:
+        """Return the job being synced on this thread, None on the main thread."""
+        return getattr(self._local, "job", None)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Return the worker pool, created on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="tap-clickup"
+            )
+        return self._executor
+
+    def submit(self, stream, context: dict) -> None:
+        """Sync `stream` for `context`, on a worker if concurrency is enabled."""
+        if not self.enabled:
+            stream.sync(context)
+            return
+
+        with self.lock:
+            if self._failed:
+                raise SyncAborted("The sync failed, not syncing more partitions")
+            inline = (
+                self.current_job is not None and self._outstanding >= self.max_pending
+            )
+            if not inline:
+                self._outstanding = self._outstanding + 1
+        if inline:
+            # Backpressure, waiting for a slot could deadlock the pool
+            stream.sync(context)
+            return
+        job = SyncJob(self.max_buffered, lambda: self._failed)
+        job.task = (stream, context)
+        job.future = self.executor.submit(self._run, job, stream, context)
+        self._enqueue(job)
+        if self.current_job is None:
+            # Backpressure, don't let the main thread race too far ahead
+            while self._pending and self._outstanding > self.max_pending:
+                self._flush_next()
+
+    def call_after(self, func: Callable, *args: Any) -> None:
+        """Call `func` on the main thread once everything submitted so far is flushed.
+
+        Used to act on the merged state of a group of partitions, ie combining
+        backfill windows into one bookmark.
+        """
+        if not self.enabled:
+            func(*args)
+            return
+
+        job = SyncJob()
+        job.append(_Callback(func, args))
+        job.finish()
+        self._enqueue(job)
+
+    def _enqueue(self, job: SyncJob) -> None:
+        parent_job = self.current_job
+        if parent_job is not None:
+            parent_job.append(job)
+            return
+        self._pending.append(job)
+        self._flush_finished()
+
+    def _run(self, job: SyncJob, stream, context: dict) -> None:
+        if self._failed:
+            # Queued before the failure and not cancelled in time
+            job.finish(SyncAborted("The sync failed, not syncing this partition"))
+            return
+        self._local.job = job
+        try:
+            stream.sync(context)
+        except BaseException as ex:  # Re-raised on the main thread when flushed
+            job.finish(ex)
+            return
+        finally:
+            self._local.job = None
+        job.append(_StateCommit(list(job.states.values())))
+        job.finish()
+
+    def emit(self, message: singer.Message) -> None:
+        """Write a Singer message, or buffer it if called from a worker."""
+        job = self.current_job
+        if job is not None:
+            if self._failed:
+                raise SyncAborted("The sync failed, dropping this partition")
+            job.append(message)
+            return
+        with self.lock:
+            self.writer.write(message)
+            if isinstance(message, (singer.RecordMessage, SDKBatchMessage)):
+                self._records_since_state = True
+
+    def write_state(self) -> None:
+        """Write a STATE message.
+
+        On a worker this queues a checkpoint of the job's partition states instead,
+        written once the records before it have been flushed.
+        """
+        job = self.current_job
+        if job is not None:
+            job.append(_StateCommit(copy.deepcopy(list(job.states.values()))))
+            return
+        with self.lock:
+            self.writer.write(singer.StateMessage(value=self.tap_state))
+            self._records_since_state = False
+
+    def context_state(self, stream_name: str, context: Optional[dict]) -> dict:
+        """Return the writable state dict for a stream partition.
+
+        On a worker this is a private copy, merged into the tap state on commit.
+        """
+        job = self.current_job
+        with self.lock:
+            if job is None or not context:
+                return get_writeable_state_dict(
+                    self.tap_state, stream_name, state_partition_context=context
+                )
+            key = (stream_name, repr(sorted(context.items())))
+            if key not in job.states:
+                existing = get_state_if_exists(
+                    self.tap_state, stream_name, state_partition_context=context
+                )
+                state = copy.deepcopy(existing) if existing else {"context": context}
+                job.states[key] = (stream_name, context, state)
+            return job.states[key][2]
+
+    def drain(self) -> None:
+        """Wait for every outstanding job and flush it, main thread only."""
+        if self.current_job is not None or not self._pending:
+            return
+        while self._pending:
+            self._flush_next()
+        self.write_state()
+
+    def close(self) -> None:
+        """Shut the worker pool down, once every job is flushed or the sync failed.
+
+        After a failure queued jobs are cancelled and running ones aren't waited
+        for, they stop by themselves.
+        """
+        if self._executor is None:
+            return
+        if self._failed and sys.version_info >= (3, 9):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            self._executor.shutdown(wait=not self._failed)
+        self._executor = None
+
+    def _flush_finished(self) -> None:
+        while self._pending and self._pending[0].done:
+            self._flush_next()
+
+    def _flush_next(self) -> None:
+        """Flush the oldest job, on error stop every other job and re-raise."""
+        try:
+            self._flush_job(self._pending.pop(0))
+        except BaseException:
+            with self.lock:
+                self._failed = True
+            self._pending = []
+            self._outstanding = 0
+            self.close()
+            raise
+
+    def _flush_job(self, job: SyncJob) -> None:
+        if job.future is not None and job.future.cancel():
+            # Not started, every worker may be waiting for a later job's flush
+            threading.Thread(
+                target=self._run,
+                args=(job, *job.task),
+                name="tap-clickup-next",
+                daemon=True,
+            ).start()
+        for item in job.iter_items():
+            if isinstance(item, SyncJob):
+                self._flush_job(item)
+            elif isinstance(item, _StateCommit):
+                self._commit(item)
+            elif isinstance(item, _Callback):
+                item.func(*item.args)
+            else:
+                self.emit(item)
+        if job.future is not None:
+            with self.lock:
+                self._outstanding = self._outstanding - 1
+
+    def _commit(self, commit: _StateCommit) -> None:
+        if not commit.states:
+            return
+        with self.lock:
+            for stream_name, context, state in commit.states:
+                target = get_writeable_state_dict(
+                    self.tap_state, stream_name, state_partition_context=context
+                )
+                target.clear()
+                target.update(copy.deepcopy(state))
+            if self._records_since_state:
+                self.write_state()
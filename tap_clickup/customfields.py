@@ -0,0 +1,75 @@
+"""Custom fields shared by the custom field streams over one run."""
+
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# ("team", team_id), ("space", space_id) or ("folder", folder_id)
+Scope = Tuple[str, str]
+
+
+class CustomFieldIndex:
+    """Custom fields seen this run, by scope, by stream and by list.
+
+    With `dedupe_custom_fields` fields are requested once per workspace, space
+    and folder instead of once per list, and both custom field streams share
+    the responses. Each stream writes a field once, and the fields of every
+    list are kept until `list_customfield` writes them.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._scopes: Dict[Scope, List[dict]] = {}
+        self._scope_locks: Dict[Scope, threading.Lock] = {}
+        self._planned: Set[Scope] = set()
+        self._written: Set[Tuple[str, str]] = set()
+        self._lists: Dict[str, Tuple[str, ...]] = {}
+
+    def fields(
+        self, scope: Scope, fetch: Callable[[], Optional[List[dict]]]
+    ) -> Optional[List[dict]]:
+        """Return the fields defined on a scope, calling `fetch` the first time.
+
+        Partitions of the same scope wait for the one fetching it. `fetch`
+        returns None when it was cut short, the next partition fetches again.
+        """
+        with self._lock:
+            scope_lock = self._scope_locks.setdefault(scope, threading.Lock())
+        with scope_lock:
+            with self._lock:
+                fields = self._scopes.get(scope)
+            if fields is None:
+                fields = fetch()
+                if fields is not None:
+                    with self._lock:
+                        self._scopes[scope] = fields
+            return fields
+
+    def plan(self, scope: Scope) -> bool:
+        """Return True the first time a scope is planned, False after that."""
+        with self._lock:
+            if scope in self._planned:
+                return False
+            self._planned.add(scope)
+            return True
+
+    def claim(self, stream_name: str, field_id: str) -> bool:
+        """Return True the first time a stream sees a field, False after that."""
+        key = (stream_name, field_id)
+        with self._lock:
+            if key in self._written:
+                return False
+            self._written.add(key)
+            return True
+
+    def map_list(self, list_id: str, field_ids: List[str]) -> None:
+        """Remember the fields available on a list."""
+        with self._lock:
+            self._lists[list_id] = tuple(field_ids)
+
+    def mappings(self) -> Iterator[dict]:
+        """Yield a record mapping each list to each of its fields."""
+        with self._lock:
+            lists = list(self._lists.items())
+        for list_id, field_ids in lists:
+            for field_id in field_ids:
+                yield {"list_id": list_id, "field_id": field_id}
@@ -0,0 +1,159 @@
+"""Asyncio HTTP engine keeping many ClickUp requests in flight from one thread."""
+
+import asyncio
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from tap_clickup.cassette import prepared_request_key
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:  # Only needed for http_engine async, `pip install tap-clickup[async]`
+    aiohttp = None
+
+
+class AsyncEngine:
+    """aiohttp session running on its own event loop thread.
+
+    Requests can be sent from any thread and run concurrently on the loop, at
+    most `max_connections` at a time over a pool of keep-alive connections.
+    Bodies are decompressed by aiohttp and handed back as `requests.Response`s,
+    so validation, retries and parsing work exactly as with `requests`.
+
+    `prefetch` starts a request before anyone asks for it. `claim` takes its
+    response (matched like cassettes match requests) for the claiming thread's
+    next `send`. At most `max_prefetched` unclaimed responses are kept, oldest
+    dropped first.
+    """
+
+    def __init__(self, max_connections: int = 20, max_prefetched: int = 200) -> None:
+        self.max_connections = max_connections
+        self.max_prefetched = max_prefetched
+        self._prefetched: "OrderedDict[tuple, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Per thread (key, future) claimed for the thread's next send
+        self._claimed = threading.local()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="tap-clickup-http", daemon=True
+        )
+        self._thread.start()
+        self._session = self._submit(self._open()).result()
+        self.adapter = AsyncAdapter(self)
+
+    def _submit(self, coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _open(self) -> "aiohttp.ClientSession":
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        return aiohttp.ClientSession(connector=connector, auto_decompress=True)
+
+    async def _fetch(
+        self, request: requests.PreparedRequest, timeout
+    ) -> requests.Response:
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            client_timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        else:
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with self._session.request(
+            request.method,
+            yarl.URL(request.url, encoded=True),
+            headers=dict(request.headers),
+            data=request.body,
+            timeout=client_timeout,
+            allow_redirects=False,
+        ) as raw:
+            body = await raw.read()
+        response = requests.Response()
+        response.status_code = raw.status
+        response.reason = raw.reason
+        response.headers = CaseInsensitiveDict(raw.headers.items())
+        # Already decompressed
+        response.headers.pop("Content-Encoding", None)
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(body)
+        response.encoding = get_encoding_from_headers(response.headers)
+        return response
+
+    def request(self, request: requests.PreparedRequest, timeout=None) -> Future:
+        """Start a request, return a future of its response."""
+        return self._submit(self._fetch(request, timeout))
+
+    def prefetch(self, request: requests.PreparedRequest, timeout=None) -> None:
+        """Start a request now for a `send` of the same request to pick up later."""
+        key = prepared_request_key(request)
+        with self._lock:
+            if key in self._prefetched:
+                return
+            self._prefetched[key] = self.request(request, timeout)
+            while len(self._prefetched) > self.max_prefetched:
+                _, dropped = self._prefetched.popitem(last=False)
+                dropped.cancel()
+
+    def claim(self, request: requests.PreparedRequest) -> bool:
+        """Take the prefetched response of a request for this thread's next `send`.
+
+        Returns False when there is none to take (never prefetched, dropped or
+        claimed by another thread), `send` then requests it.
+        """
+        key = prepared_request_key(request)
+        with self._lock:
+            future = self._prefetched.pop(key, None)
+        self._claimed.value = (key, future) if future is not None else None
+        return future is not None
+
+    def send(
+        self, request: requests.PreparedRequest, timeout=None
+    ) -> requests.Response:
+        """Return the response claimed for the request, or request it."""
+        claimed = getattr(self._claimed, "value", None)
+        self._claimed.value = None
+        if claimed is not None and claimed[0] == prepared_request_key(request):
+            future = claimed[1]
+        else:
+            future = self.request(request, timeout)
+        try:
+            return future.result()
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e, request=request) from e
+        except aiohttp.ClientPayloadError as e:
+            raise requests.exceptions.ChunkedEncodingError(e, request=request) from e
+        except aiohttp.ClientError as e:
+            raise requests.exceptions.ConnectionError(e, request=request) from e
+
+    def close(self) -> None:
+        """Drop prefetched responses, close the connections and stop the loop."""
+        with self._lock:
+            for future in self._prefetched.values():
+                future.cancel()
+            self._prefetched.clear()
+        self._submit(self._session.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class AsyncAdapter(BaseAdapter):
+    """Transport adapter sending requests through an `AsyncEngine`."""
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        super().__init__()
+        self.engine = engine
+
+    def send(self, request, timeout=None, **kwargs) -> requests.Response:
+        response = self.engine.send(request, timeout=timeout)
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,96 @@
+"""Fingerprints of full table records, to only emit the ones that changed."""
+
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from singer_sdk.helpers._state import get_writeable_state_dict
+
+
+def fingerprint(record: dict) -> str:
+    """Return a stable hash of a record, independent of key order."""
+    data = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+class FingerprintIndex:
+    """Fingerprints of one partition's records, by primary key.
+
+    `previous` is the index saved in the partition's state by the last run. A
+    record is changed if it's new or its fingerprint differs, with `refresh`
+    every record counts as changed. `current` collects this run's index, records
+    that disappeared are dropped from it.
+    """
+
+    def __init__(self, previous: Dict[str, str], refresh: bool = False) -> None:
+        self.previous = previous
+        self.refresh = refresh
+        self.current: Dict[str, str] = {}
+        self.skip: Optional[dict] = None
+        self.skipped = 0
+
+    def check(self, record: dict, primary_keys: List[str]) -> bool:
+        """Return True if the record changed, otherwise set it as `skip`."""
+        key = "|".join(str(record.get(name)) for name in primary_keys)
+        digest = fingerprint(record)
+        self.current[key] = digest
+        if self.refresh or self.previous.get(key) != digest:
+            self.skip = None
+            return True
+        self.skip = record
+        self.skipped = self.skipped + 1
+        return False
+
+
+class FingerprintStore:
+    """Fingerprint indexes of every partition, kept out of the state mid-run.
+
+    An index grows with the partition's record count. Left in the state it
+    would be part of every STATE message, so indexes are taken out of the state
+    when the sync starts and only put back for the final STATE. A run that
+    fails leaves them out, and the next one emits every record again.
+    """
+
+    def __init__(self) -> None:
+        self.indexes: Dict[Tuple[str, str], Tuple[str, Optional[dict], dict]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(stream_name: str, context: Optional[dict]) -> Tuple[str, str]:
+        return stream_name, json.dumps(context or None, sort_keys=True)
+
+    def load(self, tap_state: dict) -> None:
+        """Move every index from the state into the store."""
+        for stream_name, stream_state in tap_state.get("bookmarks", {}).items():
+            for state in [stream_state, *stream_state.get("partitions", [])]:
+                if "fingerprints" in state:
+                    context = state.get("context")
+                    self.indexes[self._key(stream_name, context)] = (
+                        stream_name,
+                        context,
+                        state.pop("fingerprints"),
+                    )
+
+    def get(self, stream_name: str, context: Optional[dict]) -> Optional[dict]:
+        """Return a partition's index, None if it has none."""
+        with self._lock:
+            entry = self.indexes.get(self._key(stream_name, context))
+        return entry[2] if entry else None
+
+    def save(self, stream_name: str, context: Optional[dict], index: dict) -> None:
+        """Replace a partition's index."""
+        with self._lock:
+            self.indexes[self._key(stream_name, context)] = (
+                stream_name,
+                context,
+                index,
+            )
+
+    def dump(self, tap_state: dict) -> bool:
+        """Put every index back into the state, return True if there was any."""
+        with self._lock:
+            for stream_name, context, index in self.indexes.values():
+                state = get_writeable_state_dict(tap_state, stream_name, context)
+                state["fingerprints"] = index
+            return bool(self.indexes)
@@ -0,0 +1,84 @@
+"""On-disk cache of the team/space/folder/list hierarchy."""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def context_key(context: Optional[dict]) -> str:
+    """Return a stable string key for a stream context."""
+    return json.dumps(context, sort_keys=True)
+
+
+class HierarchyCache:
+    """Child contexts produced by each parent stream context, persisted as JSON.
+
+    Walking team -> space -> folder -> list just to find list ids for the custom
+    field streams costs hundreds of requests per run, and the hierarchy rarely
+    changes. A parent stream that isn't selected itself can replay the cached
+    child contexts for a context instead of requesting it again.
+
+    Entries are only stored once a context has been fully synced, and expire after
+    `ttl_seconds`. With `refresh` every context is requested again and re-cached.
+    """
+
+    def __init__(
+        self, path: Optional[str], ttl_seconds: float, refresh: bool = False
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.ttl_seconds = ttl_seconds
+        self.refresh = refresh
+        self._entries: Dict[str, Dict[str, dict]] = {}
+        self._in_progress: Dict[tuple, List[dict]] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists() and not refresh:
+            self._entries = json.loads(self.path.read_text()).get("streams", {})
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if a cache file is configured."""
+        return self.path is not None
+
+    def get(self, stream_name: str, context: Optional[dict]) -> Optional[List[dict]]:
+        """Return the cached child contexts, None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(stream_name, {}).get(context_key(context))
+        if entry is None or time.time() - entry["fetched_at"] > self.ttl_seconds:
+            return None
+        return entry["children"]
+
+    def begin(self, stream_name: str, context: Optional[dict]) -> None:
+        """Start collecting the child contexts of a context being synced."""
+        with self._lock:
+            self._in_progress[(stream_name, context_key(context))] = []
+
+    def add(
+        self, stream_name: str, context: Optional[dict], child_context: dict
+    ) -> None:
+        """Record one child context produced while syncing `context`."""
+        with self._lock:
+            children = self._in_progress.get((stream_name, context_key(context)))
+            if children is not None:
+                children.append(child_context)
+
+    def complete(self, stream_name: str, context: Optional[dict]) -> None:
+        """Store the child contexts of a fully synced context."""
+        key = context_key(context)
+        with self._lock:
+            children = self._in_progress.pop((stream_name, key), None)
+            if children is not None:
+                self._entries.setdefault(stream_name, {})[key] = {
+                    "fetched_at": time.time(),
+                    "children": children,
+                }
+
+    def save(self) -> None:
+        """Write the cache file."""
+        if not self.enabled:
+            return
+        with self._lock:
+            body = json.dumps({"streams": self._entries})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(body)
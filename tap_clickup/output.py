@@ -0,0 +1,87 @@
+"""Writers serializing Singer messages to stdout."""
+
+import json
+import sys
+from typing import Dict
+
+import singer_sdk._singerlib as singer
+
+try:
+    import orjson
+except ImportError:  # Only needed for fast_output, `pip install tap-clickup[fast]`
+    orjson = None
+
+
+class MessageWriter:
+    """Write each message with the SDK, flushing stdout every time."""
+
+    def write(self, message: singer.Message) -> None:
+        """Write one message."""
+        singer.write_message(message)
+
+    def flush(self) -> None:
+        """Flush anything buffered to stdout."""
+
+
+class FastMessageWriter(MessageWriter):
+    """Write messages with orjson (or compact stdlib json) through a buffer.
+
+    RECORD messages are the bulk of our output, their envelope up to the record
+    is encoded once per stream and only the record itself is serialized. Output
+    is flushed every `buffer_size` bytes and after each STATE message, so a
+    target never sees a STATE before the records it covers.
+    """
+
+    def __init__(self, buffer_size: int = 1 << 20) -> None:
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._prefixes: Dict[str, bytes] = {}
+
+    @staticmethod
+    def dumps(value) -> bytes:
+        """Serialize a value to compact JSON bytes."""
+        if orjson is not None:
+            return orjson.dumps(value, default=str)
+        return json.dumps(value, separators=(",", ":"), default=str).encode()
+
+    def write(self, message: singer.Message) -> None:
+        """Buffer one message, flushing when the buffer is full or on STATE."""
+        if isinstance(message, singer.RecordMessage):
+            self._write_record(message)
+        else:
+            self._buffer += self.dumps(message.to_dict())
+            self._buffer += b"\n"
+        if (
+            isinstance(message, singer.StateMessage)
+            or len(self._buffer) >= self.buffer_size
+        ):
+            self.flush()
+
+    def _write_record(self, message: singer.RecordMessage) -> None:
+        prefix = self._prefixes.get(message.stream)
+        if prefix is None:
+            prefix = b'{"type":"RECORD","stream":' + self.dumps(message.stream)
+            prefix += b',"record":'
+            self._prefixes[message.stream] = prefix
+        buffer = self._buffer
+        buffer += prefix
+        buffer += self.dumps(message.record)
+        if message.version is not None:
+            buffer += b',"version":' + self.dumps(message.version)
+        if message.time_extracted is not None:
+            # Same format as the SDK's default=str
+            buffer += b',"time_extracted":"' + str(message.time_extracted).encode()
+            buffer += b'"'
+        buffer += b"}\n"
+
+    def flush(self) -> None:
+        """Write the buffer to stdout."""
+        if self._buffer:
+            stdout = sys.stdout
+            if hasattr(stdout, "buffer"):
+                stdout.flush()
+                stdout.buffer.write(self._buffer)
+            else:
+                stdout.write(self._buffer.decode())
+            self._buffer = bytearray()
+        sys.stdout.flush()
@@ -0,0 +1,46 @@
+"""Paginators reading the responses their stream has already decoded."""
+
+from typing import Optional
+
+import requests
+from singer_sdk.helpers.jsonpath import extract_jsonpath
+from singer_sdk.pagination import BasePageNumberPaginator, JSONPathPaginator
+
+
+class DecodedJSONPathPaginator(JSONPathPaginator):
+    """Next page token from the body the stream decoded for its records."""
+
+    def __init__(self, stream) -> None:
+        super().__init__(stream.next_page_token_jsonpath)
+        self.stream = stream
+
+    def get_next(self, response: requests.Response) -> Optional[str]:
+        """Return the next page token, None if there is no next page."""
+        if self.stream.stream_responses:
+            # The body has been consumed by parse_response, and ClickUp doesn't
+            # return a next_page token anyway
+            return None
+        return next(
+            extract_jsonpath(
+                self._jsonpath, input=self.stream.decode_response(response)
+            ),
+            None,
+        )
+
+
+class FullPagePaginator(BasePageNumberPaginator):
+    """Page numbers from 0, while pages hold `page_size` records.
+
+    From the api docs, https://clickup.com/api, you should check the list limit
+    against the length of each response to determine if you are on the last
+    page.
+    """
+
+    def __init__(self, stream, page_size: int) -> None:
+        super().__init__(0)
+        self.stream = stream
+        self.page_size = page_size
+
+    def has_more(self, response: requests.Response) -> bool:
+        """Return True if the page was full, so there may be another one."""
+        return self.stream.response_record_count(response) == self.page_size
@@ -0,0 +1,172 @@
+"""Estimate the requests and time a sync of the selected streams would take."""
+
+import math
+from typing import Dict, List, Optional
+
+from tap_clickup.telemetry import percentile
+
+# ClickUp's lowest plan allows 100 requests per minute per token
+DEFAULT_RATE_LIMIT = 100
+# Seconds per request assumed when the walk made no request to time
+DEFAULT_LATENCY = 0.5
+
+
+class StreamPlan:
+    """Partitions and requests one stream would sync."""
+
+    def __init__(self, paginated: bool) -> None:
+        self.paginated = paginated
+        self.partitions = 0
+        self.requests = 0
+
+
+class SyncPlan:
+    """Walk the hierarchy to count the requests a sync would make.
+
+    Only streams with selected descendants (teams, spaces, folders, lists) are
+    requested, or replayed from the hierarchy cache when it's fresh. Every
+    other stream is counted from the partitions it would be synced for, so a
+    plan costs a fraction of the sync. Paginated streams (tasks) are counted
+    one request per partition, their actual number of pages is only known
+    once they're synced.
+
+    The duration is bound by the rate limit of every token and by the latency
+    of requests at the configured concurrency, whichever is slower.
+    """
+
+    def __init__(self, tap) -> None:
+        self.tap = tap
+        self.streams: Dict[str, StreamPlan] = {}
+
+    def build(self) -> "SyncPlan":
+        """Walk every selected stream, from the top of the hierarchy."""
+        for stream in self.tap.streams.values():
+            if stream.parent_stream_type is None and (
+                stream.selected or stream.has_selected_descendents
+            ):
+                self._walk(stream, [None])
+        return self
+
+    def _walk(self, stream, contexts: List[Optional[dict]]) -> None:
+        plan = self.streams.setdefault(stream.name, StreamPlan(stream.paginated))
+        children = [
+            child
+            for child in stream.child_streams
+            if child.selected or child.has_selected_descendents
+        ]
+        for context in contexts:
+            plan.partitions = plan.partitions + 1
+            if not children:
+                plan.requests = plan.requests + stream.planned_requests(context)
+                continue
+            for child_context in self._child_contexts(stream, context, plan):
+                for child in children:
+                    self._walk(child, child.partitions_to_sync(child_context))
+
+    def _child_contexts(self, stream, context: Optional[dict], plan: StreamPlan):
+        child_contexts = self._walk_children(stream, context, plan)
+        for child_context in child_contexts:
+            # Like the sync, so children know their team
+            self.tap.token_pool.learn(context, child_context)
+        return child_contexts
+
+    def _walk_children(self, stream, context: Optional[dict], plan: StreamPlan):
+        cache = self.tap.hierarchy_cache
+        if cache.enabled and not stream.selected:
+            cached = cache.get(stream.name, context)
+            if cached is not None:
+                # The sync replays it too, without a request
+                return cached
+        plan.requests = plan.requests + stream.planned_requests(context)
+        return [
+            stream.get_child_context(record, context)
+            for record in stream.request_records(context)
+            if stream.owns(record)
+        ]
+
+    @property
+    def requests(self) -> int:
+        """Return the requests the sync would make, at least."""
+        return sum(plan.requests for plan in self.streams.values())
+
+    @property
+    def walk_requests(self) -> int:
+        """Return the requests made to build the plan."""
+        return sum(stats.requests for stats in self.tap.telemetry.endpoints.values())
+
+    @property
+    def latency(self) -> float:
+        """Return the median latency of the walk's requests, in seconds."""
+        latencies = sorted(
+            latency
+            for stats in self.tap.telemetry.endpoints.values()
+            for latency in stats.latencies.samples
+        )
+        return percentile(latencies, 0.5) or DEFAULT_LATENCY
+
+    @property
+    def rate_limit(self) -> int:
+        """Return the requests per minute allowed across every token."""
+        return sum(
+            token.rate_limiter.limit or DEFAULT_RATE_LIMIT
+            for token in self.tap.token_pool.tokens
+        )
+
+    @property
+    def concurrency(self) -> int:
+        """Return the most requests the sync keeps in flight."""
+        config = self.tap.config
+        concurrency = config.get("max_workers", 1)
+        if config.get("http_engine") == "async":
+            concurrency = max(concurrency, config.get("http_max_connections", 20))
+        return concurrency
+
+    def seconds(self, requests: int) -> float:
+        """Return the estimated seconds `requests` requests take."""
+        return max(
+            requests * 60 / self.rate_limit,
+            requests * self.latency / self.concurrency,
+        )
+
+    def to_dict(self) -> dict:
+        """Return the plan per stream and in total."""
+        return {
+            "streams": {
+                name: {
+                    "partitions": plan.partitions,
+                    "requests": plan.requests,
+                    "paginated": plan.paginated,
+                    "seconds": round(self.seconds(plan.requests), 1),
+                }
+                for name, plan in self.streams.items()
+            },
+            "requests": self.requests,
+            "seconds": round(self.seconds(self.requests), 1),
+            "rate_limit": self.rate_limit,
+            "latency_ms": round(self.latency * 1000, 1),
+            "concurrency": self.concurrency,
+            # Workers keeping the rate limit busy, more only queue on it
+            "workers_to_saturate": math.ceil(self.latency * self.rate_limit / 60),
+            "walk_requests": self.walk_requests,
+        }
+
+    def report(self) -> str:
+        """Return the plan as a table."""
+        plan = self.to_dict()
+        lines = [f"{'stream':<24}{'partitions':>12}{'requests':>12}{'seconds':>12}"]
+        for name, stream in plan["streams"].items():
+            requests = f"{'>=' if stream['paginated'] else ''}{stream['requests']}"
+            lines.append(
+                f"{name:<24}{stream['partitions']:>12}{requests:>12}"
+                f"{stream['seconds']:>12}"
+            )
+        lines.append(
+            f"{'total':<24}{'':>12}{plan['requests']:>12}{plan['seconds']:>12}"
+        )
+        lines.append(
+            f"{plan['rate_limit']} requests/minute, {plan['latency_ms']}ms median"
+            f" latency, {plan['concurrency']} in flight"
+            f" ({plan['workers_to_saturate']} would saturate the rate limit)."
+            f" Planning took {plan['walk_requests']} requests."
+        )
+        return "\n".join(lines)
@@ -0,0 +1,117 @@
+"""Client side pacing driven by ClickUp's X-RateLimit headers."""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import requests
+
+
+def server_epoch(response: requests.Response) -> Optional[float]:
+    """Return the server's clock from the `Date` header as a unix epoch."""
+    date = response.headers.get("Date")
+    if not date:
+        return None
+    try:
+        return parsedate_to_datetime(date).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Shared pacer that keeps requests under the ClickUp rate limit.
+
+    Every response updates the budget from `X-RateLimit-Limit`,
+    `X-RateLimit-Remaining` and `X-RateLimit-Reset`. While more than `reserve`
+    (a fraction of the limit) requests remain requests go out immediately, below
+    that the remaining budget is spread evenly until the window resets, so we
+    approach the limit without hitting a 429.
+
+    One instance is shared by every stream (and worker thread) of a tap. Slots are
+    handed out under a lock so concurrent requests are paced together.
+    """
+
+    def __init__(
+        self,
+        reserve: float = 0.1,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.reserve = reserve
+        self.clock = clock
+        self.sleep = sleep
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self._reset_epoch: Optional[int] = None
+        self._next_slot: float = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, response: requests.Response) -> None:
+        """Update the budget from a response's X-RateLimit headers."""
+        headers = response.headers
+        try:
+            limit = int(headers["X-RateLimit-Limit"])
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset_epoch = int(headers["X-RateLimit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        # Reset is on the server's clock, convert it to ours to ignore clock skew
+        server_now = server_epoch(response) or self.clock()
+        reset_at = self.clock() + max(reset_epoch - server_now, 0)
+
+        with self._lock:
+            if response.status_code == 429:
+                remaining = 0
+            if reset_epoch == self._reset_epoch and self.remaining is not None:
+                # Same window, responses to concurrent requests can arrive out of
+                # order so never raise the budget we already counted down
+                remaining = min(remaining, self.remaining)
+            self.limit = limit
+            self.remaining = remaining
+            self.reset_at = reset_at
+            self._reset_epoch = reset_epoch
+
+    def acquire(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """Block until a request may be sent, returns the seconds waited.
+
+        Returns None, without taking a slot, if that would take longer than
+        `max_wait` seconds.
+        """
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_slot)
+            if self.remaining is not None and self.remaining <= 0:
+                slot = max(slot, self.reset_at)
+            if max_wait is not None and slot - now > max_wait:
+                return None
+            self._next_slot = slot + self._interval(slot)
+            if self.remaining is not None:
+                self.remaining -= 1
+        wait = slot - now
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def available_at(self) -> float:
+        """Return when the next request could be sent without waiting."""
+        with self._lock:
+            slot = self._next_slot
+            if self.remaining is not None and self.remaining <= 0:
+                slot = max(slot, self.reset_at)
+            return slot
+
+    def _interval(self, at: float) -> float:
+        """Seconds to leave between the request sent at `at` and the next one."""
+        if self.limit is None or self.reset_at is None or self.remaining is None:
+            return 0.0
+        if at >= self.reset_at:
+            # A new window has started, nothing to pace until we hear back
+            self.remaining = None
+            return 0.0
+        if self.remaining <= 1:
+            return self.reset_at - at
+        if self.remaining > self.limit * self.reserve:
+            return 0.0
+        return (self.reset_at - at) / self.remaining
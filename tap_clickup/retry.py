@@ -0,0 +1,76 @@
+"""Retry policy for ClickUp requests."""
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Generator, Optional
+
+import requests
+from singer_sdk.exceptions import RetriableAPIError
+
+from tap_clickup.ratelimit import server_epoch
+
+
+class RetryAfterError(RetriableAPIError):
+    """A retriable error where the server told us how long to wait."""
+
+    def __init__(self, msg: str, wait: Optional[float]) -> None:
+        super().__init__(msg)
+        self.wait = wait
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """Return the seconds the server asked us to wait, None if it didn't say.
+
+    `Retry-After` (seconds or a date) wins over `X-RateLimit-Reset`. Both are
+    compared to the server's `Date` so our clock's skew doesn't matter.
+    """
+    server_now = server_epoch(response) or time.time()
+    retry = response.headers.get("Retry-After")
+    if retry:
+        if retry.strip().isdigit():
+            return float(retry)
+        try:
+            return max(parsedate_to_datetime(retry).timestamp() - server_now, 0.0)
+        except (TypeError, ValueError):
+            pass
+    reset = response.headers.get("X-RateLimit-Reset")
+    if reset:
+        try:
+            return max(int(reset) - server_now, 0.0)
+        except ValueError:
+            pass
+    return None
+
+
+def retry_waits(
+    factor: float = 2,
+    max_backoff: float = 60,
+    max_total: float = 300,
+    jitter: Callable[[float, float], float] = random.uniform,
+    check_wait: Callable[[float], None] = lambda wait: None,
+) -> Generator[Optional[float], Exception, None]:
+    """Backoff wait generator, `backoff` sends it each exception it retries.
+
+    Waits exactly as long as the server asked (plus up to a second, so parked
+    requests don't all retry at the same instant), otherwise backs off
+    exponentially with jitter. Stops, which makes `backoff` give up, once the
+    waits would add up to more than `max_total` seconds. `check_wait` is
+    called with every wait and may raise to give up with its own exception.
+    """
+    attempt = 0
+    total = 0.0
+    exception = yield None
+    while True:
+        wait = getattr(exception, "wait", None)
+        if wait is not None:
+            wait = wait + jitter(0, 1)
+        else:
+            backoff = min(factor * 2**attempt, max_backoff)
+            wait = jitter(backoff / 2, backoff)
+            attempt = attempt + 1
+        total = total + wait
+        if total > max_total:
+            return
+        check_wait(wait)
+        exception = yield wait
@@ -0,0 +1,226 @@
+"""Split a sync into shards by team or space, run them and merge their states."""
+
+import argparse
+import copy
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import zlib
+from typing import IO, Dict, List, Optional
+
+STATE = re.compile(rb'^\{\s*"type"\s*:\s*"STATE"')
+SCHEMA = re.compile(rb'^\{\s*"type"\s*:\s*"SCHEMA"')
+# Files each shard needs its own copy of
+SHARD_PATHS = ("hierarchy_cache_path", "cassette_path")
+
+
+def shard_of(key: str, count: int) -> int:
+    """Return the shard (0 to count - 1) a team or space id belongs to."""
+    return zlib.crc32(str(key).encode()) % count
+
+
+def _context_key(partition: dict) -> str:
+    return json.dumps(partition.get("context"), sort_keys=True)
+
+
+def _merge_value(merged, value, base):
+    """Return the value to keep, preferring values a shard changed from base."""
+    if merged == base:
+        return value
+    if value == base:
+        return merged
+    if isinstance(merged, dict) and isinstance(value, dict):
+        # Both shards changed it, ie the fingerprints of their own records
+        base = base if isinstance(base, dict) else {}
+        return {
+            key: _merge_value(merged[key], value[key], base.get(key))
+            if key in merged and key in value
+            else merged.get(key, value.get(key))
+            for key in {**merged, **value}
+        }
+    return value
+
+
+def merge_states(states: List[dict], base: Optional[dict] = None) -> dict:
+    """Combine the states of shards that started from the same `base` state.
+
+    Shards only touch their own partitions and carry the rest over from `base`,
+    so for every partition (and stream level value) the copy a shard changed
+    wins over the unchanged ones.
+    """
+    base_bookmarks = (base or {}).get("bookmarks", {})
+    bookmarks: Dict[str, dict] = {}
+    for state in states:
+        for stream_name, stream_state in state.get("bookmarks", {}).items():
+            base_stream = base_bookmarks.get(stream_name, {})
+            merged = bookmarks.setdefault(stream_name, {})
+            for key, value in stream_state.items():
+                if key == "partitions":
+                    continue
+                if key not in merged:
+                    merged[key] = copy.deepcopy(value)
+                else:
+                    merged[key] = _merge_value(merged[key], value, base_stream.get(key))
+            if "partitions" not in stream_state:
+                continue
+            base_partitions = {
+                _context_key(partition): partition
+                for partition in base_stream.get("partitions", [])
+            }
+            partitions = {
+                _context_key(partition): partition
+                for partition in merged.get("partitions", [])
+            }
+            for partition in stream_state["partitions"]:
+                key = _context_key(partition)
+                if key not in partitions:
+                    partitions[key] = copy.deepcopy(partition)
+                else:
+                    partitions[key] = _merge_value(
+                        partitions[key], partition, base_partitions.get(key)
+                    )
+            merged["partitions"] = list(partitions.values())
+    return {**(base or {}), "bookmarks": bookmarks}
+
+
+class ShardRunner:
+    """Run a sync as `processes` tap processes, each syncing one shard.
+
+    Every shard gets the same catalog and starting state. Their output is
+    relayed to our stdout as it arrives, identical SCHEMA messages only once,
+    and each STATE message is replaced by the merge of every shard's latest
+    state, so the state we emit always covers the records written before it.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        catalog: dict,
+        state: dict,
+        processes: int,
+        output: Optional[IO[bytes]] = None,
+    ) -> None:
+        self.config = config
+        self.catalog = catalog
+        self.state = state
+        self.processes = processes
+        self.output = output or sys.stdout.buffer
+        self.states: Dict[int, dict] = {}
+        self._schemas: set = set()
+
+    def shard_config(self, index: int) -> dict:
+        """Return the config of one shard."""
+        config = {
+            **self.config,
+            "shard_index": index,
+            "shard_count": self.processes,
+            "shard_processes": 1,
+        }
+        for name in SHARD_PATHS:
+            if config.get(name):
+                config[name] = f"{config[name]}.shard{index}"
+        return config
+
+    def run(self) -> None:
+        """Run every shard, raise if any of them failed."""
+        directory = tempfile.mkdtemp(prefix="tap-clickup-")
+        try:
+            self._run(directory)
+        finally:
+            shutil.rmtree(directory)
+
+    def _write_json(self, path: str, value: dict) -> str:
+        with open(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600), "w") as f:
+            json.dump(value, f)
+        return path
+
+    def _run(self, directory: str) -> None:
+        catalog = self._write_json(
+            os.path.join(directory, "catalog.json"), self.catalog
+        )
+        state = self._write_json(os.path.join(directory, "state.json"), self.state)
+        lines: queue.Queue = queue.Queue()
+        shards = []
+        for index in range(self.processes):
+            config = self._write_json(
+                os.path.join(directory, f"config{index}.json"), self.shard_config(index)
+            )
+            process = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-c",
+                    "from tap_clickup.tap import TapClickUp; TapClickUp.cli()",
+                    "--config",
+                    config,
+                    "--catalog",
+                    catalog,
+                    "--state",
+                    state,
+                ],
+                stdout=subprocess.PIPE,
+            )
+            reader = threading.Thread(
+                target=self._read, args=(index, process.stdout, lines), daemon=True
+            )
+            reader.start()
+            shards.append(process)
+
+        running = self.processes
+        while running:
+            index, line = lines.get()
+            if line is None:
+                running = running - 1
+            else:
+                self._relay(index, line)
+        self.output.flush()
+        failed = [index for index, process in enumerate(shards) if process.wait() != 0]
+        if failed:
+            raise RuntimeError(f"Shards {failed} of {self.processes} failed")
+
+    @staticmethod
+    def _read(index: int, stdout: IO[bytes], lines: queue.Queue) -> None:
+        for line in stdout:
+            lines.put((index, line))
+        lines.put((index, None))
+
+    def _relay(self, index: int, line: bytes) -> None:
+        if STATE.match(line):
+            self.states[index] = json.loads(line)["value"]
+            merged = merge_states(list(self.states.values()), base=self.state)
+            message = {"type": "STATE", "value": merged}
+            self.output.write(json.dumps(message).encode() + b"\n")
+            self.output.flush()
+            return
+        if SCHEMA.match(line):
+            if line in self._schemas:
+                return
+            self._schemas.add(line)
+        self.output.write(line)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Merge the final states of shards synced separately, ie on other nodes."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("states", nargs="+", help="Each shard's final state file")
+    parser.add_argument("--base", help="State file the shards started from")
+    args = parser.parse_args(argv)
+    states = []
+    for path in args.states:
+        with open(path) as f:
+            states.append(json.load(f))
+    base = None
+    if args.base:
+        with open(args.base) as f:
+            base = json.load(f)
+    json.dump(merge_states(states, base=base), sys.stdout)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
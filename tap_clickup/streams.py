@@ -1,12 +1,23 @@
 """Stream type classes for tap-clickup."""
+import copy
 from pathlib import Path
-from typing import Optional, Any, Dict
-import requests
-from singer_sdk.helpers.jsonpath import extract_jsonpath
-from tap_clickup.client import ClickUpStream
+from typing import Optional, Any, Dict, Iterable, List, Tuple
+import time
+from singer_sdk.helpers._state import (
+    get_state_if_exists,
+    get_state_partitions_list,
+    get_writeable_state_dict,
+)
+from tap_clickup.client import ClickUpStream, project
+from tap_clickup.customfields import Scope
+from tap_clickup.pagination import FullPagePaginator
+from tap_clickup.tokens import TokenRevokedError
 
 SCHEMAS_DIR = Path(__file__).parent / Path("./schemas")
 
+# Backfills with no bookmark start here, ClickUp launched in 2017
+BACKFILL_START = 1483228800000  # 2017-01-01 in ms
+
 
 class TeamsStream(ClickUpStream):
     """Teams"""
@@ -24,19 +35,280 @@ class TeamsStream(ClickUpStream):
             "team_id": record["id"],
         }
 
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return the teams visible to any of the API tokens.
+
+        Tokens may belong to different users, so with several tokens the teams
+        are listed with each of them.
+        """
+        tokens = self.token_pool.tokens
+        if len(tokens) == 1:
+            yield from super().request_records(context)
+            return
+        teams: Dict[str, dict] = {}
+        refused: Optional[TokenRevokedError] = None
+        for token in tokens:
+            with self.token_pool.pin(token):
+                try:
+                    records = list(super().request_records(context))
+                except TokenRevokedError as e:
+                    refused = e
+                    continue
+            for record in records:
+                teams.setdefault(record["id"], record)
+        if refused is not None and not any(token.usable(None) for token in tokens):
+            raise refused
+        yield from teams.values()
+
+    def owns(self, record: dict) -> bool:
+        """Return True if the team belongs to this shard, sharding by team."""
+        return self.config.get("shard_by", "team") != "team" or self.in_shard(
+            record["id"]
+        )
+
+    def _write_record_message(self, record: dict) -> None:
+        # Sharding by space every shard walks every team, only one writes it
+        if self.config.get("shard_by") == "space" and not self.in_shard(record["id"]):
+            return
+        super()._write_record_message(record)
+
+
+class WindowedStream(ClickUpStream):
+    """Stream whose partitions can be split into windows of its replication key.
+
+    A partition whose bookmark is older than `window_days` is split into windows
+    that are synced as separate partitions (concurrently with `max_workers`).
+    Each window keeps its own state so a crashed backfill only resumes the
+    unfinished windows, `partitions_synced` merges them back into one bookmark.
+    """
+
+    # Context keys holding a window's bounds, also used as request parameters
+    window_keys: Tuple[str, str] = ("date_updated_gt", "date_updated_lt")
+
+    @property
+    def window_days(self) -> Optional[int]:
+        """Return the window size in days, None to never split partitions."""
+        return None
 
-class TimeEntries(ClickUpStream):
+    @property
+    def lookback_days(self) -> float:
+        """Return the days before the bookmark requested again, 0 for none."""
+        return 0
+
+    def lookback(self, bookmark: int) -> int:
+        """Return where to resume a partition from its bookmark."""
+        return bookmark - int(self.lookback_days * 24 * 60 * 60 * 1000)
+
+    def from_parent_context(self, context: dict) -> List[dict]:
+        """Return the contexts to sync, split into windows if configured."""
+        contexts = super().from_parent_context(context)
+        if not self.window_days:
+            return contexts
+
+        windowed = []
+        for partition in contexts:
+            windowed.extend(self.backfill_windows(partition, self.window_days))
+        return windowed
+
+    def backfill_windows(self, partition: dict, window_days: int) -> List[dict]:
+        """Return the unfinished backfill window contexts for a partition.
+
+        A backfill cut short resumes from its first unfinished window, see
+        `unfinished_windows`. Windows that all completed without being merged
+        (ie a sibling partition failed, or the tap was killed before
+        `partitions_synced`) are merged right away, and the partition carries
+        on from the merged bookmark.
+        """
+        window = window_days * 24 * 60 * 60 * 1000
+        with self.scheduler.lock:
+            states = get_state_partitions_list(self.tap_state, self.name) or []
+            in_progress = self.partition_windows(partition, states)
+            unfinished = self.unfinished_windows(partition, in_progress, window)
+            if in_progress and not unfinished:
+                self.merge_windows(partition, states)
+            bookmark = get_state_if_exists(
+                self.tap_state, self.name, partition, "replication_key_value"
+            )
+        if unfinished:
+            return unfinished
+
+        start = int(bookmark) if bookmark else BACKFILL_START
+        end = int(time.time() * 1000)
+        if end - start <= window:
+            return [partition]
+        if bookmark:
+            start = self.lookback(start)
+        return self.split_windows(partition, start, end, window)
+
+    def unfinished_windows(
+        self, partition: dict, window_states: List[dict], window: int
+    ) -> List[dict]:
+        """Return the windows of a backfill left to sync, in order.
+
+        Windows only reach the state once they start, so those that never did
+        (ie the tap was killed) are rebuilt from the gaps between the others,
+        and after the last one unless it's the open one.
+        """
+        start_key, end_key = self.window_keys
+        unfinished: List[dict] = []
+        end = None
+        for window_state in sorted(
+            window_states, key=lambda window_state: window_state["context"][start_key]
+        ):
+            context = window_state["context"]
+            if end is not None and context[start_key] > end:
+                unfinished.extend(
+                    self.split_windows(
+                        partition, end, context[start_key], window, open_ended=False
+                    )
+                )
+            if not window_state.get("window_complete"):
+                unfinished.append(context)
+            end = context.get(end_key)
+        if end is not None:
+            unfinished.extend(
+                self.split_windows(partition, end, int(time.time() * 1000), window)
+            )
+        return unfinished
+
+    def split_windows(
+        self, partition: dict, start: int, end: int, window: int, open_ended=True
+    ) -> List[dict]:
+        """Return the window contexts from `start` to `end`."""
+        start_key, end_key = self.window_keys
+        windows = [
+            {
+                **partition,
+                start_key: window_start,
+                end_key: min(window_start + window, end),
+            }
+            for window_start in range(start, end, window)
+        ]
+        if open_ended and windows:
+            # Leave the last window open so records updated during the backfill
+            # are synced
+            del windows[-1][end_key]
+        return windows
+
+    def partition_windows(self, partition: dict, states: List[dict]) -> List[dict]:
+        """Return the states of the partition's backfill windows."""
+        return [
+            window_state
+            for window_state in states
+            if self.window_keys[0] in window_state["context"]
+            and self.without_window(window_state["context"]) == partition
+        ]
+
+    def merge_windows(self, partition: dict, states: List[dict]) -> None:
+        """Merge the partition's windows into its bookmark, under the scheduler lock."""
+        windows = self.partition_windows(partition, states)
+        state = get_writeable_state_dict(self.tap_state, self.name, partition)
+        values = [
+            int(value["replication_key_value"])
+            for value in windows + [state]
+            if value.get("replication_key_value")
+        ]
+        if values:
+            state["replication_key"] = self.replication_key
+            state["replication_key_value"] = str(max(values))
+        for window in windows:
+            states.remove(window)
+
+    def without_window(self, context: dict) -> dict:
+        """Return the partition context a backfill window belongs to."""
+        return {key: val for key, val in context.items() if key not in self.window_keys}
+
+    def state_partition(self, context: dict) -> dict:
+        """Return the partition a backfill window belongs to."""
+        return self.without_window(context)
+
+    def window_start(self, context: dict) -> Optional[int]:
+        """Return the lower bound to request, resuming from the bookmark if any."""
+        start = self.get_starting_replication_key_value(context)
+        if self.window_keys[0] in context:
+            # Backfill window, resume from the window's own bookmark if it has one
+            return max(int(start or 0), context[self.window_keys[0]])
+        return self.lookback(int(start)) if start else None
+
+    def _sync_records(self, context: Optional[dict] = None, *, write_messages=True):
+        yield from super()._sync_records(context, write_messages=write_messages)
+        if context and self.window_keys[0] in context and not self.stopped(context):
+            self.get_context_state(context)["window_complete"] = True
+
+    def _process_record(self, record, child_context=None, partition_context=None):
+        # Window bounds are request parameters, not something to add to records
+        partition_context = self.without_window(partition_context or {})
+        super()._process_record(record, child_context, partition_context)
+
+    def partitions_synced(self, contexts: List[dict]) -> None:
+        """Merge finished backfill windows into one bookmark per partition."""
+        start_key = self.window_keys[0]
+        partitions = []
+        for context in contexts:
+            if start_key in context:
+                partition = self.without_window(context)
+                if partition not in partitions:
+                    partitions.append(partition)
+        synced = [context for context in contexts if start_key not in context]
+        if not partitions:
+            super().partitions_synced(synced)
+            return
+
+        window = (self.window_days or 1) * 24 * 60 * 60 * 1000
+        with self.scheduler.lock:
+            states = get_state_partitions_list(self.tap_state, self.name) or []
+            for partition in partitions:
+                windows = self.partition_windows(partition, states)
+                if self.unfinished_windows(partition, windows, window):
+                    continue
+                synced.append(partition)
+                self.merge_windows(partition, states)
+        self.scheduler.write_state()
+        super().partitions_synced(synced)
+
+
+class TimeEntries(WindowedStream):
     """Time Entries"""
 
     name = "time_entries"
     path = "/team/{team_id}/time_entries"
     primary_keys = ["id"]
-    replication_key = None
+    # The API only filters on start, entries edited or created with a start
+    # before the bookmark less the lookback aren't picked up
+    replication_key = "start"
+    is_sorted = False
     schema_filepath = SCHEMAS_DIR / "time_entries.json"
     records_jsonpath = "$.data[*]"
     parent_stream_type = TeamsStream
-    # TODO not clear why this is needed
-    partitions = None
+    window_keys = ("start_date", "end_date")
+
+    @property
+    def window_days(self) -> Optional[int]:
+        """Request `time_entry_window_days` of time entries at a time.
+
+        The endpoint isn't paginated and defaults to the last 30 days, so
+        windows are what keep responses small and reach older entries.
+        """
+        return self.config.get("time_entry_window_days", 30)
+
+    @property
+    def lookback_days(self) -> float:
+        """Request `time_entry_lookback_days` before the bookmark again.
+
+        Entries can be logged after the fact with a start before the bookmark,
+        ie yesterday's work tracked today. Defaults to one window.
+        """
+        days = self.config.get("time_entry_lookback_days")
+        return (self.window_days or 0) if days is None else days
+
+    def get_url_params(
+        self, context: Optional[dict], next_page_token: Optional[Any]
+    ) -> Dict[str, Any]:
+        """Return a dictionary of values to be used in URL parameterization."""
+        params = super().get_url_params(context, next_page_token)
+        params["start_date"] = self.window_start(context) or BACKFILL_START
+        params["end_date"] = context.get("end_date") or int(time.time() * 1000)
+        return params
 
 
 class SpacesStream(ClickUpStream):
@@ -49,7 +321,6 @@ class SpacesStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "space.json"
     records_jsonpath = "$.spaces[*]"
     parent_stream_type = TeamsStream
-    partitions = []
 
     @property
     def base_partition(self):
@@ -61,6 +332,14 @@ class SpacesStream(ClickUpStream):
             "space_id": record["id"],
         }
 
+    def owns(self, record: dict) -> bool:
+        """Return True if the space belongs to this shard, sharding by space."""
+        return self.config.get("shard_by") != "space" or self.in_shard(record["id"])
+
+    def partition_in_shard(self, context: dict) -> bool:
+        """Return True, every shard lists spaces to find its own."""
+        return True
+
 
 class FoldersStream(ClickUpStream):
     """Folders"""
@@ -72,7 +351,6 @@ class FoldersStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "folder.json"
     records_jsonpath = "$.folders[*]"
     parent_stream_type = SpacesStream
-    partitions = []
 
     @property
     def base_partition(self):
@@ -95,7 +373,6 @@ class FolderListsStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "list.json"
     records_jsonpath = "$.lists[*]"
     parent_stream_type = FoldersStream
-    partitions = []
 
     @property
     def base_partition(self):
@@ -103,9 +380,14 @@ class FolderListsStream(ClickUpStream):
 
     def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
         """Return a context dictionary for child streams."""
-        return {
+        child_context = {
             "list_id": record["id"],
         }
+        if self.config.get("dedupe_custom_fields"):
+            # Custom fields are requested per folder and space, not per list
+            child_context["folder_id"] = context["folder_id"]
+            child_context["space_id"] = record.get("space", {}).get("id")
+        return child_context
 
 
 class FolderlessListsStream(ClickUpStream):
@@ -118,7 +400,6 @@ class FolderlessListsStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "list.json"
     records_jsonpath = "$.lists[*]"
     parent_stream_type = SpacesStream
-    partitions = []
 
     @property
     def base_partition(self):
@@ -126,9 +407,13 @@ class FolderlessListsStream(ClickUpStream):
 
     def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
         """Return a context dictionary for child streams."""
-        return {
+        child_context = {
             "list_id": record["id"],
         }
+        if self.config.get("dedupe_custom_fields"):
+            # Custom fields are requested per space, not per list
+            child_context["space_id"] = context["space_id"]
+        return child_context
 
 
 class TaskTemplatesStream(ClickUpStream):
@@ -141,8 +426,6 @@ class TaskTemplatesStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "task_template.json"
     records_jsonpath = "$.templates[*]"
     parent_stream_type = TeamsStream
-    # TODO not clear why this is needed
-    partitions = None
 
 
 class GoalsStream(ClickUpStream):
@@ -155,8 +438,6 @@ class GoalsStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "goal.json"
     records_jsonpath = "$.goals[*]"
     parent_stream_type = TeamsStream
-    # TODO not clear why this is needed
-    partitions = None
 
 
 class TagsStream(ClickUpStream):
@@ -168,8 +449,6 @@ class TagsStream(ClickUpStream):
     replication_key = None
     schema_filepath = SCHEMAS_DIR / "tag.json"
     records_jsonpath = "$.tags[*]"
-    # TODO not clear why this is needed
-    partitions = None
     parent_stream_type = SpacesStream
 
 
@@ -183,39 +462,166 @@ class SharedHierarchyStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "shared.json"
     records_jsonpath = "$.shared"
     parent_stream_type = TeamsStream
-    # TODO not clear why this is needed
-    partitions = None
 
+    @property
+    def stream_responses(self) -> bool:
+        """Return False, the whole response is one record.
+
+        Streaming would hold the same record in memory, only slower to parse.
+        """
+        return False
 
-class FolderlessCustomFieldsStream(ClickUpStream):
-    """CustomField from folderless lists"""
 
-    name = "folderless_customfield"
-    path = "/list/{list_id}/field"
+class ListCustomFieldsStream(ClickUpStream):
+    """Which custom fields are available on which list"""
+
+    name = "list_customfield"
+    primary_keys = ["list_id", "field_id"]
+    replication_key = None
+    schema_filepath = SCHEMAS_DIR / "list_custom_field.json"
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return the mappings seen by the custom field streams.
+
+        Mappings come from the same responses as the custom fields themselves,
+        so they're never requested separately. We're synced after the teams,
+        ie once every custom field partition is done.
+        """
+        if not any(
+            self._tap.streams[name].selected
+            for name in (
+                FolderCustomFieldsStream.name,
+                FolderlessCustomFieldsStream.name,
+            )
+        ):
+            self.logger.warning(
+                "%s is selected without %s or %s, no mapping will be written",
+                self.name,
+                FolderCustomFieldsStream.name,
+                FolderlessCustomFieldsStream.name,
+            )
+        return self._tap.custom_field_index.mappings()
+
+    def planned_requests(self, context: Optional[dict]) -> int:
+        """Return 0, mappings are never requested."""
+        return 0
+
+
+class CustomFieldsStream(ClickUpStream):
+    """Base class for the custom field streams.
+
+    With `dedupe_custom_fields` fields are requested from the workspace, space
+    and folder each list belongs to, once per run, and each field is written
+    once no matter how many lists share it. Use `list_customfield` to know
+    which list has which field.
+    """
+
     primary_keys = ["id"]
     replication_key = None
     schema_filepath = SCHEMAS_DIR / "custom_field.json"
     records_jsonpath = "$.fields[*]"
+
+    @property
+    def path(self) -> str:
+        """Return the endpoint requested, a scope's while one is fetched."""
+        return getattr(self._local, "path", None) or "/list/{list_id}/field"
+
+    @property
+    def dedupe(self) -> bool:
+        """Return True if fields are requested per scope and written once."""
+        return bool(self.config.get("dedupe_custom_fields"))
+
+    @property
+    def projection(self) -> dict:
+        # Scope fields are shared by both streams, each projects its own copy
+        if getattr(self._local, "path", None):
+            return {}
+        return super().projection
+
+    def scopes(self, context: dict) -> Optional[List[Scope]]:
+        """Return the workspace, space and folder of a list, None if unknown.
+
+        Lists from a hierarchy cached before `dedupe_custom_fields` was set
+        don't carry their space, they're requested one by one.
+        """
+        team_id = self.token_pool.team_of(context)
+        if team_id is None or not context.get("space_id"):
+            return None
+        scopes = [("team", team_id), ("space", context["space_id"])]
+        if context.get("folder_id"):
+            scopes.append(("folder", context["folder_id"]))
+        return scopes
+
+    def request_scope(self, scope: Scope) -> Optional[List[dict]]:
+        """Request the fields defined on a scope, None if cut short."""
+        kind, scope_id = scope
+        self._local.path = f"/{kind}/{{{kind}_id}}/field"
+        try:
+            records = list(self.request_records({f"{kind}_id": scope_id}))
+        finally:
+            self._local.path = None
+        return None if self._local.stopped else records
+
+    def scope_records(self, scopes: List[Scope]) -> Iterable[dict]:
+        """Return the fields of every scope, requesting each once per run."""
+        index = self._tap.custom_field_index
+        plan = self.projection
+        for scope in scopes:
+            fields = index.fields(scope, lambda: self.request_scope(scope))
+            if fields is None:
+                return
+            for record in fields:
+                # Records are updated in place, copy the shared ones
+                yield project(copy.deepcopy(record), plan) if plan else dict(record)
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return the list's custom fields, skipping ones already written."""
+        index = self._tap.custom_field_index
+        scopes = self.scopes(context) if self.dedupe else None
+        if scopes is None:
+            records = super().get_records(context)
+        else:
+            records = self.scope_records(scopes)
+        field_ids = []
+        for record in records:
+            field_ids.append(record["id"])
+            if self.dedupe and not index.claim(self.name, record["id"]):
+                continue
+            yield record
+        mapping_stream = self._tap.streams.get(ListCustomFieldsStream.name)
+        if mapping_stream is not None and mapping_stream.selected:
+            index.map_list(context["list_id"], field_ids)
+
+    def planned_requests(self, context: Optional[dict]) -> int:
+        """Return the requests for the list, or its scopes not planned yet."""
+        scopes = self.scopes(context) if self.dedupe else None
+        if scopes is None:
+            return 1
+        index = self._tap.custom_field_index
+        return sum(1 for scope in scopes if index.plan(scope))
+
+    def prefetch(self, context: dict) -> None:
+        """Prefetch the list's fields, unless they're requested per scope."""
+        if self.dedupe:
+            return
+        super().prefetch(context)
+
+
+class FolderlessCustomFieldsStream(CustomFieldsStream):
+    """CustomField from folderless lists"""
+
+    name = "folderless_customfield"
     parent_stream_type = FolderlessListsStream
-    # TODO not clear why this is needed
-    partitions = None
 
 
-class FolderCustomFieldsStream(ClickUpStream):
+class FolderCustomFieldsStream(CustomFieldsStream):
     """CustomFields from foldered lists"""
 
     name = "folder_customfield"
-    path = "/list/{list_id}/field"
-    primary_keys = ["id"]
-    replication_key = None
-    schema_filepath = SCHEMAS_DIR / "custom_field.json"
-    records_jsonpath = "$.fields[*]"
     parent_stream_type = FolderListsStream
-    # TODO not clear why this is needed
-    partitions = None
 
 
-class TasksStream(ClickUpStream):
+class TasksStream(WindowedStream):
     """Tasks Stream"""
 
     name = "task"
@@ -228,16 +634,29 @@ class TasksStream(ClickUpStream):
     schema_filepath = SCHEMAS_DIR / "task.json"
     records_jsonpath = "$.tasks[*]"
     parent_stream_type = TeamsStream
+    paginated = True
+
+    @property
+    def STATE_MSG_FREQUENCY(self) -> int:  # noqa: N802
+        """Emit a resumable STATE every `task_checkpoint_pages` pages of tasks.
+
+        Tasks are sorted by date_updated so the partition bookmark always points at
+        the last task written, a rerun after a failure resumes from there instead
+        of from the start of the partition.
+        """
+        return self.config.get("task_checkpoint_pages", 10) * 100
 
-    # Need this stub as a hack on _sync to force it to use Partitions
     # Since this is a child stream we want each team_id to create a request for
     # archived:true and archived:false. And we want state to track properly
-    partitions = []
-
     @property
     def base_partition(self):
         return [{"archived": "true"}, {"archived": "false"}]
 
+    @property
+    def window_days(self) -> Optional[int]:
+        """Split partitions into `task_backfill_window_days` windows if set."""
+        return self.config.get("task_backfill_window_days")
+
     def get_url_params(
         self, context: Optional[dict], next_page_token: Optional[Any]
     ) -> Dict[str, Any]:
@@ -248,29 +667,11 @@ class TasksStream(ClickUpStream):
         params["subtasks"] = "true"
         params["order_by"] = "updated"
         params["reverse"] = "true"
-        params["date_updated_gt"] = self.get_starting_replication_key_value(context)
+        params["date_updated_gt"] = self.window_start(context)
+        if context.get("date_updated_lt"):
+            params["date_updated_lt"] = context["date_updated_lt"]
         return params
 
-    def get_next_page_token(
-        self, response: requests.Response, previous_token: Optional[Any]
-    ) -> Optional[Any]:
-        """Return the page number, Null if we should stop going to the next page."""
-        newtoken = None
-        recordcount = 0
-        if previous_token is None:
-            previous_token = 0
-
-        for _ in extract_jsonpath(self.records_jsonpath, input=response.json()):
-            recordcount = recordcount + 1
-
-        # I wonder if a better approach is to just check for 0 records and stop
-        # For now I'll follow the docs verbatium
-        # From the api docs, https://clickup.com/api.
-        # you should check list limit against the length of each response
-        # to determine if you are on the last page.
-        if recordcount == 100:
-            newtoken = previous_token + 1
-        else:
-            newtoken = None
-
-        return newtoken
+    def page_paginator(self) -> FullPagePaginator:
+        """Return the paginator over pages of 100 tasks."""
+        return FullPagePaginator(self, page_size=100)
@@ -1,10 +1,24 @@
 """ClickUp tap class."""
 
-from typing import List
+from typing import List, Optional
 
+import click
 from singer_sdk import Tap, Stream
 from singer_sdk import typing as th
 
+from tap_clickup.budget import RunBudget
+from tap_clickup.cassette import Cassette
+from tap_clickup.client import ijson
+from tap_clickup.concurrency import PartitionScheduler
+from tap_clickup.customfields import CustomFieldIndex
+from tap_clickup.engine import AsyncEngine, aiohttp
+from tap_clickup.fingerprint import FingerprintStore
+from tap_clickup.hierarchy import HierarchyCache
+from tap_clickup.output import FastMessageWriter, MessageWriter, orjson
+from tap_clickup.plan import SyncPlan
+from tap_clickup.shard import ShardRunner
+from tap_clickup.telemetry import Telemetry
+from tap_clickup.tokens import TokenPool
 from tap_clickup.streams import (
     TeamsStream,
     SpacesStream,
@@ -18,6 +32,7 @@ from tap_clickup.streams import (
     TasksStream,
     FolderCustomFieldsStream,
     FolderlessCustomFieldsStream,
+    ListCustomFieldsStream,
     TimeEntries,
 )
 
@@ -34,6 +49,7 @@ STREAM_TYPES = [
     TasksStream,
     FolderCustomFieldsStream,
     FolderlessCustomFieldsStream,
+    ListCustomFieldsStream,
     TimeEntries,
 ]
 
@@ -47,6 +63,238 @@ class TapClickUp(Tap):
         th.Property(
             "api_token", th.StringType, required=True, description="Example: 'pk_12345"
         ),
+        th.Property(
+            "api_tokens",
+            th.ArrayType(
+                th.ObjectType(
+                    th.Property("token", th.StringType, required=True),
+                    th.Property("team_ids", th.ArrayType(th.StringType)),
+                )
+            ),
+            description="""More tokens to spread requests over, on top of
+            api_token. Each token has its own rate limit. Tokens with team_ids
+            are only used for (and are the only ones used for) those teams.""",
+        ),
+        th.Property(
+            "max_workers",
+            th.IntegerType,
+            default=1,
+            description="""Number of child stream partitions (ie one list for
+            one archived value) synced concurrently. 1 syncs everything
+            sequentially.""",
+        ),
+        th.Property(
+            "max_pending_partitions",
+            th.IntegerType,
+            description="""With max_workers, most child partitions queued,
+            syncing or waiting to be written at once, across every level of the
+            hierarchy. Past that the tap stops queueing more. Defaults to 4
+            times max_workers.""",
+        ),
+        th.Property(
+            "max_buffered_messages",
+            th.IntegerType,
+            default=1000,
+            description="""With max_workers, most messages a partition synced
+            on a worker holds until they're written. Past that its worker waits,
+            so at most max_pending_partitions times this many messages are held
+            in memory.""",
+        ),
+        th.Property(
+            "stream_responses",
+            th.BooleanType,
+            default=False,
+            description="""Parse response bodies incrementally, one record at a
+            time, to keep memory bounded for large pages. shared_hierarchy
+            returns a single record and is always parsed whole, so its memory
+            isn't bounded. Requires the `streaming` extra (ijson).""",
+        ),
+        th.Property(
+            "fast_output",
+            th.BooleanType,
+            default=False,
+            description="""Serialize messages with orjson (compact stdlib json if
+            it isn't installed) and buffer writes to stdout, flushing after every
+            STATE message. Install the `fast` extra for orjson.""",
+        ),
+        th.Property(
+            "task_backfill_window_days",
+            th.IntegerType,
+            description="""Split task partitions whose bookmark is older than this
+            many days into date_updated windows. Windows are synced as separate
+            partitions (concurrently with max_workers), checkpointed individually
+            and merged into one bookmark when all of them finish.""",
+        ),
+        th.Property(
+            "task_checkpoint_pages",
+            th.IntegerType,
+            default=10,
+            description="""Emit a resumable STATE message every this many pages
+            (100 tasks each) while syncing tasks.""",
+        ),
+        th.Property(
+            "time_entry_window_days",
+            th.IntegerType,
+            default=30,
+            description="""Days of time entries requested at a time. Windows are
+            synced as separate partitions (concurrently with max_workers) and
+            merged into one bookmark when all of them finish.""",
+        ),
+        th.Property(
+            "time_entry_lookback_days",
+            th.NumberType,
+            description="""Days before the bookmark to request time entries
+            again, so entries logged later with an earlier start are synced.
+            Defaults to time_entry_window_days.""",
+        ),
+        th.Property(
+            "hierarchy_cache_path",
+            th.StringType,
+            description="""File to cache the team/space/folder/list hierarchy in.
+            Parent streams that aren't selected are then skipped while the cache
+            is fresh, ie when only custom fields are selected.""",
+        ),
+        th.Property(
+            "hierarchy_cache_ttl_hours",
+            th.NumberType,
+            default=24,
+            description="Hours before a cached part of the hierarchy is refetched.",
+        ),
+        th.Property(
+            "refresh_hierarchy_cache",
+            th.BooleanType,
+            default=False,
+            description="Ignore the cached hierarchy, refetch and re-cache it.",
+        ),
+        th.Property(
+            "retry_max_seconds",
+            th.NumberType,
+            default=300,
+            description="""Give up on a request once its retry waits would add up
+            to more than this many seconds.""",
+        ),
+        th.Property(
+            "endpoint_metrics_interval",
+            th.NumberType,
+            default=60,
+            description="""Seconds between METRIC log lines with per endpoint
+            request counts, latency percentiles, bytes, decode time, retries and
+            rate limiting. A summary is always logged at the end of the sync.""",
+        ),
+        th.Property(
+            "cassette_path",
+            th.StringType,
+            description="""Gzipped file to record every request and response to,
+            or to replay them from, see cassette_mode.""",
+        ),
+        th.Property(
+            "cassette_mode",
+            th.StringType,
+            default="record",
+            description="""`record` to send requests to ClickUp and save them to
+            cassette_path, `replay` to serve responses from cassette_path
+            without touching the network.""",
+        ),
+        th.Property(
+            "cassette_replay_speed",
+            th.NumberType,
+            default=1,
+            description="""How much faster than recorded to replay responses, 0
+            replays them without waiting.""",
+        ),
+        th.Property(
+            "dedupe_custom_fields",
+            th.BooleanType,
+            default=False,
+            description="""Request custom fields once per workspace, space
+            and folder instead of once per list, and write each field once per
+            run instead of once per list it's available on. Fields created on a
+            single list aren't synced. Select list_customfield for the list to
+            field mapping.""",
+        ),
+        th.Property(
+            "shard_count",
+            th.IntegerType,
+            default=1,
+            description="""Split the sync into this many shards by team (or
+            space, see shard_by) and only sync shard shard_index. Each team or
+            space always lands in the same shard.""",
+        ),
+        th.Property(
+            "shard_index",
+            th.IntegerType,
+            default=0,
+            description="""Which shard to sync, from 0 to shard_count - 1.""",
+        ),
+        th.Property(
+            "shard_by",
+            th.StringType,
+            default="team",
+            description="""`team` or `space`. Sharding by space, streams right
+            below a team (tasks, time entries, goals...) are split by team.""",
+        ),
+        th.Property(
+            "shard_processes",
+            th.IntegerType,
+            default=1,
+            description="""Run the sync as this many tap processes, one shard
+            each, relaying their output and merging their states into one.""",
+        ),
+        th.Property(
+            "max_run_seconds",
+            th.NumberType,
+            description="""Stop requesting new pages and partitions once the run
+            has lasted this long (less the slowest request so far), write a
+            final STATE and exit cleanly. Incremental streams resume where they
+            stopped on the next run.""",
+        ),
+        th.Property(
+            "archived_sync_interval_hours",
+            th.NumberType,
+            description="""Only sync archived=true partitions (of spaces,
+            folders, lists and tasks) once every this many hours, active ones
+            are synced every run. When each partition was last synced is kept
+            in its state.""",
+        ),
+        th.Property(
+            "emit_changed_only",
+            th.BooleanType,
+            default=False,
+            description="""Only emit records of full table streams (every stream
+            but task and time_entries) that are new or changed since the last
+            run, using a fingerprint per primary key kept in the state.""",
+        ),
+        th.Property(
+            "full_refresh_interval_hours",
+            th.NumberType,
+            description="""With emit_changed_only, emit every record anyway once
+            every this many hours.""",
+        ),
+        th.Property(
+            "http_engine",
+            th.StringType,
+            default="requests",
+            description="""`requests` sends one request at a time per stream
+            (or worker), `async` sends them through an aiohttp event loop and
+            prefetches the first page of child partitions while the parent is
+            still being synced, keeping up to http_max_connections requests in
+            flight from one thread. Only first pages are prefetched, later
+            pages are requested one at a time like with `requests`.""",
+        ),
+        th.Property(
+            "http_max_connections",
+            th.IntegerType,
+            default=20,
+            description="""Most requests in flight (and keep-alive connections)
+            with the async http_engine.""",
+        ),
+        th.Property(
+            "batch_file_max_mb",
+            th.NumberType,
+            description="""Start a new BATCH file once the current one holds this
+            many megabytes of uncompressed JSON, on top of batch_config's
+            batch_size.""",
+        ),
         # Removing "official" start_date support re https://github.com/AutoIDM/tap-clickup/issues/118
         #        th.Property(
         #            "start_date",
@@ -61,6 +309,216 @@ class TapClickUp(Tap):
         #        ),
     ).to_dict()
 
+    _scheduler: Optional[PartitionScheduler] = None
+    _token_pool: Optional[TokenPool] = None
+    _run_budget: Optional[RunBudget] = None
+    _hierarchy_cache: Optional[HierarchyCache] = None
+    _custom_field_index: Optional[CustomFieldIndex] = None
+    _fingerprint_store: Optional[FingerprintStore] = None
+    _cassette: Optional[Cassette] = None
+    _telemetry: Optional[Telemetry] = None
+    _engine: Optional[AsyncEngine] = None
+
+    @property
+    def scheduler(self) -> PartitionScheduler:
+        """Return the scheduler shared by all streams to sync child partitions."""
+        if self._scheduler is None:
+            self._scheduler = PartitionScheduler(
+                tap_state=self.state,
+                max_workers=self.config.get("max_workers", 1),
+                max_pending=self.config.get("max_pending_partitions"),
+                max_buffered=self.config.get("max_buffered_messages", 1000),
+                writer=(
+                    FastMessageWriter()
+                    if self.config.get("fast_output")
+                    else MessageWriter()
+                ),
+            )
+        return self._scheduler
+
+    @property
+    def token_pool(self) -> TokenPool:
+        """Return the API tokens (and their rate limiters) shared by all streams."""
+        if self._token_pool is None:
+            self._token_pool = TokenPool.from_config(self.config)
+        return self._token_pool
+
+    @property
+    def run_budget(self) -> RunBudget:
+        """Return the time budget of the run, shared by all streams."""
+        if self._run_budget is None:
+            self._run_budget = RunBudget(self.config.get("max_run_seconds"))
+        return self._run_budget
+
+    @property
+    def hierarchy_cache(self) -> HierarchyCache:
+        """Return the hierarchy cache shared by all streams."""
+        if self._hierarchy_cache is None:
+            self._hierarchy_cache = HierarchyCache(
+                path=self.config.get("hierarchy_cache_path"),
+                ttl_seconds=self.config.get("hierarchy_cache_ttl_hours", 24) * 3600,
+                refresh=self.config.get("refresh_hierarchy_cache", False),
+            )
+        return self._hierarchy_cache
+
+    @property
+    def custom_field_index(self) -> CustomFieldIndex:
+        """Return the custom fields seen so far this run."""
+        if self._custom_field_index is None:
+            self._custom_field_index = CustomFieldIndex()
+        return self._custom_field_index
+
+    @property
+    def fingerprint_store(self) -> FingerprintStore:
+        """Return the fingerprint indexes of `emit_changed_only`, out of the state."""
+        if self._fingerprint_store is None:
+            self._fingerprint_store = FingerprintStore()
+        return self._fingerprint_store
+
+    @property
+    def telemetry(self) -> Telemetry:
+        """Return the per endpoint statistics shared by all streams."""
+        if self._telemetry is None:
+            self._telemetry = Telemetry(
+                log_interval=self.config.get("endpoint_metrics_interval", 60)
+            )
+        return self._telemetry
+
+    @property
+    def cassette(self) -> Optional[Cassette]:
+        """Return the cassette shared by all streams, None if not configured."""
+        if self._cassette is None and self.config.get("cassette_path"):
+            self._cassette = Cassette(
+                path=self.config["cassette_path"],
+                mode=self.config.get("cassette_mode", "record"),
+                speed=self.config.get("cassette_replay_speed", 1),
+            )
+        return self._cassette
+
+    @property
+    def engine(self) -> Optional[AsyncEngine]:
+        """Return the async engine shared by all streams, None if not enabled.
+
+        Cassettes record and replay through `requests`, so they take precedence.
+        """
+        if (
+            self._engine is None
+            and self.config.get("http_engine") == "async"
+            and aiohttp is not None
+            and not self.config.get("cassette_path")
+        ):
+            self._engine = AsyncEngine(
+                max_connections=self.config.get("http_max_connections", 20)
+            )
+        return self._engine
+
+    def sync_all(self) -> None:
+        """Sync all streams, then log the endpoint summary and persist caches.
+
+        With `shard_processes` the sync is run by that many shard processes.
+        """
+        processes = self.config.get("shard_processes", 1)
+        if processes > 1 and self.config.get("shard_count", 1) <= 1:
+            ShardRunner(
+                config=dict(self.config),
+                catalog=self.catalog_dict,
+                state=self.state,
+                processes=processes,
+            ).run()
+            return
+        self.run_budget.start()
+        self.fingerprint_store.load(self.state)
+        try:
+            super().sync_all()
+            if self.run_budget.stopped:
+                self.logger.warning(
+                    "Stopped early to stay within max_run_seconds (%s), run again "
+                    "to resume",
+                    self.run_budget.seconds,
+                )
+            # Fingerprint indexes only reach the final STATE
+            if self.fingerprint_store.dump(self.state) or self.run_budget.stopped:
+                self.scheduler.write_state()
+        finally:
+            if self._cassette is not None:
+                self._cassette.close()
+            if self._engine is not None:
+                self._engine.close()
+                self._engine = None
+            self.scheduler.close()
+            self.scheduler.writer.flush()
+            self.telemetry.log(summary=True)
+        self.hierarchy_cache.save()
+
+    def plan_sync(self) -> SyncPlan:
+        """Estimate the requests and time a sync would take, without syncing."""
+        try:
+            return SyncPlan(self).build()
+        finally:
+            if self._engine is not None:
+                self._engine.close()
+                self._engine = None
+
+    @classmethod
+    def invoke(cls, *, plan: bool = False, **kwargs) -> None:
+        """Invoke the tap's command line interface.
+
+        With `--plan` print the estimated cost of the sync instead of running it.
+        """
+        if not plan or kwargs.get("about"):
+            super().invoke(**kwargs)
+            return
+        config_files, parse_env_config = cls.config_from_cli_args(
+            *kwargs.get("config", ())
+        )
+        tap = cls(
+            config=config_files,
+            state=kwargs.get("state"),
+            catalog=kwargs.get("catalog"),
+            parse_env_config=parse_env_config,
+            validate_config=True,
+        )
+        click.echo(tap.plan_sync().report())
+
+    @classmethod
+    def get_singer_command(cls) -> click.Command:
+        """Return the tap's command, with a `--plan` option."""
+        command = super().get_singer_command()
+        command.params.append(
+            click.Option(
+                ["--plan"],
+                is_flag=True,
+                help="Print the requests and time a sync would take, then exit.",
+            )
+        )
+        return command
+
+    def load_streams(self) -> List[Stream]:
+        """Return the streams ordered by name, list_customfield last.
+
+        Its records are collected while the custom field streams sync below
+        the teams, so it's synced once they're done.
+        """
+        return sorted(
+            super().load_streams(),
+            key=lambda stream: stream.name == ListCustomFieldsStream.name,
+        )
+
     def discover_streams(self) -> List[Stream]:
         """Return a list of discovered streams."""
+        if self.config.get("stream_responses") and ijson is None:
+            self.logger.warning(
+                "stream_responses needs ijson, install tap-clickup[streaming]. "
+                "Falling back to parsing whole responses."
+            )
+        if self.config.get("fast_output") and orjson is None:
+            self.logger.warning(
+                "fast_output is faster with orjson, install tap-clickup[fast]. "
+                "Falling back to the json standard library."
+            )
+        if self.config.get("http_engine") == "async" and aiohttp is None:
+            self.logger.warning(
+                "http_engine async needs aiohttp, install tap-clickup[async]. "
+                "Falling back to requests."
+            )
         return [stream_class(tap=self) for stream_class in STREAM_TYPES]
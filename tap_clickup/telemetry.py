@@ -0,0 +1,163 @@
+"""Per endpoint request, parse and rate limit statistics."""
+
+import enum
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from singer_sdk import metrics
+
+
+class Metric(str, enum.Enum):
+    """Metric types emitted by the tap on top of the SDK's."""
+
+    ENDPOINT_STATS = "http_endpoint_stats"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Return the nearest rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class CountingReader:
+    """File like wrapper counting the bytes read through it."""
+
+    def __init__(self, raw) -> None:
+        self.raw = raw
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes = self.bytes + len(data)
+        return data
+
+
+class Reservoir:
+    """Uniform random sample of at most `size` values, for percentiles.
+
+    Keeps memory and the sort behind each percentile bounded on long runs,
+    percentiles are exact until `size` values have been added.
+    """
+
+    def __init__(self, size: int = 1024, rng: Optional[random.Random] = None) -> None:
+        self.size = size
+        self.samples: List[float] = []
+        self.count = 0
+        self._rng = rng or random.Random()
+
+    def add(self, value: float) -> None:
+        """Add a value, replacing a random sample once the reservoir is full."""
+        self.count = self.count + 1
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+            return
+        index = self._rng.randrange(self.count)
+        if index < self.size:
+            self.samples[index] = value
+
+
+class EndpointStats:
+    """Counters for one endpoint template, ie `/team/{team_id}/task`."""
+
+    COUNTERS = (
+        "requests",
+        "bytes",
+        "records",
+        "retries",
+        "throttled",
+        "decode_seconds",
+        "throttle_sleep_seconds",
+        "pacing_seconds",
+    )
+
+    def __init__(self) -> None:
+        self.latencies = Reservoir()
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+
+    def to_dict(self) -> dict:
+        """Return the counters and latency percentiles in milliseconds."""
+        latencies = sorted(self.latencies.samples)
+        stats = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            value = percentile(latencies, fraction)
+            stats[f"latency_{name}_ms"] = (
+                None if value is None else round(value * 1000, 3)
+            )
+        for counter in self.COUNTERS:
+            if counter.endswith("_seconds"):
+                stats[counter] = round(stats[counter], 3)
+        return stats
+
+
+class Telemetry:
+    """Tap wide statistics per endpoint, logged as METRIC messages.
+
+    Shows where the time of a slow run goes: `latency_*` and `bytes` are the
+    network, `throttled`, `throttle_sleep_seconds` and `pacing_seconds` the rate
+    limit, `decode_seconds` the JSON parsing. Stats are logged every
+    `log_interval` seconds and once more as a summary when the sync ends.
+    """
+
+    def __init__(
+        self,
+        log_interval: float = metrics.DEFAULT_LOG_INTERVAL,
+        clock=time.monotonic,
+    ) -> None:
+        self.log_interval = log_interval
+        self.clock = clock
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.logger = metrics.get_metrics_logger()
+        self._last_log = clock()
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, counter: str, value: float = 1) -> None:
+        """Add `value` to one of an endpoint's counters."""
+        with self._lock:
+            stats = self._stats(endpoint)
+            setattr(stats, counter, getattr(stats, counter) + value)
+
+    def add_latency(self, endpoint: str, seconds: float) -> None:
+        """Count a request and its latency."""
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.requests = stats.requests + 1
+            stats.latencies.add(seconds)
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointStats()
+        return self.endpoints[endpoint]
+
+    def maybe_log(self) -> None:
+        """Log the stats if `log_interval` has passed since they were last logged."""
+        with self._lock:
+            if self.clock() - self._last_log < self.log_interval:
+                return
+            points = self._points(summary=False)
+        for point in points:
+            metrics.log(self.logger, point)
+
+    def log(self, summary: bool = False) -> None:
+        """Log one METRIC message per endpoint."""
+        with self._lock:
+            points = self._points(summary)
+        for point in points:
+            metrics.log(self.logger, point)
+
+    def _points(self, summary: bool) -> List[metrics.Point]:
+        # Called with the lock held, so workers never log the same interval twice
+        self._last_log = self.clock()
+        return [
+            metrics.Point(
+                "summary" if summary else "counter",
+                Metric.ENDPOINT_STATS,
+                stats.to_dict(),
+                {metrics.Tag.ENDPOINT: endpoint},
+            )
+            for endpoint, stats in self.endpoints.items()
+        ]
@@ -0,0 +1,88 @@
+"""Tests for BATCH messages."""
+import gzip
+import json
+import os
+from urllib.parse import urlparse
+
+import responses
+from singer_sdk.helpers._batch import BatchConfig
+
+from tap_clickup.batch import BoundedJSONLinesBatcher
+from tap_clickup.tap import TapClickUp
+
+SAMPLE_CONFIG = {
+    "api_token": os.environ["TAP_CLICKUP_API_TOKEN"],
+}
+
+
+def batch_config(tmp_path, batch_size):
+    return {
+        "encoding": {"format": "jsonl", "compression": "gzip"},
+        "storage": {"root": tmp_path.as_uri(), "prefix": "clickup-"},
+        "batch_size": batch_size,
+    }
+
+
+def read_manifest(manifest):
+    records = []
+    for url in manifest:
+        with gzip.open(urlparse(url).path) as f:
+            records.extend(json.loads(line) for line in f)
+    return records
+
+
+def test_batch_files_bounded_by_count_and_size(tmp_path):
+    config = BatchConfig.from_dict(batch_config(tmp_path, batch_size=3))
+    records = [{"id": str(i), "name": "x" * (100 if i == 4 else 1)} for i in range(7)]
+
+    batcher = BoundedJSONLinesBatcher("tap-clickup", "task", config, max_bytes=100)
+    manifests = list(batcher.get_batches(iter(records)))
+
+    # 3 by count, then the 5th record overflows max_bytes on its own
+    assert [len(read_manifest(manifest)) for manifest in manifests] == [3, 2, 2]
+    assert [record for m in manifests for record in read_manifest(m)] == records
+    assert all(
+        urlparse(manifest[0]).path.startswith(str(tmp_path / "clickup-"))
+        for manifest in manifests
+    )
+
+
+def test_sync_writes_batch_messages(tmp_path, capsys):
+    config = {**SAMPLE_CONFIG, "batch_config": batch_config(tmp_path, batch_size=2)}
+    tap: TapClickUp = TapClickUp(config=config)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] != "space":
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    capsys.readouterr()
+
+    spaces = [{"id": str(i), "name": f"Space {i}"} for i in range(3)]
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        )
+        for archived in ("true", "false"):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+                json={"spaces": spaces if archived == "false" else []},
+            )
+        TapClickUp(config=config, catalog=catalog).sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert not [message for message in messages if message["type"] == "RECORD"]
+    batches = [message for message in messages if message["type"] == "BATCH"]
+    assert [len(read_manifest(batch["manifest"])) for batch in batches] == [2, 1]
+    assert [r["id"] for b in batches for r in read_manifest(b["manifest"])] == [
+        "0",
+        "1",
+        "2",
+    ]
+    # Each BATCH is followed by a STATE covering it
+    types = [message["type"] for message in messages]
+    for index, message_type in enumerate(types):
+        if message_type == "BATCH":
+            assert types[index + 1] == "STATE"
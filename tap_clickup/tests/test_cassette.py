@@ -0,0 +1,176 @@
+"""Tests for recording and replaying ClickUp traffic."""
+import gzip
+import json
+
+import pytest
+import requests
+import responses
+
+from tap_clickup.cassette import Cassette, CassetteMissError
+from tap_clickup.tap import TapClickUp
+
+SAMPLE_CONFIG = {"api_token": "pk_secret"}
+
+
+def select_only(config, selected):
+    tap = TapClickUp(config=config)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        for metadata in stream["metadata"]:
+            metadata["metadata"]["selected"] = stream["tap_stream_id"] in selected
+    return catalog
+
+
+def sync_records(config, catalog, capsys):
+    capsys.readouterr()
+    TapClickUp(config=config, catalog=catalog).sync_all()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return [message for message in messages if message["type"] == "RECORD"]
+
+
+@pytest.mark.parametrize("stream_responses", [False, True])
+def test_replay_matches_recording(tmp_path, capsys, stream_responses):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    config = {
+        **SAMPLE_CONFIG,
+        "cassette_path": path,
+        "stream_responses": stream_responses,
+    }
+    catalog = select_only(config, ("team", "folderless_list"))
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+            headers={"X-RateLimit-Remaining": "99"},
+        )
+        for archived in ("true", "false"):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+                json={"spaces": [{"id": "456", "name": "Space"}]},
+            )
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/space/456/list?archived={archived}",
+                json={"lists": [{"id": archived, "name": "List"}]},
+            )
+        recorded = sync_records(config, catalog, capsys)
+
+    with gzip.open(path, "rt") as cassette:
+        interactions = [json.loads(line) for line in cassette]
+    assert len(interactions) == 7
+    assert interactions[0]["response"]["headers"]["X-RateLimit-Remaining"] == "99"
+    assert "pk_secret" not in json.dumps(interactions)
+
+    replay_config = {**config, "cassette_mode": "replay", "cassette_replay_speed": 0}
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        replayed = sync_records(replay_config, catalog, capsys)
+        assert len(rsps.calls) == 0
+
+    def strip_time(records):
+        return [dict(record, time_extracted=None) for record in records]
+
+    assert len(recorded) == 5
+    assert strip_time(replayed) == strip_time(recorded)
+
+
+def test_concurrent_windows_replay_their_own_responses(tmp_path, capsys, monkeypatch):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    config = {
+        **SAMPLE_CONFIG,
+        "cassette_path": path,
+        "max_workers": 4,
+        "time_entry_window_days": 1,
+    }
+    catalog = select_only(config, ("time_entries",))
+    day = 24 * 60 * 60 * 1000
+    now = 1792281600000
+    monkeypatch.setattr("time.time", lambda: now / 1000)
+    state = {
+        "bookmarks": {
+            "time_entries": {
+                "partitions": [
+                    {
+                        "context": {"team_id": "123"},
+                        "replication_key": "start",
+                        "replication_key_value": str(now - 3 * day - 1),
+                    }
+                ]
+            }
+        }
+    }
+
+    def time_entries(request):
+        start = request.params["start_date"]
+        return 200, {}, json.dumps({"data": [{"id": start, "start": start}]})
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        )
+        rsps.add_callback(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team/123/time_entries",
+            callback=time_entries,
+        )
+        capsys.readouterr()
+        TapClickUp(
+            config=config, catalog=catalog, state=json.loads(json.dumps(state))
+        ).sync_all()
+        recorded = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    # Replayed a minute later, the newest window ends at a different time
+    now = now + 60000
+    replay_config = {**config, "cassette_mode": "replay", "cassette_replay_speed": 0}
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        TapClickUp(
+            config=replay_config, catalog=catalog, state=json.loads(json.dumps(state))
+        ).sync_all()
+        replayed = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(rsps.calls) == 0
+
+    def entries(messages):
+        return sorted(
+            message["record"]["id"]
+            for message in messages
+            if message["type"] == "RECORD"
+        )
+
+    # Three days since the bookmark, plus a day (one window) of lookback
+    assert len(entries(recorded)) == 5
+    assert entries(replayed) == entries(recorded)
+
+
+def test_windows_replay_out_of_recorded_order(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    url = "https://api.clickup.com/api/v2/team/123/time_entries"
+
+    def request(start, end):
+        return requests.Request(
+            "GET", url, params={"start_date": start, "end_date": end}
+        ).prepare()
+
+    cassette = Cassette(path, "record")
+    for prepared, body in (
+        (request(1, 2), b"first"),
+        (request(2, 1000), b"newest"),
+    ):
+        response = requests.Response()
+        response.status_code = 200
+        response.request = prepared
+        response._content = body
+        cassette.record(response)
+    cassette.close()
+
+    cassette = Cassette(path, "replay", speed=0)
+    # The newest window ends later when replayed
+    newest = cassette.replay(request(2, 2000))
+    assert newest.content == b"newest"
+    assert cassette.replay(request(1, 2)).content == b"first"
+    # Closed windows match on their own end
+    with pytest.raises(CassetteMissError):
+        cassette.replay(request(1, 3))
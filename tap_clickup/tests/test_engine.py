@@ -0,0 +1,133 @@
+"""Tests for the async http engine."""
+import gzip
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+from tap_clickup.client import ClickUpStream
+from tap_clickup.tap import TapClickUp
+
+pytest.importorskip("aiohttp")
+
+SAMPLE_CONFIG = {
+    "api_token": os.environ["TAP_CLICKUP_API_TOKEN"],
+    "http_engine": "async",
+}
+
+ROUTES = {
+    "/api/v2/team": {"teams": [{"id": "123", "name": "Team", "members": []}]},
+    "/api/v2/team/123/space": {"spaces": [{"id": "456", "name": "Space"}]},
+    "/api/v2/space/456/list": {
+        "lists": [{"id": str(list_id)} for list_id in range(10)]
+    },
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        server = self.server
+        with server.lock:
+            server.paths.append(self.path)
+            server.in_flight = server.in_flight + 1
+            server.peak = max(server.peak, server.in_flight)
+        time.sleep(0.02)
+        path = urlsplit(self.path).path
+        if path.endswith("/field"):
+            body = {"fields": [{"id": f"f{path.split('/')[4]}", "type": "text"}]}
+        else:
+            body = ROUTES[path]
+        data = gzip.compress(json.dumps(body).encode())
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with server.lock:
+            server.in_flight = server.in_flight - 1
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.lock = threading.Lock()
+    server.paths, server.in_flight, server.peak = [], 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        ClickUpStream, "url_base", f"http://127.0.0.1:{server.server_address[1]}/api/v2"
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_engine_returns_decompressed_response(server):
+    stream = TapClickUp(config=SAMPLE_CONFIG).streams["team"]
+    try:
+        request = stream.prepare_request(None, None)
+        response = stream.requests_session.send(request)
+        assert isinstance(response, requests.Response)
+        assert response.status_code == 200
+        assert response.json() == ROUTES["/api/v2/team"]
+        assert "Content-Encoding" not in response.headers
+    finally:
+        stream.engine.close()
+
+
+def test_sync_prefetches_children_concurrently(server, capsys):
+    tap: TapClickUp = TapClickUp(config=SAMPLE_CONFIG)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] != "folderless_customfield":
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    capsys.readouterr()
+
+    TapClickUp(config=SAMPLE_CONFIG, catalog=catalog).sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [m["record"]["id"] for m in messages if m["type"] == "RECORD"] == [
+        f"f{list_id}" for list_id in range(10)
+    ] * 4
+    # Same requests as without the engine (the space is in both archived
+    # partitions, so are its lists), several at a time
+    field_paths = [path for path in server.paths if "/field" in path]
+    assert len(field_paths) == 40
+    assert server.peak > 1
+
+
+def test_request_authorized_unless_prefetched_response_claimed(server, monkeypatch):
+    stream = TapClickUp(config=SAMPLE_CONFIG).streams["team"]
+    authorized = []
+    authorize = stream.authorize
+    monkeypatch.setattr(
+        stream,
+        "authorize",
+        lambda request, context: authorized.append(request.url)
+        or authorize(request, context),
+    )
+    try:
+        engine = stream.engine
+        engine.prefetch(stream.prepare_request(None, None))
+        stream._request(stream.prepare_request(None, None), None)
+        assert authorized == []
+
+        # Dropped before it was claimed, ie evicted by newer prefetches
+        engine.prefetch(stream.prepare_request(None, None))
+        with engine._lock:
+            engine._prefetched.clear()
+        stream._request(stream.prepare_request(None, None), None)
+        assert len(authorized) == 1
+        assert len(server.paths) == 3
+    finally:
+        stream.engine.close()
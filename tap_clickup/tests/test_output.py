@@ -0,0 +1,51 @@
+"""Tests for the Singer message writers."""
+import datetime
+import json
+
+import pytest
+import singer_sdk._singerlib as singer
+
+from tap_clickup import output
+from tap_clickup.output import FastMessageWriter, MessageWriter
+
+
+def messages():
+    extracted = datetime.datetime(2022, 4, 19, 1, 2, 3, tzinfo=datetime.timezone.utc)
+    return [
+        singer.SchemaMessage(
+            stream="task", schema={"type": "object"}, key_properties=["id"]
+        ),
+        singer.RecordMessage(
+            stream="task",
+            record={"id": "1", "name": "Ünïcode", "points": 1.5, "tags": []},
+            time_extracted=extracted,
+        ),
+        singer.RecordMessage(stream="task", record={"id": "2"}, version=3),
+        singer.StateMessage(value={"bookmarks": {"task": {}}}),
+    ]
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_fast_writer_matches_sdk(capsys, monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(output, "orjson", None)
+    sdk = MessageWriter()
+    for message in messages():
+        sdk.write(message)
+    expected = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    fast = FastMessageWriter()
+    for message in messages():
+        fast.write(message)
+    fast.flush()
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == (
+        expected
+    )
+
+
+def test_fast_writer_flushes_on_state(capsys):
+    writer = FastMessageWriter()
+    writer.write(singer.RecordMessage(stream="task", record={"id": "1"}))
+    assert capsys.readouterr().out == ""
+    writer.write(singer.StateMessage(value={}))
+    assert len(capsys.readouterr().out.splitlines()) == 2
@@ -0,0 +1,122 @@
+"""Tests for the request cost planner."""
+import json
+import os
+
+import responses
+from click.testing import CliRunner
+
+from tap_clickup.tap import TapClickUp
+
+SAMPLE_CONFIG = {
+    "api_token": os.environ["TAP_CLICKUP_API_TOKEN"],
+}
+
+
+def hierarchy(rsps: responses.RequestsMock) -> None:
+    rsps.add(
+        responses.GET,
+        "https://api.clickup.com/api/v2/team",
+        json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        headers={
+            "X-RateLimit-Limit": "900",
+            "X-RateLimit-Remaining": "899",
+            "X-RateLimit-Reset": "9999999999",
+        },
+    )
+    for archived in ("true", "false"):
+        rsps.add(
+            responses.GET,
+            f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+            json={"spaces": [{"id": archived}]},
+        )
+        for space_id in ("true", "false"):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/space/{space_id}/list"
+                f"?archived={archived}",
+                json={"lists": [{"id": "1"}, {"id": "2"}]},
+            )
+
+
+def select(catalog: dict, selected: tuple) -> dict:
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] not in selected:
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    return catalog
+
+
+def test_plan_walks_hierarchy_only(capsys):
+    config = {**SAMPLE_CONFIG, "dedupe_custom_fields": True}
+    catalog = select(
+        TapClickUp(config=config).catalog_dict,
+        ("folderless_customfield", "task", "time_entries"),
+    )
+    capsys.readouterr()
+
+    with responses.RequestsMock() as rsps:
+        hierarchy(rsps)
+        plan = TapClickUp(config=config, catalog=catalog).plan_sync().to_dict()
+
+    assert capsys.readouterr().out == ""
+    streams = plan["streams"]
+    assert streams["team"]["requests"] == 1
+    assert streams["space"] == {
+        "partitions": 2,
+        "requests": 2,
+        "paginated": False,
+        "seconds": streams["space"]["seconds"],
+    }
+    assert streams["folderless_list"]["requests"] == 4
+    # Fields are requested once for the team and once per space
+    assert streams["folderless_customfield"]["partitions"] == 8
+    assert streams["folderless_customfield"]["requests"] == 3
+    assert streams["task"]["paginated"]
+    assert streams["task"]["requests"] == 2
+    # Every time_entry_window_days window since 2017
+    assert streams["time_entries"]["requests"] > 100
+    assert plan["walk_requests"] == 7
+    assert plan["rate_limit"] == 900
+    assert plan["requests"] == 12 + streams["time_entries"]["requests"]
+
+
+def test_plan_replays_cached_hierarchy(tmp_path):
+    config = {**SAMPLE_CONFIG, "hierarchy_cache_path": str(tmp_path / "cache.json")}
+    catalog = select(TapClickUp(config=config).catalog_dict, ("space",))
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        hierarchy(rsps)
+        TapClickUp(config=config, catalog=catalog).sync_all()
+
+    catalog = select(TapClickUp(config=config).catalog_dict, ("folderless_list",))
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        hierarchy(rsps)
+        plan = TapClickUp(config=config, catalog=catalog).plan_sync().to_dict()
+        requests = len(rsps.calls)
+
+    # Teams and spaces come from the cache, lists are only counted
+    assert plan["streams"]["team"]["requests"] == 0
+    assert plan["streams"]["space"]["requests"] == 0
+    assert plan["streams"]["folderless_list"]["requests"] == 4
+    assert plan["walk_requests"] == requests == 0
+
+
+def test_plan_command(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(SAMPLE_CONFIG))
+    catalog_path = tmp_path / "catalog.json"
+    catalog = select(TapClickUp(config=SAMPLE_CONFIG).catalog_dict, ("space",))
+    catalog_path.write_text(json.dumps(catalog))
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        hierarchy(rsps)
+        result = CliRunner(mix_stderr=False).invoke(
+            TapClickUp.cli,
+            ["--config", str(config_path), "--catalog", str(catalog_path), "--plan"],
+        )
+
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0].split() == ["stream", "partitions", "requests", "seconds"]
+    assert lines[2].split()[:3] == ["space", "2", "2"]
+    assert "RECORD" not in result.output
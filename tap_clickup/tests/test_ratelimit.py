@@ -0,0 +1,67 @@
+"""Tests for the X-RateLimit driven request pacing."""
+import requests
+
+from tap_clickup.ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def ratelimit_response(limit, remaining, reset, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers["X-RateLimit-Limit"] = str(limit)
+    response.headers["X-RateLimit-Remaining"] = str(remaining)
+    response.headers["X-RateLimit-Reset"] = str(reset)
+    return response
+
+
+def test_no_wait_while_budget_is_plentiful():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock.time, sleep=clock.sleep)
+    limiter.update(ratelimit_response(100, 90, 1060))
+    for _ in range(10):
+        limiter.acquire()
+    assert clock.slept == []
+
+
+def test_paces_remaining_budget_until_reset():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock.time, sleep=clock.sleep)
+    limiter.update(ratelimit_response(100, 5, 1060))
+    for _ in range(5):
+        limiter.acquire()
+    # 5 requests left over 60 seconds, spread out instead of sent in a burst
+    assert clock.slept == [12.0, 12.0, 12.0, 12.0]
+    assert clock.now < 1060
+
+
+def test_exhausted_budget_waits_for_reset():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock.time, sleep=clock.sleep)
+    limiter.update(ratelimit_response(100, 0, 1030, status_code=429))
+    limiter.acquire()
+    assert clock.now == 1030
+    # New window, no pacing until the next response tells us the budget
+    limiter.acquire()
+    assert clock.now == 1030
+
+
+def test_wait_longer_than_max_wait_is_refused():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock.time, sleep=clock.sleep)
+    limiter.update(ratelimit_response(100, 0, 1030, status_code=429))
+    assert limiter.acquire(max_wait=10) is None
+    assert clock.slept == []
+    # The slot wasn't taken, a request that can wait still gets it
+    assert limiter.acquire(max_wait=60) == 30
@@ -0,0 +1,88 @@
+"""Tests for the retry policy."""
+import pytest
+import requests
+import responses
+
+from tap_clickup.budget import OutOfTimeError
+from tap_clickup.retry import RetryAfterError, retry_after, retry_waits
+from tap_clickup.tap import TapClickUp
+
+DATE = "Sun, 18 Oct 2026 00:00:00 GMT"
+EPOCH = 1792281600
+
+
+def response_with(headers):
+    response = requests.Response()
+    response.status_code = 429
+    response.headers.update({"Date": DATE, **headers})
+    return response
+
+
+def test_retry_after_prefers_retry_after_header():
+    assert retry_after(response_with({"Retry-After": "7"})) == 7
+    retry_date = "Sun, 18 Oct 2026 00:00:30 GMT"
+    assert retry_after(response_with({"Retry-After": retry_date})) == 30
+    assert retry_after(response_with({"X-RateLimit-Reset": str(EPOCH + 12)})) == 12
+    assert retry_after(response_with({"X-RateLimit-Reset": str(EPOCH - 5)})) == 0
+    assert retry_after(response_with({})) is None
+
+
+def no_jitter(low, high):
+    return high
+
+
+def test_retry_waits_honors_server_and_backs_off_otherwise():
+    waits = retry_waits(max_total=100, jitter=no_jitter)
+    next(waits)
+    assert waits.send(RetryAfterError("429", 10)) == 11
+    assert waits.send(Exception("500")) == 2
+    assert waits.send(Exception("500")) == 4
+    assert waits.send(RetryAfterError("429", 0)) == 1
+
+
+def test_retry_waits_gives_up_after_max_total():
+    waits = retry_waits(max_total=30, jitter=no_jitter)
+    next(waits)
+    assert waits.send(RetryAfterError("429", 19)) == 20
+    try:
+        waits.send(RetryAfterError("429", 19))
+    except StopIteration:
+        pass
+    else:
+        raise AssertionError("Expected retry_waits to give up")
+
+
+def test_retry_waits_raises_from_check_wait():
+    def check_wait(wait):
+        if wait > 10:
+            raise OutOfTimeError("out of time")
+
+    waits = retry_waits(max_total=300, jitter=no_jitter, check_wait=check_wait)
+    next(waits)
+    assert waits.send(RetryAfterError("429", 5)) == 6
+    with pytest.raises(OutOfTimeError):
+        waits.send(RetryAfterError("429", 60))
+
+
+def test_429_waits_once(monkeypatch):
+    slept = []
+    monkeypatch.setattr("time.sleep", slept.append)
+    tap = TapClickUp(config={"api_token": "x"})
+    stream = tap.streams["team"]
+    stream._sync_children = lambda child_context: None
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            status=429,
+            headers={"Retry-After": "3"},
+        )
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        )
+        stream.sync()
+    # The Retry-After wait plus under a second of jitter, nothing else
+    assert len(slept) == 1
+    assert 3 <= slept[0] < 4
@@ -0,0 +1,160 @@
+"""Tests for sharding a sync by team or space."""
+import io
+import json
+import os
+
+import pytest
+import responses
+
+from tap_clickup.shard import ShardRunner, merge_states
+from tap_clickup.tap import TapClickUp
+
+SAMPLE_CONFIG = {
+    "api_token": os.environ["TAP_CLICKUP_API_TOKEN"],
+}
+
+# Teams 4 and spaces 14 and 15 are in shard 0 of 2, the others in shard 1
+SPACES = {"1": ["10", "14"], "4": ["15", "18"]}
+
+
+def sync_shard(config: dict, capsys) -> dict:
+    tap: TapClickUp = TapClickUp(config=config)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] not in ("team", "space", "folder"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    capsys.readouterr()
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": team, "members": []} for team in SPACES]},
+        )
+        for team, spaces in SPACES.items():
+            for archived in ("true", "false"):
+                rsps.add(
+                    responses.GET,
+                    f"https://api.clickup.com/api/v2/team/{team}/space"
+                    f"?archived={archived}",
+                    json={"spaces": [{"id": space} for space in spaces]},
+                )
+                for space in spaces:
+                    rsps.add(
+                        responses.GET,
+                        f"https://api.clickup.com/api/v2/space/{space}/folder"
+                        f"?archived={archived}",
+                        json={"folders": [{"id": f"{space}-{archived}"}]},
+                    )
+        TapClickUp(config=config, catalog=catalog).sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records: dict = {"team": set(), "space": set(), "folder": set()}
+    for message in messages:
+        if message["type"] == "RECORD":
+            records[message["stream"]].add(message["record"]["id"])
+    return records
+
+
+@pytest.mark.parametrize(
+    "shard_by,expected",
+    [
+        ("team", {"team": {"4"}, "space": {"15", "18"}}),
+        ("space", {"team": {"4"}, "space": {"14", "15"}}),
+    ],
+)
+def test_shards_sync_disjoint_parts(shard_by, expected, capsys):
+    shards = [
+        sync_shard(
+            {
+                **SAMPLE_CONFIG,
+                "shard_count": 2,
+                "shard_index": index,
+                "shard_by": shard_by,
+            },
+            capsys,
+        )
+        for index in range(2)
+    ]
+    assert shards[0]["team"] == expected["team"]
+    assert shards[0]["space"] == expected["space"]
+    assert shards[0]["folder"] == {
+        f"{space}-{archived}"
+        for space in expected["space"]
+        for archived in ("true", "false")
+    }
+    unsharded = sync_shard(SAMPLE_CONFIG, capsys)
+    for stream, ids in unsharded.items():
+        assert not shards[0][stream] & shards[1][stream]
+        assert shards[0][stream] | shards[1][stream] == ids
+
+
+def test_merge_states_keeps_what_each_shard_changed():
+    base = {
+        "bookmarks": {
+            "task": {
+                "partitions": [
+                    {"context": {"team_id": "1"}, "replication_key_value": "a"},
+                    {"context": {"team_id": "4"}, "replication_key_value": "a"},
+                ]
+            },
+            "space": {"fingerprints": {"10": "x"}},
+        }
+    }
+    first = {
+        "bookmarks": {
+            "task": {
+                "partitions": [
+                    {"context": {"team_id": "1"}, "replication_key_value": "b"},
+                    {"context": {"team_id": "4"}, "replication_key_value": "a"},
+                ]
+            },
+            "space": {"fingerprints": {"10": "y"}},
+        }
+    }
+    second = {
+        "bookmarks": {
+            "task": {
+                "partitions": [
+                    {"context": {"team_id": "1"}, "replication_key_value": "a"},
+                    {"context": {"team_id": "4"}, "replication_key_value": "c"},
+                    {"context": {"team_id": "5"}, "replication_key_value": "c"},
+                ]
+            },
+            "space": {"fingerprints": {"10": "x", "15": "z"}},
+        }
+    }
+
+    merged = merge_states([first, second], base=base)
+
+    assert merged["bookmarks"]["task"]["partitions"] == [
+        {"context": {"team_id": "1"}, "replication_key_value": "b"},
+        {"context": {"team_id": "4"}, "replication_key_value": "c"},
+        {"context": {"team_id": "5"}, "replication_key_value": "c"},
+    ]
+    assert merged["bookmarks"]["space"]["fingerprints"] == {"10": "y", "15": "z"}
+
+
+def test_runner_relays_schemas_once_and_merged_states():
+    base = {"bookmarks": {}}
+    output = io.BytesIO()
+    runner = ShardRunner(config={}, catalog={}, state=base, processes=2, output=output)
+    schema = b'{"type": "SCHEMA", "stream": "team", "schema": {}}\n'
+    for index, line in [
+        (0, schema),
+        (1, schema),
+        (1, b'{"type": "RECORD", "stream": "team", "record": {"id": "1"}}\n'),
+        (1, b'{"type": "STATE", "value": {"bookmarks": {"team": {"a": 1}}}}\n'),
+        (0, b'{"type": "STATE", "value": {"bookmarks": {"space": {"b": 2}}}}\n'),
+    ]:
+        runner._relay(index, line)
+
+    messages = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [message["type"] for message in messages] == [
+        "SCHEMA",
+        "RECORD",
+        "STATE",
+        "STATE",
+    ]
+    assert messages[-1]["value"] == {"bookmarks": {"team": {"a": 1}, "space": {"b": 2}}}
@@ -1,7 +1,11 @@
 from singer_sdk.tap_base import Tap
+import copy
+import json
 import os
 import responses
 import pytest
+import re
+import time
 from pathlib import Path
 
 from tap_clickup.tap import TapClickUp
@@ -88,7 +92,9 @@ def mocked_responses():
         yield rsps
 
 
-def test_state_properly_stored(mocked_responses):
+@pytest.mark.parametrize("stream_responses", [False, True])
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_state_properly_stored(mocked_responses, max_workers, stream_responses):
     task_response_json = ""
     with open(Path(__file__).parent / Path("task.json")) as task:
         task_response_json = task.read()
@@ -152,7 +158,15 @@ def test_state_properly_stored(mocked_responses):
             for metadata in stream["metadata"]:
                 metadata["metadata"]["selected"] = False
     state1 = tap1.state
-    tap2: Tap = TapClickUp(config=SAMPLE_CONFIG, state=state1, catalog=catalog1)
+    tap2: Tap = TapClickUp(
+        config={
+            **SAMPLE_CONFIG,
+            "max_workers": max_workers,
+            "stream_responses": stream_responses,
+        },
+        state=state1,
+        catalog=catalog1,
+    )
     tap2.streams.get(
         "team"
     ).sync()  # This calls team, and task as task is a child stream
@@ -183,3 +197,525 @@ def test_state_properly_stored(mocked_responses):
         else:
             raise Exception("State doesn't match expectations")
         assert state["replication_key_value"] == value_should_be
+
+
+def test_backfill_windows_merge_into_one_bookmark(mocked_responses):
+    task_response_json = (Path(__file__).parent / Path("task.json")).read_text()
+    archived_task_response = (
+        Path(__file__).parent / Path("archived_task.json")
+    ).read_text()
+    mocked_responses.add(
+        responses.GET,
+        "https://api.clickup.com/api/v2/team",
+        body=team_response,
+        content_type="application/json",
+    )
+    for team_id in ("18011725", "18011726"):
+        mocked_responses.add(
+            responses.GET,
+            re.compile(
+                f"https://api.clickup.com/api/v2/team/{team_id}/task\\?archived=true.*"
+            ),
+            body=archived_task_response,
+            content_type="application/json",
+        )
+        mocked_responses.add(
+            responses.GET,
+            re.compile(
+                f"https://api.clickup.com/api/v2/team/{team_id}/task\\?archived=false.*"
+            ),
+            body=task_response_json,
+            content_type="application/json",
+        )
+    tap1: Tap = TapClickUp(config=SAMPLE_CONFIG, parse_env_config=True)
+    tap1.run_discovery()
+    catalog1 = tap1.catalog_dict
+    for stream in catalog1["streams"]:
+        if stream.get("stream") and stream["stream"] not in ("task", "team"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    tap2: Tap = TapClickUp(
+        config={**SAMPLE_CONFIG, "max_workers": 4, "task_backfill_window_days": 365},
+        catalog=catalog1,
+    )
+    tap2.streams.get("team").sync()
+
+    # Many windows were requested per partition
+    window_calls = [
+        call for call in mocked_responses.calls if "date_updated_lt" in call.request.url
+    ]
+    assert len(window_calls) > 4 * 5
+    task_state = tap2.state["bookmarks"]["task"]["partitions"]
+    # But only one bookmark per partition is left once the windows are merged
+    assert sorted(
+        (state["context"]["team_id"], state["context"]["archived"])
+        for state in task_state
+    ) == [
+        ("18011725", "false"),
+        ("18011725", "true"),
+        ("18011726", "false"),
+        ("18011726", "true"),
+    ]
+    for state in task_state:
+        if state["context"]["archived"] == "true":
+            assert state["replication_key_value"] == "1801172501"
+        else:
+            assert state["replication_key_value"] == "1801172502"
+
+
+@pytest.mark.parametrize("window_days", [None, 365])
+def test_archived_partitions_synced_on_interval(mocked_responses, window_days):
+    task_response_json = (Path(__file__).parent / Path("task.json")).read_text()
+    archived_task_response = (
+        Path(__file__).parent / Path("archived_task.json")
+    ).read_text()
+    mocked_responses.add(
+        responses.GET,
+        "https://api.clickup.com/api/v2/team",
+        body=team_response,
+        content_type="application/json",
+    )
+    for archived, body in (
+        ("true", archived_task_response),
+        ("false", task_response_json),
+    ):
+        mocked_responses.add(
+            responses.GET,
+            re.compile(
+                f"https://api.clickup.com/api/v2/team/\\d+/task\\?archived={archived}.*"
+            ),
+            body=body,
+            content_type="application/json",
+        )
+    tap1: Tap = TapClickUp(config=SAMPLE_CONFIG, parse_env_config=True)
+    catalog1 = tap1.catalog_dict
+    for stream in catalog1["streams"]:
+        if stream.get("stream") and stream["stream"] not in ("task", "team"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    config = {
+        **SAMPLE_CONFIG,
+        "archived_sync_interval_hours": 24,
+        "task_backfill_window_days": window_days,
+    }
+    tap2: Tap = TapClickUp(config=config, catalog=catalog1)
+    tap2.sync_all()
+
+    task_state = tap2.state["bookmarks"]["task"]["partitions"]
+    assert len(task_state) == 4
+    for state in task_state:
+        assert ("last_synced" in state) == (state["context"]["archived"] == "true")
+
+    # Within the interval only the active partitions are synced
+    calls = len(mocked_responses.calls)
+    tap3: Tap = TapClickUp(config=config, catalog=catalog1, state=tap2.state)
+    tap3.sync_all()
+    urls = [call.request.url for call in mocked_responses.calls[calls:]]
+    assert [url for url in urls if "archived=false" in url]
+    assert not [url for url in urls if "archived=true" in url]
+    assert tap3.state["bookmarks"]["task"] == tap2.state["bookmarks"]["task"]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_time_entries_windowed_incremental(mocked_responses, max_workers):
+    mocked_responses.add(
+        responses.GET,
+        "https://api.clickup.com/api/v2/team",
+        body=team_response,
+        content_type="application/json",
+    )
+    entries = [
+        {"id": "1", "start": "1600000000000", "end": "1600000060000"},
+        {"id": "2", "start": "1600000001000", "end": "1600000060000"},
+    ]
+    for team_id in ("18011725", "18011726"):
+        mocked_responses.add(
+            responses.GET,
+            re.compile(f"https://api.clickup.com/api/v2/team/{team_id}/time_entries.*"),
+            json={"data": entries},
+        )
+    tap1: Tap = TapClickUp(config=SAMPLE_CONFIG, parse_env_config=True)
+    tap1.run_discovery()
+    catalog1 = tap1.catalog_dict
+    for stream in catalog1["streams"]:
+        if stream.get("stream") and stream["stream"] not in ("time_entries", "team"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    tap2: Tap = TapClickUp(
+        config={
+            **SAMPLE_CONFIG,
+            "max_workers": max_workers,
+            "time_entry_window_days": 365,
+        },
+        catalog=catalog1,
+    )
+    tap2.streams.get("team").sync()
+
+    # Every request asks for an explicit window of at most 365 days
+    window = 365 * 24 * 60 * 60 * 1000
+    calls = [
+        call for call in mocked_responses.calls if "time_entries" in call.request.url
+    ]
+    assert len(calls) > 2 * 5
+    for call in calls:
+        params = call.request.params
+        assert 0 < int(params["end_date"]) - int(params["start_date"]) <= window
+    # Windows are merged into one bookmark per team
+    time_entries_state = tap2.state["bookmarks"]["time_entries"]["partitions"]
+    assert sorted(state["context"]["team_id"] for state in time_entries_state) == [
+        "18011725",
+        "18011726",
+    ]
+    for state in time_entries_state:
+        assert state["replication_key_value"] == "1600000001000"
+
+
+@pytest.mark.parametrize("lookback_days", [None, 0, 2])
+def test_time_entries_look_back_before_bookmark(lookback_days):
+    """Entries logged late, with a start before the bookmark, are requested"""
+    day = 24 * 60 * 60 * 1000
+    bookmark = int(time.time() * 1000) - 10 * day
+    partition = {"team_id": "1"}
+    state = {
+        "bookmarks": {
+            "time_entries": {
+                "partitions": [
+                    {
+                        "context": partition,
+                        "replication_key": "start",
+                        "replication_key_value": str(bookmark),
+                    }
+                ]
+            }
+        }
+    }
+    config = {**SAMPLE_CONFIG, "time_entry_window_days": 7}
+    if lookback_days is not None:
+        config["time_entry_lookback_days"] = lookback_days
+    stream = TapClickUp(config=config, state=state).streams["time_entries"]
+
+    windows = stream.backfill_windows(partition, 7)
+    # Defaults to one window
+    expected = 7 if lookback_days is None else lookback_days
+    assert windows[0]["start_date"] == bookmark - expected * day
+    # Within a window of the bookmark the partition isn't split, same lookback
+    stream.get_context_state(partition)["replication_key_value"] = str(
+        bookmark + 8 * day
+    )
+    assert stream.backfill_windows(partition, 7) == [partition]
+    stream._write_starting_replication_value(partition)
+    params = stream.get_url_params(partition, None)
+    assert params["start_date"] == bookmark + 8 * day - expected * day
+
+
+def test_backfill_resumes_unfinished_windows():
+    partition = {"team_id": "1", "archived": "true"}
+    state = {
+        "bookmarks": {
+            "task": {
+                "partitions": [
+                    {
+                        "context": {
+                            **partition,
+                            "date_updated_gt": 0,
+                            "date_updated_lt": 10,
+                        },
+                        "replication_key_value": "9",
+                        "window_complete": True,
+                    },
+                    {
+                        "context": {**partition, "date_updated_gt": 10},
+                        "replication_key_value": "15",
+                    },
+                ]
+            }
+        }
+    }
+    tap: Tap = TapClickUp(
+        config={**SAMPLE_CONFIG, "task_backfill_window_days": 30}, state=state
+    )
+    contexts = tap.streams["task"].backfill_windows(partition, 30)
+    assert contexts == [{**partition, "date_updated_gt": 10}]
+
+
+def test_backfill_resumes_from_first_unfinished_window():
+    """The tap was killed partway through a backfill run concurrently, ie the
+    second window never started while the third completed"""
+    partition = {"team_id": "1", "archived": "true"}
+    day = 24 * 60 * 60 * 1000
+    now = int(time.time() * 1000)
+    start = now - 4 * day - day // 2
+    state = {
+        "bookmarks": {
+            "task": {
+                "partitions": [
+                    {
+                        "context": {
+                            **partition,
+                            "date_updated_gt": start,
+                            "date_updated_lt": start + day,
+                        },
+                        "replication_key_value": str(start + day - 1),
+                        "window_complete": True,
+                    },
+                    {
+                        "context": {
+                            **partition,
+                            "date_updated_gt": start + 2 * day,
+                            "date_updated_lt": start + 3 * day,
+                        },
+                        "replication_key_value": str(start + 3 * day - 1),
+                        "window_complete": True,
+                    },
+                ]
+            }
+        }
+    }
+    tap: Tap = TapClickUp(
+        config={**SAMPLE_CONFIG, "task_backfill_window_days": 1}, state=state
+    )
+    contexts = tap.streams["task"].backfill_windows(partition, 1)
+
+    assert contexts[:2] == [
+        {
+            **partition,
+            "date_updated_gt": start + day,
+            "date_updated_lt": start + 2 * day,
+        },
+        {
+            **partition,
+            "date_updated_gt": start + 3 * day,
+            "date_updated_lt": start + 4 * day,
+        },
+    ]
+    assert contexts[-1] == {**partition, "date_updated_gt": start + 4 * day}
+    # Nothing was merged, the bookmark isn't the third window's
+    assert len(tap.state["bookmarks"]["task"]["partitions"]) == 2
+
+
+def test_backfill_merges_completed_windows_left_unmerged():
+    """Every window completed but the run died before merging them"""
+    partition = {"team_id": "1", "archived": "true"}
+    now = int(time.time() * 1000)
+    state = {
+        "bookmarks": {
+            "task": {
+                "partitions": [
+                    {
+                        "context": {
+                            **partition,
+                            "date_updated_gt": 0,
+                            "date_updated_lt": 10,
+                        },
+                        "replication_key_value": "9",
+                        "window_complete": True,
+                    },
+                    {
+                        "context": {**partition, "date_updated_gt": 10},
+                        "replication_key_value": str(now),
+                        "window_complete": True,
+                    },
+                ]
+            }
+        }
+    }
+    tap: Tap = TapClickUp(
+        config={**SAMPLE_CONFIG, "task_backfill_window_days": 30}, state=state
+    )
+    contexts = tap.streams["task"].backfill_windows(partition, 30)
+
+    assert contexts == [partition]
+    assert tap.state["bookmarks"]["task"]["partitions"] == [
+        {
+            "context": partition,
+            "replication_key": "date_updated",
+            "replication_key_value": str(now),
+        }
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_state_checkpointed_between_pages(mocked_responses, capsys, max_workers):
+    task = json.loads((Path(__file__).parent / Path("task.json")).read_text())
+    task = task["tasks"][0]
+    first_page = [dict(task, id=str(i), date_updated=str(1000 + i)) for i in range(100)]
+    second_page = [dict(task, id="100", date_updated="2000")]
+    mocked_responses.add(
+        responses.GET,
+        "https://api.clickup.com/api/v2/team",
+        body=team_response,
+        content_type="application/json",
+    )
+    tasks_url = re.compile(
+        "https://api.clickup.com/api/v2/team/18011725/task\\?archived=false.*"
+    )
+    mocked_responses.add(
+        responses.GET,
+        re.compile(
+            "https://api.clickup.com/api/v2/team/18011725/task\\?page=1&archived=false.*"
+        ),
+        json={"tasks": second_page},
+    )
+    mocked_responses.add(responses.GET, tasks_url, json={"tasks": first_page})
+    mocked_responses.add(
+        responses.GET,
+        re.compile("https://api.clickup.com/api/v2/team/.*/task.*"),
+        json={"tasks": []},
+    )
+    tap1: Tap = TapClickUp(config=SAMPLE_CONFIG, parse_env_config=True)
+    tap1.run_discovery()
+    catalog1 = tap1.catalog_dict
+    for stream in catalog1["streams"]:
+        if stream.get("stream") and stream["stream"] not in ("task", "team"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    tap2: Tap = TapClickUp(
+        config={
+            **SAMPLE_CONFIG,
+            "max_workers": max_workers,
+            "task_checkpoint_pages": 1,
+        },
+        catalog=catalog1,
+    )
+    capsys.readouterr()
+    tap2.streams.get("team").sync()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    task_messages = [
+        message
+        for message in messages
+        if message["type"] == "STATE" or message.get("stream") == "task"
+    ]
+    last_of_first_page = next(
+        index
+        for index, message in enumerate(task_messages)
+        if message.get("record", {}).get("id") == "99"
+    )
+    # The STATE right after the first page points at its last task, so a failure
+    # on the second page resumes from there
+    checkpoint = task_messages[last_of_first_page + 1]
+    assert checkpoint["type"] == "STATE"
+    partition = next(
+        state
+        for state in checkpoint["value"]["bookmarks"]["task"]["partitions"]
+        if state["context"] == {"team_id": "18011725", "archived": "false"}
+    )
+    assert partition["replication_key_value"] == "1099"
+
+
+@pytest.mark.parametrize("window_days", [None, 1000])
+def test_out_of_time_stops_cleanly_and_resumes(capsys, window_days):
+    task = json.loads((Path(__file__).parent / Path("task.json")).read_text())
+    task = task["tasks"][0]
+    page = [
+        dict(task, id=str(i), date_updated=str(1500000000000 + i)) for i in range(100)
+    ]
+    now = [0.0]
+    requested = []
+
+    def tasks(request):
+        requested.append(request.url)
+        # The run is out of time once the first page is back
+        first = now[0] == 0
+        now[0] = 1000.0
+        return 200, {}, json.dumps({"tasks": page if first else []})
+
+    tap1: Tap = TapClickUp(config=SAMPLE_CONFIG)
+    catalog = tap1.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] not in ("task", "team"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    config = {**SAMPLE_CONFIG, "task_backfill_window_days": window_days}
+
+    def sync(state, **extra):
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                responses.GET,
+                "https://api.clickup.com/api/v2/team",
+                body=team_response,
+                content_type="application/json",
+            )
+            rsps.add_callback(
+                responses.GET,
+                re.compile("https://api.clickup.com/api/v2/team/[0-9]+/task.*"),
+                callback=tasks,
+            )
+            tap = TapClickUp(
+                config={**config, **extra}, catalog=catalog, state=copy.deepcopy(state)
+            )
+            tap.run_budget.clock = lambda: now[0]
+            capsys.readouterr()
+            tap.sync_all()
+        return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    messages = sync({}, max_run_seconds=60)
+
+    # The first page is written, no other page or partition is requested
+    assert len(requested) == 1
+    assert "archived=true" in requested[0]
+    records = [message for message in messages if message["type"] == "RECORD"]
+    assert len([r for r in records if r["stream"] == "task"]) == 100
+    assert messages[-1]["type"] == "STATE"
+    state = messages[-1]["value"]
+    partitions = state["bookmarks"]["task"]["partitions"]
+    started = [p for p in partitions if p.get("replication_key_value")]
+    assert [p["replication_key_value"] for p in started] == ["1500000000099"]
+    assert started[0]["context"]["archived"] == "true"
+    assert not any(p.get("window_complete") for p in partitions)
+    assert {p["context"]["archived"] for p in partitions} == {"true", "false"}
+
+    # Without a budget the next run resumes where the last one stopped
+    requested.clear()
+    sync(state)
+    resumed = [url for url in requested if "archived=true" in url]
+    assert "date_updated_gt=1500000000099" in resumed[0]
+    assert any("archived=false" in url for url in requested)
+    if window_days:
+        # Every window of the team that was started is resumed, none is dropped
+        assert {p["context"]["team_id"] for p in partitions} == {"18011725"}
+        assert len([url for url in requested if "/18011725/" in url]) == len(partitions)
+
+
+def test_429_past_the_budget_stops_instead_of_waiting(capsys, monkeypatch):
+    slept = []
+    monkeypatch.setattr("time.sleep", slept.append)
+    requested = []
+
+    def tasks(request):
+        requested.append(request.url)
+        return 429, {"Retry-After": "120"}, ""
+
+    tap1: Tap = TapClickUp(config=SAMPLE_CONFIG)
+    catalog = tap1.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] not in ("task", "team"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            body=team_response,
+            content_type="application/json",
+        )
+        rsps.add_callback(
+            responses.GET,
+            re.compile("https://api.clickup.com/api/v2/team/[0-9]+/task.*"),
+            callback=tasks,
+        )
+        tap = TapClickUp(
+            config={**SAMPLE_CONFIG, "max_run_seconds": 60}, catalog=catalog
+        )
+        capsys.readouterr()
+        tap.sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    # Each team's partitions give up on their 429 rather than sleep past the end
+    assert slept == []
+    assert len(requested) == 4
+    assert tap.run_budget.stopped
+    assert messages[-1]["type"] == "STATE"
+    partitions = messages[-1]["value"]["bookmarks"]["task"]["partitions"]
+    assert not any(p.get("replication_key_value") for p in partitions)
@@ -1,7 +1,17 @@
 """Tests standard tap features using the built-in SDK tests library."""
+import io
+import json
 import os
-import responses
+import threading
+import warnings
+from pathlib import Path
+
 import pytest
+import requests
+import responses
+import singer_sdk._singerlib as singer
+from tap_clickup.concurrency import PartitionScheduler, SyncAborted
+from tap_clickup.output import MessageWriter
 from tap_clickup.tap import TapClickUp
 
 SAMPLE_CONFIG = {
@@ -211,3 +221,432 @@ def test_empty_folderless_list(mocked_responses):
     tap.streams.get(
         "team"
     ).sync()  # This calls team, and task as task is a child stream
+
+
+def test_hierarchy_cache_skips_parent_walk(tmp_path):
+    """Second run only requests custom fields, the lists come from the cache"""
+    config = {**SAMPLE_CONFIG, "hierarchy_cache_path": str(tmp_path / "cache.json")}
+    tap: TapClickUp = TapClickUp(config=config)
+    tap.run_discovery()
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream.get("stream") and stream["stream"] != "folderless_customfield":
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        )
+        for archived in ("true", "false"):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+                json={"spaces": [{"id": "456", "name": "Space"}]},
+            )
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/space/456/list?archived={archived}",
+                json={"lists": [{"id": "789", "name": "List"}]},
+            )
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/list/789/field",
+            json={"fields": [{"id": "f1", "name": "Field", "type": "text"}]},
+        )
+        TapClickUp(config=config, catalog=catalog).sync_all()
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/list/789/field",
+            json={"fields": [{"id": "f1", "name": "Field", "type": "text"}]},
+        )
+        TapClickUp(config=config, catalog=catalog).sync_all()
+        assert [call.request.url for call in rsps.calls] == [
+            "https://api.clickup.com/api/v2/list/789/field"
+        ] * 4
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_dedupe_custom_fields(capsys, max_workers):
+    """Fields are requested once per scope and written once per stream"""
+    config = {
+        **SAMPLE_CONFIG,
+        "dedupe_custom_fields": True,
+        "max_workers": max_workers,
+    }
+    tap: TapClickUp = TapClickUp(config=config)
+    tap.run_discovery()
+    catalog = tap.catalog_dict
+    selected = ("folder_customfield", "folderless_customfield", "list_customfield")
+    for stream in catalog["streams"]:
+        if stream.get("stream") and stream["stream"] not in selected:
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    capsys.readouterr()
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        )
+        for archived, spaces, lists in (
+            ("true", [], [{"id": "790"}]),
+            ("false", [{"id": "456", "name": "Space"}], [{"id": "789"}]),
+        ):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+                json={"spaces": spaces},
+            )
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/space/456/list?archived={archived}",
+                json={"lists": lists},
+            )
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/space/456/folder?archived={archived}",
+                json={"folders": [{"id": "321"}] if archived == "false" else []},
+            )
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/folder/321/list?archived={archived}",
+                json={"lists": [{"id": "791", "space": {"id": "456"}}]},
+            )
+        for scope, field_id in (("team/123", "f1"), ("space/456", "f2")):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/{scope}/field",
+                json={"fields": [{"id": field_id, "name": "Field", "type": "text"}]},
+            )
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/folder/321/field",
+            json={"fields": [{"id": "f3", "name": "Field", "type": "text"}]},
+        )
+        TapClickUp(config=config, catalog=catalog).sync_all()
+        field_calls = [call for call in rsps.calls if "/field" in call.request.url]
+        assert len(field_calls) == 3
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records = [
+        (message["stream"], message["record"])
+        for message in messages
+        if message["type"] == "RECORD"
+    ]
+    assert sorted(
+        record["id"] for stream, record in records if stream == "folderless_customfield"
+    ) == ["f1", "f2"]
+    assert sorted(
+        record["id"] for stream, record in records if stream == "folder_customfield"
+    ) == ["f1", "f2", "f3"]
+    mappings = [record for stream, record in records if stream == "list_customfield"]
+    assert sorted(mappings, key=lambda record: tuple(record.values())) == [
+        {"list_id": "789", "field_id": "f1"},
+        {"list_id": "789", "field_id": "f2"},
+        {"list_id": "790", "field_id": "f1"},
+        {"list_id": "790", "field_id": "f2"},
+        {"list_id": "791", "field_id": "f1"},
+        {"list_id": "791", "field_id": "f2"},
+        {"list_id": "791", "field_id": "f3"},
+    ]
+    # Mappings are synced like any other stream, after the custom fields
+    last_field = max(
+        index
+        for index, message in enumerate(messages)
+        if message.get("stream", "").endswith("_customfield")
+        and message.get("stream") != "list_customfield"
+    )
+    assert all(
+        index > last_field
+        for index, message in enumerate(messages)
+        if message.get("stream") == "list_customfield" and message["type"] == "RECORD"
+    )
+
+
+@pytest.mark.parametrize("stream_responses", [False, True])
+def test_deselected_properties_stripped_when_parsed(stream_responses):
+    config = {**SAMPLE_CONFIG, "stream_responses": stream_responses}
+    tap: TapClickUp = TapClickUp(config=config)
+    catalog = tap.catalog_dict
+    keep = ("id", "name", "date_updated", "status")
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] != "task":
+            continue
+        for metadata in stream["metadata"]:
+            breadcrumb = metadata["breadcrumb"]
+            if breadcrumb and breadcrumb[1] not in keep:
+                metadata["metadata"]["selected"] = False
+        stream["metadata"].append(
+            {
+                "breadcrumb": ["properties", "status", "properties", "color"],
+                "metadata": {"selected": False},
+            }
+        )
+    task_page = (Path(__file__).parent / Path("task.json")).read_bytes()
+    response = requests.Response()
+    response.status_code = 200
+    response._content = task_page
+    response.raw = io.BytesIO(task_page)
+
+    stream = TapClickUp(config=config, catalog=catalog).streams["task"]
+    records = list(stream.parse_response(response))
+
+    assert set(records[0]) == set(keep)
+    assert "color" not in records[0]["status"]
+    assert "type" in records[0]["status"]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_emit_changed_only(capsys, max_workers):
+    tap: TapClickUp = TapClickUp(config=SAMPLE_CONFIG)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] not in ("team", "space"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    capsys.readouterr()
+
+    def sync(spaces, state, **config):
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                responses.GET,
+                "https://api.clickup.com/api/v2/team",
+                json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+            )
+            for archived in ("true", "false"):
+                rsps.add(
+                    responses.GET,
+                    f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+                    json={"spaces": spaces if archived == "false" else []},
+                )
+            config = {
+                **SAMPLE_CONFIG,
+                "emit_changed_only": True,
+                "max_workers": max_workers,
+                **config,
+            }
+            tap = TapClickUp(config=config, catalog=catalog, state=state)
+            tap.sync_all()
+        messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        records = sorted(
+            (message["stream"], message["record"]["id"])
+            for message in messages
+            if message["type"] == "RECORD"
+        )
+        states = [
+            json.dumps(message["value"])
+            for message in messages
+            if message["type"] == "STATE"
+        ]
+        # Fingerprints only reach the final STATE
+        assert not any('"fingerprints":' in state for state in states[:-1])
+        assert '"fingerprints":' in states[-1]
+        return records, messages[-1]["value"]
+
+    spaces = [{"id": "1", "name": "One"}, {"id": "2", "name": "Two"}]
+    records, state = sync(spaces, {})
+    assert records == [("space", "1"), ("space", "2"), ("team", "123")]
+
+    spaces[1] = {"id": "2", "name": "Renamed"}
+    spaces.append({"id": "3", "name": "Three"})
+    records, state = sync(spaces, state)
+    assert records == [("space", "2"), ("space", "3")]
+
+    records, state = sync(spaces, state)
+    assert records == []
+
+    records, state = sync(spaces, state, full_refresh_interval_hours=1e-9)
+    assert records == [("space", "1"), ("space", "2"), ("space", "3"), ("team", "123")]
+
+
+def test_pending_partitions_bounded(capsys, monkeypatch):
+    """Every level syncs concurrently, never more than max_pending_partitions"""
+    config = {**SAMPLE_CONFIG, "max_workers": 4, "max_pending_partitions": 3}
+    tap: TapClickUp = TapClickUp(config=config)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] not in ("space", "folder", "folder_list"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    capsys.readouterr()
+
+    peak = []
+    enqueue = PartitionScheduler._enqueue
+
+    def tracked_enqueue(self, job):
+        peak.append(self._outstanding)
+        enqueue(self, job)
+
+    monkeypatch.setattr(PartitionScheduler, "_enqueue", tracked_enqueue)
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        )
+        for archived in ("true", "false"):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+                json={"spaces": [{"id": f"s{i}-{archived}"} for i in range(3)]},
+            )
+            for i in range(3):
+                for space_archived in ("true", "false"):
+                    space_id = f"s{i}-{space_archived}"
+                    rsps.add(
+                        responses.GET,
+                        f"https://api.clickup.com/api/v2/space/{space_id}/folder"
+                        f"?archived={archived}",
+                        json={"folders": [{"id": f"{space_id}-{archived}"}]},
+                    )
+                    for folder_archived in ("true", "false"):
+                        folder_id = f"{space_id}-{folder_archived}"
+                        rsps.add(
+                            responses.GET,
+                            f"https://api.clickup.com/api/v2/folder/{folder_id}/list"
+                            f"?archived={archived}",
+                            json={"lists": [{"id": f"{folder_id}-{archived}"}]},
+                        )
+        TapClickUp(config=config, catalog=catalog).sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records = [message for message in messages if message["type"] == "RECORD"]
+    counts = {
+        stream: len([r for r in records if r["stream"] == stream])
+        for stream in ("space", "folder", "folder_list")
+    }
+    assert counts == {"space": 6, "folder": 12, "folder_list": 24}
+    assert max(peak) <= 3
+
+
+def test_buffered_messages_block_workers():
+    """Workers wait for their messages to be written, without deadlocking"""
+    written = []
+
+    class Writer(MessageWriter):
+        def write(self, message):
+            written.append(message.record["id"])
+
+    scheduler = PartitionScheduler({}, max_workers=2, max_buffered=3, writer=Writer())
+    buffered = []
+    full = threading.Event()
+
+    class Emitter:
+        def __init__(self, prefix, count, child=None):
+            self.prefix = prefix
+            self.count = count
+            self.child = child
+
+        def sync(self, context):
+            if self.child is not None:
+                # Queue the child behind partitions blocked on full buffers
+                full.wait(5)
+                scheduler.submit(self.child, {})
+            for i in range(self.count):
+                scheduler.emit(
+                    singer.RecordMessage(stream="s", record={"id": f"{self.prefix}{i}"})
+                )
+                buffered.append(len(scheduler.current_job.items))
+                if len(buffered) >= 3:
+                    full.set()
+
+    scheduler.submit(Emitter("a", 0, child=Emitter("c", 5)), {})
+    scheduler.submit(Emitter("b", 5), {})
+    scheduler.submit(Emitter("d", 5), {})
+    drained = threading.Thread(target=scheduler.drain, daemon=True)
+    drained.start()
+    drained.join(10)
+    deadlocked = drained.is_alive()
+    if deadlocked:
+        # Release the workers, or the test run never exits
+        scheduler._failed = True
+
+    assert not deadlocked
+    assert written == [
+        *(f"c{i}" for i in range(5)),
+        *(f"b{i}" for i in range(5)),
+        *(f"d{i}" for i in range(5)),
+    ]
+    assert max(buffered) <= 3
+    scheduler.close()
+
+
+def test_failed_sync_stops_workers():
+    scheduler = PartitionScheduler({}, max_workers=2)
+    resume = threading.Event()
+    synced = []
+    aborted = []
+
+    class Child:
+        def sync(self, context):
+            synced.append(context)
+
+    class Parent:
+        def sync(self, context):
+            resume.wait(5)
+            try:
+                scheduler.submit(Child(), {"child": 1})
+            except SyncAborted:
+                aborted.append(context)
+                raise
+
+    failing = threading.Event()
+
+    class Failing:
+        def sync(self, context):
+            failing.wait(5)
+            raise RuntimeError("fatal")
+
+    scheduler.submit(Failing(), {"id": 1})
+    scheduler.submit(Parent(), {"id": 2})
+    failing.set()
+    with pytest.raises(RuntimeError):
+        scheduler.drain()
+    resume.set()
+
+    with pytest.raises(SyncAborted):
+        scheduler.submit(Child(), {"id": 3})
+
+    # The running parent can't submit its child either
+    for _ in range(50):
+        if aborted:
+            break
+        threading.Event().wait(0.1)
+    assert aborted == [{"id": 2}]
+    assert synced == []
+    assert scheduler._executor is None
+
+
+def test_list_customfield_alone_warns(caplog):
+    tap: TapClickUp = TapClickUp(config=SAMPLE_CONFIG)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] != "list_customfield":
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+
+    tap = TapClickUp(config=SAMPLE_CONFIG, catalog=catalog)
+    # The SDK reconfigures logging during the sync, dropping caplog's root handler
+    tap.logger.addHandler(caplog.handler)
+    try:
+        with responses.RequestsMock():
+            tap.sync_all()
+    finally:
+        tap.logger.removeHandler(caplog.handler)
+
+    assert "no mapping will be written" in caplog.text
+
+
+def test_paginators_avoid_legacy_sdk_pagination():
+    tap = TapClickUp(config=SAMPLE_CONFIG)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        for stream in tap.streams.values():
+            assert stream.get_new_paginator().current_value in (None, 0)
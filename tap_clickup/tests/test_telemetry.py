@@ -0,0 +1,101 @@
+"""Tests for the per endpoint telemetry."""
+import email.utils
+import threading
+
+import backoff
+import responses
+
+from tap_clickup.tap import TapClickUp
+from tap_clickup.telemetry import Reservoir, Telemetry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_latency_percentiles():
+    telemetry = Telemetry(clock=FakeClock())
+    for latency in range(1, 101):
+        telemetry.add_latency("/team", latency / 1000)
+    stats = telemetry.endpoints["/team"].to_dict()
+    assert stats["requests"] == 100
+    assert stats["latency_p50_ms"] == 51
+    assert stats["latency_p95_ms"] == 96
+    assert stats["latency_p99_ms"] == 100
+
+
+def test_latencies_are_bounded():
+    reservoir = Reservoir(size=100)
+    for latency in range(10000):
+        reservoir.add(latency)
+    assert reservoir.count == 10000
+    assert len(reservoir.samples) == 100
+    # A uniform sample of 0..9999, later values replace earlier ones
+    assert max(reservoir.samples) >= 5000
+
+
+def test_concurrent_maybe_log_logs_once(monkeypatch):
+    clock = FakeClock()
+    telemetry = Telemetry(log_interval=60, clock=clock)
+    logged = []
+    monkeypatch.setattr(
+        "tap_clickup.telemetry.metrics.log", lambda logger, point: logged.append(point)
+    )
+    telemetry.add("/team", "records", 5)
+    clock.now = 61
+    threads = [threading.Thread(target=telemetry.maybe_log) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(logged) == 1
+
+
+def test_logs_every_interval(monkeypatch):
+    clock = FakeClock()
+    telemetry = Telemetry(log_interval=60, clock=clock)
+    logged = []
+    monkeypatch.setattr(
+        "tap_clickup.telemetry.metrics.log", lambda logger, point: logged.append(point)
+    )
+    telemetry.add("/team", "records", 5)
+    telemetry.maybe_log()
+    assert logged == []
+    clock.now = 61
+    telemetry.maybe_log()
+    assert [(point.metric_type, point.value["records"]) for point in logged] == [
+        ("counter", 5)
+    ]
+
+
+def test_sync_counts_throttling_and_retries():
+    now = email.utils.formatdate(usegmt=True)
+    reset = str(int(email.utils.parsedate_to_datetime(now).timestamp()))
+    tap = TapClickUp(config={"api_token": "x"})
+    stream = tap.streams["team"]
+    stream.backoff_wait_generator = lambda: backoff.constant(0)
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            status=429,
+            headers={"X-RateLimit-Reset": reset, "Date": now},
+        )
+        rsps.add(
+            responses.GET,
+            "https://api.clickup.com/api/v2/team",
+            json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+        )
+        stream._sync_children = lambda child_context: None
+        stream.sync()
+
+    stats = tap.telemetry.endpoints["/team"].to_dict()
+    assert stats["requests"] == 2
+    assert stats["throttled"] == 1
+    assert stats["retries"] == 1
+    assert stats["records"] == 1
+    assert stats["bytes"] > 0
@@ -0,0 +1,128 @@
+"""Tests for spreading requests over a pool of API tokens."""
+import json
+import os
+import re
+import time
+
+import pytest
+import requests
+import responses
+from responses import matchers
+
+from tap_clickup.tap import TapClickUp
+from tap_clickup.tokens import Token, TokenPool, TokenRevokedError
+
+SAMPLE_CONFIG = {
+    "api_token": os.environ["TAP_CLICKUP_API_TOKEN"],
+}
+
+
+def throttled(token: Token) -> None:
+    response = requests.Response()
+    response.status_code = 429
+    response.headers["X-RateLimit-Limit"] = "100"
+    response.headers["X-RateLimit-Remaining"] = "0"
+    response.headers["X-RateLimit-Reset"] = str(int(time.time()) + 60)
+    token.rate_limiter.update(response)
+
+
+def test_pool_routes_around_throttled_and_refused_tokens():
+    first, second, mapped = Token("a"), Token("b"), Token("c", team_ids=["1"])
+    pool = TokenPool([first, second, mapped])
+
+    assert {pool.choose("2").value for _ in range(4)} == {"a", "b"}
+    assert {pool.choose("1").value for _ in range(4)} == {"c"}
+    throttled(first)
+    assert {pool.choose("2").value for _ in range(4)} == {"b"}
+    assert pool.has_spare(first, "2", time.time())
+    assert not pool.has_spare(second, "2", time.time())
+
+    pool.revoke(mapped, "1")
+    with pytest.raises(TokenRevokedError):
+        pool.choose("1")
+
+
+def test_refused_token_is_only_dropped_once_every_team_refused_it():
+    token = Token("a")
+    pool = TokenPool([token, Token("b")])
+    pool.learn(None, {"team_id": "1"})
+    pool.learn(None, {"team_id": "2"})
+
+    assert not pool.revoke(token, None)
+    assert not pool.revoke(token, "1")
+    assert not token.usable("1")
+    assert token.usable("2")
+    assert {pool.choose("2").value for _ in range(4)} == {"a", "b"}
+
+    assert pool.revoke(token, "2")
+    assert {pool.choose("2").value for _ in range(4)} == {"b"}
+
+
+def test_pool_learns_which_team_contexts_belong_to():
+    pool = TokenPool([Token("a"), Token("c", team_ids=["1"])])
+    pool.learn({"team_id": "1", "archived": "false"}, {"space_id": "10"})
+    pool.learn({"space_id": "10", "archived": "true"}, {"folder_id": "100"})
+    assert pool.team_of({"folder_id": "100", "archived": "false"}) == "1"
+    assert pool.team_of({"folder_id": "200"}) is None
+
+
+def test_sync_spreads_requests_and_fails_over(capsys):
+    config = {
+        **SAMPLE_CONFIG,
+        "api_tokens": [{"token": "good"}, {"token": "revoked"}],
+    }
+    tap: TapClickUp = TapClickUp(config=config)
+    catalog = tap.catalog_dict
+    for stream in catalog["streams"]:
+        if stream["tap_stream_id"] not in ("team", "folder"):
+            for metadata in stream["metadata"]:
+                metadata["metadata"]["selected"] = False
+    capsys.readouterr()
+
+    with responses.RequestsMock() as rsps:
+        for token in (config["api_token"], "good"):
+            rsps.add(
+                responses.GET,
+                "https://api.clickup.com/api/v2/team",
+                json={"teams": [{"id": "123", "name": "Team", "members": []}]},
+                match=[matchers.header_matcher({"Authorization": token})],
+            )
+        rsps.add(responses.GET, "https://api.clickup.com/api/v2/team", status=401)
+        # Refused for the only team too, so it's dropped for every team
+        rsps.add(
+            responses.GET,
+            re.compile("https://api.clickup.com/api/v2/(team/123|space)/.*"),
+            status=401,
+            match=[matchers.header_matcher({"Authorization": "revoked"})],
+        )
+        for archived in ("true", "false"):
+            rsps.add(
+                responses.GET,
+                f"https://api.clickup.com/api/v2/team/123/space?archived={archived}",
+                json={"spaces": [{"id": archived, "name": "Space"}]},
+            )
+            for space_id in ("true", "false"):
+                rsps.add(
+                    responses.GET,
+                    f"https://api.clickup.com/api/v2/space/{space_id}/folder"
+                    f"?archived={archived}",
+                    json={"folders": [{"id": f"{space_id}-{archived}"}]},
+                )
+        tap = TapClickUp(config=config, catalog=catalog)
+        tap.sync_all()
+        # Retries resend the same request object, with another token
+        tokens = [call.request.headers["Authorization"] for call in rsps.calls]
+        refused = [call for call in rsps.calls if call.response.status_code == 401]
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records = [message for message in messages if message["type"] == "RECORD"]
+    assert [r["record"]["id"] for r in records if r["stream"] == "team"] == ["123"]
+    assert len([r for r in records if r["stream"] == "folder"]) == 4
+    # Teams are listed with every token, the one refused for listing teams is
+    # still tried for the team, and dropped for every team once it's refused
+    assert tokens[:3] == [config["api_token"], "good", "revoked"]
+    assert len(refused) == 2
+    revoked = tap.token_pool.tokens[2]
+    assert revoked.revoked_for == {None, "123"}
+    assert revoked.revoked
+    assert "revoked" not in tokens[3:]
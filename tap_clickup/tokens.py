@@ -0,0 +1,186 @@
+"""Pool of ClickUp API tokens, each paced against its own rate limit."""
+
+import contextlib
+import math
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+from singer_sdk.exceptions import FatalAPIError, RetriableAPIError
+
+from tap_clickup.ratelimit import RateLimiter
+
+
+class TokenRevokedError(FatalAPIError):
+    """Raised when no usable token is left for a request."""
+
+
+class TokenRefusedError(RetriableAPIError):
+    """Raised on a 401, the request is retried with another token if any."""
+
+    def __init__(self, msg: str, token: "Token") -> None:
+        super().__init__(msg)
+        self.token = token
+        # Set to 0 once another token can take over, see `retry_waits`
+        self.wait: Optional[float] = None
+
+
+class Token:
+    """One API token, the teams it's reserved for and its rate limit budget.
+
+    A token without `team_ids` can be used for any team that has no tokens of
+    its own. `revoked_for` holds the teams the token was refused for, None
+    standing for requests that name no team (ie listing teams). `revoked` is
+    set once every team has refused it.
+    """
+
+    def __init__(self, value: str, team_ids: Optional[List[str]] = None) -> None:
+        self.value = value
+        self.team_ids: Set[str] = {str(team_id) for team_id in team_ids or ()}
+        self.rate_limiter = RateLimiter()
+        self.revoked_for: Set[Optional[str]] = set()
+        self.revoked = False
+
+    def usable(self, team_id: Optional[str]) -> bool:
+        """Return True if the token hasn't been refused for the team."""
+        return not self.revoked and team_id not in self.revoked_for
+
+
+class TokenPool:
+    """Spread requests over several tokens to multiply the rate limit.
+
+    Each request goes to the token (among the team's) whose budget lets it
+    send soonest, ties go round robin. A throttled token is left alone until
+    its window resets, a refused (401) token is dropped for that team, and for
+    every team once each of them has refused it.
+
+    Requests below a team (to a space, folder or list) don't name their team,
+    `learn` remembers which team each child context belongs to so they're
+    routed to the team's tokens, and a refusal is blamed on the right team.
+    """
+
+    def __init__(self, tokens: List[Token]) -> None:
+        self.tokens = tokens
+        self._by_value = {token.value: token for token in tokens}
+        self._owners: Dict[Tuple[str, str], str] = {}
+        # Every team listed so far
+        self.teams: Set[str] = set()
+        self._turn = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "TokenPool":
+        """Build the pool from `api_token` and `api_tokens`."""
+        tokens: Dict[str, Token] = {config["api_token"]: Token(config["api_token"])}
+        for entry in config.get("api_tokens") or []:
+            tokens[entry["token"]] = Token(entry["token"], entry.get("team_ids"))
+        return cls(list(tokens.values()))
+
+    def candidates(self, team_id: Optional[str]) -> List[Token]:
+        """Return the usable tokens for a request to the team."""
+        if team_id is None:
+            tokens = self.tokens
+        else:
+            tokens = [token for token in self.tokens if team_id in token.team_ids]
+            tokens = tokens or [token for token in self.tokens if not token.team_ids]
+        return [token for token in tokens if token.usable(team_id)]
+
+    def choose(self, team_id: Optional[str] = None) -> Token:
+        """Return the token to send the next request for the team with."""
+        pinned = getattr(self._local, "token", None)
+        if pinned is not None:
+            if not pinned.usable(team_id):
+                raise TokenRevokedError("API token was refused")
+            return pinned
+        with self._lock:
+            candidates = self.candidates(team_id)
+            if not candidates:
+                raise TokenRevokedError(
+                    f"No usable API token left for team {team_id}"
+                    if team_id
+                    else "No usable API token left"
+                )
+            self._turn = self._turn + 1
+            count = len(self.tokens)
+            return min(
+                candidates,
+                key=lambda token: (
+                    token.rate_limiter.available_at(),
+                    -(
+                        math.inf
+                        if token.rate_limiter.remaining is None
+                        else token.rate_limiter.remaining
+                    ),
+                    (self.tokens.index(token) - self._turn) % count,
+                ),
+            )
+
+    @contextlib.contextmanager
+    def pin(self, token: Token) -> Iterator[None]:
+        """Send every request made by this thread within the block with `token`."""
+        self._local.token = token
+        try:
+            yield
+        finally:
+            self._local.token = None
+
+    def can_retry(self, team_id: Optional[str]) -> bool:
+        """Return True if a usable token is left for a request to the team."""
+        pinned = getattr(self._local, "token", None)
+        if pinned is not None:
+            return pinned.usable(team_id)
+        with self._lock:
+            return bool(self.candidates(team_id))
+
+    def token_for(self, request: requests.PreparedRequest) -> Optional[Token]:
+        """Return the token a request was sent with."""
+        return self._by_value.get(request.headers.get("Authorization"))
+
+    def revoke(self, token: Token, team_id: Optional[str]) -> bool:
+        """Stop using a token the API refused for the team.
+
+        Returns True if that was the last of the token's teams (its `team_ids`,
+        or every team listed so far) and it's now dropped for every team.
+        """
+        with self._lock:
+            token.revoked_for.add(team_id)
+            teams = token.team_ids or self.teams
+            if teams and teams <= token.revoked_for:
+                token.revoked = True
+            return token.revoked
+
+    def has_spare(self, token: Token, team_id: Optional[str], now: float) -> bool:
+        """Return True if another token could send a request for the team now."""
+        with self._lock:
+            return any(
+                other is not token and other.rate_limiter.available_at() <= now
+                for other in self.candidates(team_id)
+            )
+
+    def team_of(self, context: Optional[dict]) -> Optional[str]:
+        """Return the team a stream context belongs to, if known."""
+        if not context:
+            return None
+        if context.get("team_id"):
+            return str(context["team_id"])
+        with self._lock:
+            for item in context.items():
+                team_id = self._owners.get(item)
+                if team_id is not None:
+                    return team_id
+        return None
+
+    def learn(self, parent_context: Optional[dict], child_context: dict) -> None:
+        """Remember that a child context belongs to its parent's team."""
+        if child_context.get("team_id"):
+            with self._lock:
+                self.teams.add(str(child_context["team_id"]))
+            return
+        team_id = self.team_of(parent_context)
+        if team_id is None:
+            return
+        with self._lock:
+            for key, value in child_context.items():
+                if key != "team_id":
+                    self._owners[(key, value)] = team_id